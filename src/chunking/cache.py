@@ -0,0 +1,261 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+from chunking.chunker import TextChunker
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+
+# Configuration keys each chunking method's output depends on
+METHOD_PARAMETERS = {
+    'gpt2': ['model', 'tokens_per_chunk'],
+    'nltk': ['nltk'],
+    'character_and_token': ['chunk_size', 'tokens_per_chunk'],
+}
+
+
+def chunking_variant(chunking_config: Optional[Dict] = None) -> Dict:
+    """
+    Describe the chunks a configuration produces: chunker code version, method and the
+    parameters that method uses. Parameters of other methods are left out, so editing
+    them does not invalidate cached chunks.
+
+    Args:
+        chunking_config (Optional[Dict]): Chunking configuration. Defaults to config['chunking']
+
+    Returns:
+        Dict: Variant description
+    """
+    chunking_config = chunking_config or config['chunking']
+    method = chunking_config['method'].lower()
+    if method not in METHOD_PARAMETERS:
+        raise ValueError(f"Unsupported method: {method}")
+    return {
+        'version': TextChunker.VERSION,
+        'method': method,
+        'parameters': {key: chunking_config.get(key) for key in METHOD_PARAMETERS[method]},
+    }
+
+
+def chunking_key(chunking_config: Optional[Dict] = None) -> str:
+    """
+    Get a stable short hash of a chunking variant, naming its cache directory.
+
+    Args:
+        chunking_config (Optional[Dict]): Chunking configuration. Defaults to config['chunking']
+
+    Returns:
+        str: Hex digest of the variant description
+    """
+    serialized = json.dumps(chunking_variant(chunking_config), sort_keys=True)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()[:16]
+
+
+def _atomic_write_json(path: Path, data, **kwargs) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, **kwargs)
+    os.replace(tmp_path, path)
+
+
+class ChunkCache:
+    """
+    Chunk files keyed by chunking variant, so several variants of a filing coexist.
+    Stored as 'data/edgar_corpus_{year}/{split}/chunks/{key}/{cik}_{year}_chunks.json' with a
+    'variant.json' describing each key. A file's modification time marks its last use.
+    """
+
+    def __init__(self, data_root: Optional[Path] = None, chunking_config: Optional[Dict] = None):
+        """
+        Initialize the ChunkCache.
+
+        Args:
+            data_root (Optional[Path]): Directory holding the edgar_corpus_* folders. Defaults to data/
+            chunking_config (Optional[Dict]): Chunking configuration. Defaults to config['chunking']
+        """
+        self.data_root = Path(data_root or PROJECT_ROOT / 'data')
+        self.variant = chunking_variant(chunking_config)
+        self.key = chunking_key(chunking_config)
+
+    def path(self, cik: str, year: int, split: str) -> Path:
+        return self.data_root / f'edgar_corpus_{year}' / split / 'chunks' / self.key / f'{cik}_{year}_chunks.json'
+
+    def files(self) -> List[Path]:
+        """List the chunk files cached for this variant."""
+        return sorted(self.data_root.glob(f'edgar_corpus_*/*/chunks/{self.key}/*_chunks.json'))
+
+    def get(self, cik: str, year: int, split: str) -> Optional[Dict]:
+        """
+        Load a filing's chunks for this variant.
+
+        Args:
+            cik (str): Company CIK number
+            year (int): Filing year
+            split (str): Dataset split
+
+        Returns:
+            Optional[Dict]: Chunks as produced by TextChunker.chunk_data, or None if not cached
+        """
+        path = self.path(cik, year, split)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                chunks = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Ignoring unreadable chunk file {path}: {str(e)}")
+            return None
+        os.utime(path)
+        return chunks
+
+    def put(self, cik: str, year: int, split: str, chunks: Dict) -> Path:
+        """
+        Store a filing's chunks for this variant, replacing the file atomically.
+
+        Args:
+            cik (str): Company CIK number
+            year (int): Filing year
+            split (str): Dataset split
+            chunks (Dict): Chunks as produced by TextChunker.chunk_data
+
+        Returns:
+            Path: Path of the chunk file
+        """
+        path = self.path(cik, year, split)
+        if not (path.parent / 'variant.json').exists():
+            _atomic_write_json(path.parent / 'variant.json', self.variant, indent=2, sort_keys=True)
+        _atomic_write_json(path, chunks, indent=2)
+        return path
+
+
+@dataclass
+class CacheEntry:
+    path: Path
+    key: str
+    filing: str
+    size: int
+    last_used: float
+
+
+def list_entries(data_root: Optional[Path] = None) -> List[CacheEntry]:
+    """
+    List cached chunk files of every variant.
+
+    Args:
+        data_root (Optional[Path]): Directory holding the edgar_corpus_* folders. Defaults to data/
+
+    Returns:
+        List[CacheEntry]: One entry per chunk file, least recently used first
+    """
+    data_root = Path(data_root or PROJECT_ROOT / 'data')
+    entries = []
+    for path in data_root.glob('edgar_corpus_*/*/chunks/*/*_chunks.json'):
+        stat = path.stat()
+        filing = f"{path.parent.parent.parent.name}/{path.name[:-len('_chunks.json')]}"
+        entries.append(CacheEntry(path, path.parent.name, filing, stat.st_size, stat.st_mtime))
+    return sorted(entries, key=lambda entry: entry.last_used)
+
+
+def prune(data_root: Optional[Path] = None, max_bytes: Optional[int] = None,
+          keep_variants: Optional[int] = None, max_age_days: Optional[float] = None,
+          protect_key: Optional[str] = None, dry_run: bool = False) -> List[CacheEntry]:
+    """
+    Remove least recently used chunk files.
+
+    Args:
+        data_root (Optional[Path]): Directory holding the edgar_corpus_* folders. Defaults to data/
+        max_bytes (Optional[int]): Total size to shrink the cache to
+        keep_variants (Optional[int]): Variants kept per filing
+        max_age_days (Optional[float]): Remove files unused for longer than this
+        protect_key (Optional[str]): Variant never removed, typically the configured one
+        dry_run (bool, optional): Only report what would be removed. Defaults to False
+
+    Returns:
+        List[CacheEntry]: Removed entries
+    """
+    entries = [entry for entry in list_entries(data_root) if entry.key != protect_key]
+    removed = []
+    if max_age_days is not None:
+        cutoff = time.time() - max_age_days * 86400
+        removed += [entry for entry in entries if entry.last_used < cutoff]
+    if keep_variants is not None:
+        per_filing: Dict[str, List[CacheEntry]] = {}
+        for entry in reversed(list_entries(data_root)):
+            per_filing.setdefault(entry.filing, []).append(entry)
+        for filing_entries in per_filing.values():
+            kept = 0
+            for entry in filing_entries:
+                if entry.key == protect_key or (kept < keep_variants and entry not in removed):
+                    kept += 1
+                elif entry not in removed:
+                    removed.append(entry)
+    if max_bytes is not None:
+        total = sum(entry.size for entry in list_entries(data_root)) - sum(entry.size for entry in removed)
+        for entry in entries:
+            if total <= max_bytes:
+                break
+            if entry not in removed:
+                removed.append(entry)
+                total -= entry.size
+
+    if not dry_run:
+        for entry in removed:
+            entry.path.unlink(missing_ok=True)
+            remaining = [p for p in entry.path.parent.iterdir() if p.name != 'variant.json']
+            if not remaining:
+                (entry.path.parent / 'variant.json').unlink(missing_ok=True)
+                entry.path.parent.rmdir()
+    return removed
+
+
+def _parse_size(size: str) -> int:
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    size = size.strip().upper().rstrip('B')
+    return int(float(size[:-1]) * units[size[-1]]) if size[-1] in units else int(size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and prune cached chunk variants")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="Show cached variants with their size and last use")
+    prune_parser = subparsers.add_parser('prune', help="Remove least recently used chunk files")
+    prune_parser.add_argument('--max-size', help="Shrink the cache to this size, e.g. 500M or 2G")
+    prune_parser.add_argument('--keep-variants', type=int, help="Variants kept per filing")
+    prune_parser.add_argument('--max-age-days', type=float, help="Remove files unused for longer than this")
+    prune_parser.add_argument('--include-current', action='store_true',
+                              help="Also remove files of the configured variant")
+    prune_parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    current_key = chunking_key()
+    if args.command == 'list':
+        variants: Dict[str, List[CacheEntry]] = {}
+        for entry in list_entries():
+            variants.setdefault(entry.key, []).append(entry)
+        for key, key_entries in sorted(variants.items(), key=lambda item: -item[1][-1].last_used):
+            with open(key_entries[0].path.parent / 'variant.json', 'r', encoding='utf-8') as f:
+                variant = json.load(f)
+            marker = '*' if key == current_key else ' '
+            print(f"{marker} {key}  {variant['method']:<20} {json.dumps(variant['parameters'], sort_keys=True)}  "
+                  f"v{variant['version']}  {len(key_entries)} filing(s)  "
+                  f"{sum(e.size for e in key_entries) / (1 << 20):.1f} MB  "
+                  f"last used {time.strftime('%Y-%m-%d %H:%M', time.localtime(key_entries[-1].last_used))}")
+    else:
+        pruned = prune(
+            max_bytes=_parse_size(args.max_size) if args.max_size else None,
+            keep_variants=args.keep_variants,
+            max_age_days=args.max_age_days,
+            protect_key=None if args.include_current else current_key,
+            dry_run=args.dry_run,
+        )
+        action = "Would remove" if args.dry_run else "Removed"
+        print(f"{action} {len(pruned)} chunk file(s), {sum(e.size for e in pruned) / (1 << 20):.1f} MB")
@@ -1,12 +1,4 @@
 from typing import List, Dict, Optional
-from transformers import GPT2TokenizerFast
-from langchain.text_splitter import (
-    RecursiveCharacterTextSplitter,
-    SentenceTransformersTokenTextSplitter,
-    CharacterTextSplitter,
-)
-from nltk.tokenize import TextTilingTokenizer
-import nltk
 import ssl
 import streamlit as st
 import sys
@@ -23,6 +15,9 @@ class TextChunker:
     Supports GPT-2 tokenization, NLTK TextTiling, and character/token-based splitting.
     """
 
+    # Bump whenever a code change alters the chunks produced, so cached chunks are rebuilt
+    VERSION = 1
+
     def __init__(self, model_name: str):
         """
         Initialize the TextChunker with specified model and default parameters.
@@ -38,8 +33,20 @@ class TextChunker:
         self.tokens_per_chunk = 200
         self.nltk_w = 20
         self.nltk_k = 5
-        
-        # Download NLTK data if not already downloaded
+        self.tokenizer = None
+
+    # The NLTK data probe runs once per process, the first time TextTiling is used
+    _nltk_data_checked = False
+
+    @classmethod
+    def ensure_nltk_data(cls) -> None:
+        """
+        Download NLTK data if not already downloaded.
+        """
+        if cls._nltk_data_checked:
+            return
+        import nltk
+
         try:
             nltk.data.find('tokenizers/punkt')
         except LookupError:
@@ -56,6 +63,7 @@ class TextChunker:
             except Exception as e:
                 print(f"Warning: Could not download NLTK data: {str(e)}")
                 print("Please download punkt tokenizer manually or check your SSL certificates.")
+        cls._nltk_data_checked = True
 
     
     def chunk_data(self, data: Dict, cik_to_search: str, year: int, split: str) -> Dict:
@@ -90,8 +98,6 @@ class TextChunker:
                 
             try:
                 method = config['chunking']['method']
-                text_processor = TextChunker(model_name='nltk')
-                chunks = text_processor.chunk_text(text, method='nltk')
                 chunks = chunker.chunk_text(text, method=method, config=config['chunking'])
                 
                 all_chunks[section]['chunks'] = chunks
@@ -134,6 +140,11 @@ class TextChunker:
         Returns:
             List[str]: List of text chunks split by both characters and tokens
         """
+        from langchain.text_splitter import (
+            RecursiveCharacterTextSplitter,
+            SentenceTransformersTokenTextSplitter,
+        )
+
         character_splitter = RecursiveCharacterTextSplitter(
             separators=self.character_separators,
             chunk_size=self.character_chunk_size,
@@ -176,6 +187,9 @@ class TextChunker:
         Returns:
             List[str]: List of text tiles/chunks
         """
+        from nltk.tokenize import TextTilingTokenizer
+
+        self.ensure_nltk_data()
         try:
             processed_text = self.preprocess_text_for_texttiling(text)
             tt = TextTilingTokenizer(w=self.nltk_w, k=self.nltk_k)
@@ -194,7 +208,11 @@ class TextChunker:
         Returns:
             List[str]: List of text chunks based on GPT-2 tokens
         """
-        self.tokenizer = GPT2TokenizerFast.from_pretrained(self.model_name)
+        from transformers import GPT2TokenizerFast
+        from langchain.text_splitter import CharacterTextSplitter
+
+        if self.tokenizer is None:
+            self.tokenizer = GPT2TokenizerFast.from_pretrained(self.model_name)
         text_splitter = CharacterTextSplitter.from_huggingface_tokenizer(
             self.tokenizer, chunk_size=self.tokens_per_chunk,
         )
@@ -0,0 +1,554 @@
+import os
+import sys
+import json
+import argparse
+from collections import Counter
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+METADATA_FIELDS = ['chunk_id', 'cik', 'year', 'split', 'section']
+
+
+class EmbeddingShardWriter:
+    """
+    Write chunk embeddings to disk as fixed-size shards.
+    Each shard is a float32 '.npy' matrix plus a '.jsonl' file with one metadata line per row,
+    so readers can stream the corpus without loading it into memory. Rows added with a source
+    are also counted in a '.sources.json' file per shard, so an interrupted run can resume
+    after the last complete shard without writing any row twice.
+    """
+
+    def __init__(self, output_dir: Path, shard_size: int = 20000):
+        """
+        Initialize the EmbeddingShardWriter.
+
+        Args:
+            output_dir (Path): Directory to write shards into
+            shard_size (int, optional): Rows per shard, which bounds writer memory. Defaults to 20000
+        """
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.shard_size = shard_size
+        self._shard_index = len(list(self.output_dir.glob('shard_*.npy')))
+        self._embeddings: List[np.ndarray] = []
+        self._metadata: List[Dict] = []
+        # Buffered rows per source, and sources whose last row is buffered
+        self._sources: Dict[str, int] = {}
+        self._completed: List[str] = []
+
+    def add(self, embeddings: np.ndarray, metadata: List[Dict], source: Optional[str] = None) -> None:
+        """
+        Buffer embeddings and their metadata, writing full shards as they fill up.
+
+        Args:
+            embeddings (np.ndarray): Embedding rows
+            metadata (List[Dict]): One metadata dictionary per row
+            source (Optional[str]): Name of the input the rows come from, counted per shard
+        """
+        for row, meta in zip(np.asarray(embeddings, dtype=np.float32), metadata):
+            self._embeddings.append(row)
+            self._metadata.append({field: meta.get(field) for field in METADATA_FIELDS})
+            if source is not None:
+                self._sources[source] = self._sources.get(source, 0) + 1
+            if len(self._embeddings) >= self.shard_size:
+                self.flush()
+
+    def complete(self, source: str) -> None:
+        """
+        Mark a source as fully added; it is recorded as complete with the next shard.
+
+        Args:
+            source (str): Name passed to add
+        """
+        self._completed.append(source)
+
+    @property
+    def shards_written(self) -> int:
+        """Number of shards in the output directory, including those written by earlier runs"""
+        return self._shard_index
+
+    def flush(self) -> None:
+        """Write the buffered rows as a new shard."""
+        if not self._embeddings:
+            return
+        name = f"shard_{self._shard_index:05d}"
+        with open(self.output_dir / f"{name}.jsonl", 'w', encoding='utf-8') as f:
+            for meta in self._metadata:
+                f.write(json.dumps(meta) + "\n")
+        if self._sources or self._completed:
+            with open(self.output_dir / f"{name}.sources.json", 'w', encoding='utf-8') as f:
+                json.dump({'rows': self._sources, 'complete': self._completed}, f)
+        # The matrix is written last and atomically; readers only pick up complete shards, and a
+        # shard left incomplete by a crash is overwritten by the next flush
+        tmp_path = self.output_dir / f"{name}.tmp.npy"
+        np.save(tmp_path, np.stack(self._embeddings))
+        os.replace(tmp_path, self.output_dir / f"{name}.npy")
+        self._shard_index += 1
+        self._embeddings, self._metadata = [], []
+        self._sources, self._completed = {}, []
+
+
+def _read_state(path: Path, default: Dict) -> Dict:
+    """Progress recorded in a JSON file, the default when it does not exist yet"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def _write_state(path: Path, state: Dict) -> None:
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def list_shards(shard_dir: Path) -> List[str]:
+    """
+    List the complete shards of a directory.
+
+    Args:
+        shard_dir (Path): Directory written by EmbeddingShardWriter
+
+    Returns:
+        List[str]: Shard names in write order, e.g. 'shard_00000'
+    """
+    return [path.stem for path in sorted(Path(shard_dir).glob('shard_*.npy'))
+            if not path.name.endswith('.tmp.npy')]
+
+
+def iter_embedding_batches(shard_dir: Path, batch_size: int = 4096,
+                           shards: Optional[Iterable[str]] = None) -> Iterator[Tuple[np.ndarray, List[Dict]]]:
+    """
+    Stream embeddings and metadata from shards in bounded batches.
+
+    Args:
+        shard_dir (Path): Directory written by EmbeddingShardWriter
+        batch_size (int, optional): Rows per batch. Defaults to 4096
+        shards (Optional[Iterable[str]]): Names of the shards to read. Defaults to every complete shard
+
+    Yields:
+        Tuple[np.ndarray, List[Dict]]: A batch of float32 embeddings and its metadata
+    """
+    for name in (list_shards(shard_dir) if shards is None else shards):
+        shard_path = Path(shard_dir) / f"{name}.npy"
+        embeddings = np.load(shard_path, mmap_mode='r')
+        with open(shard_path.with_suffix('.jsonl'), 'r', encoding='utf-8') as f:
+            for start in range(0, embeddings.shape[0], batch_size):
+                metadata = [json.loads(line) for line in islice(f, batch_size)]
+                yield np.asarray(embeddings[start:start + batch_size], dtype=np.float32), metadata
+
+
+def shard_sources(shard_dir: Path) -> Tuple[Set[str], Dict[str, int]]:
+    """
+    Collect the sources recorded by the complete shards of a directory.
+
+    Args:
+        shard_dir (Path): Directory written by EmbeddingShardWriter
+
+    Returns:
+        Tuple[Set[str], Dict[str, int]]: Sources with all their rows in complete shards, and rows per source
+    """
+    complete, rows = set(), Counter()
+    for name in list_shards(shard_dir):
+        state = _read_state(Path(shard_dir) / f"{name}.sources.json", {'rows': {}, 'complete': []})
+        rows.update(state['rows'])
+        complete.update(state['complete'])
+    return complete, dict(rows)
+
+
+def _rebatch(batches: Iterable[Tuple[np.ndarray, List[Dict]]],
+             min_rows: int) -> Iterator[Tuple[np.ndarray, List[Dict]]]:
+    """Merge small trailing batches so every batch has at least min_rows rows where possible."""
+    pending_x, pending_meta = [], []
+    pending_rows = 0
+    for x, meta in batches:
+        pending_x.append(x)
+        pending_meta.extend(meta)
+        pending_rows += len(x)
+        if pending_rows >= min_rows:
+            yield np.concatenate(pending_x), pending_meta
+            pending_x, pending_meta, pending_rows = [], [], 0
+    if pending_rows:
+        yield np.concatenate(pending_x), pending_meta
+
+
+def embed_chunk_files(chunk_files: Iterable[Path], embedder, output_dir: Path, shard_size: int = 20000) -> int:
+    """
+    Embed chunk files one section at a time and stream the embeddings into shards.
+    Files whose rows are all in complete shards are skipped when the directory is extended
+    later, and a file cut off by an interrupted run continues after its last written row.
+
+    Args:
+        chunk_files (Iterable[Path]): '{cik}_{year}_chunks.json' files
+        embedder: Embedder exposing vectorize(List[str])
+        output_dir (Path): Directory to write shards into
+        shard_size (int, optional): Rows per shard. Defaults to 20000
+
+    Returns:
+        int: Number of chunks embedded
+    """
+    writer = EmbeddingShardWriter(output_dir, shard_size)
+    embedded, written = shard_sources(writer.output_dir)
+    count = 0
+    for chunk_file in chunk_files:
+        name = str(Path(chunk_file).resolve())
+        if name in embedded:
+            continue
+        # Rows of this file already in shards, written by a run that stopped part way through it
+        skip = written.get(name, 0)
+        with open(chunk_file, 'r', encoding='utf-8') as f:
+            chunks = json.load(f)
+        cik, year, split = chunks['cik'], chunks['year'], chunks['split']
+        for section in chunks:
+            if section in ['cik', 'year', 'split'] or not chunks[section].get('chunks'):
+                continue
+            texts = chunks[section]['chunks']
+            start = min(skip, len(texts))
+            skip -= start
+            if start == len(texts):
+                continue
+            metadata = [
+                {'chunk_id': f"{cik}_{year}_{section}_{i}", 'cik': cik, 'year': year, 'split': split, 'section': section}
+                for i in range(start, len(texts))
+            ]
+            writer.add(np.asarray(embedder.vectorize(texts[start:]), dtype=np.float32), metadata, source=name)
+            count += len(texts) - start
+        del chunks
+        writer.complete(name)
+    writer.flush()
+    return count
+
+
+class StreamingClusterer:
+    """
+    Corpus-scale topic clustering of chunk embeddings with bounded memory.
+    Streams embeddings from disk through StandardScaler, IncrementalPCA and MiniBatchKMeans
+    (all fitted with partial_fit), persists the fitted models, centroids and assignments,
+    and assigns new filings to existing clusters without refitting.
+    """
+
+    def __init__(self, model_dir: Path, n_clusters: int = 8, n_components: int = 50,
+                 batch_size: int = 4096, random_state: int = 42):
+        """
+        Initialize the StreamingClusterer.
+
+        Args:
+            model_dir (Path): Directory for the fitted models, centroids, assignments and composition
+            n_clusters (int, optional): Number of clusters. Defaults to 8
+            n_components (int, optional): PCA dimensions the clustering runs in. Defaults to 50
+            batch_size (int, optional): Rows streamed per batch. Defaults to 4096
+            random_state (int, optional): Seed for reproducible clustering. Defaults to 42
+        """
+        self.model_dir = Path(model_dir)
+        self.n_clusters = n_clusters
+        self.n_components = n_components
+        self.batch_size = max(batch_size, n_components, n_clusters)
+        self.random_state = random_state
+        self.scaler = None
+        self.pca = None
+        self.kmeans = None
+        self.composition: Dict[int, Dict] = {}
+
+    def _new_models(self):
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.decomposition import IncrementalPCA
+        from sklearn.cluster import MiniBatchKMeans
+
+        self.scaler = StandardScaler()
+        self.pca = IncrementalPCA(n_components=self.n_components)
+        self.kmeans = MiniBatchKMeans(
+            n_clusters=self.n_clusters,
+            batch_size=self.batch_size,
+            random_state=self.random_state,
+            n_init=3,
+        )
+
+    def _batches(self, shard_dir: Path) -> Iterator[Tuple[np.ndarray, List[Dict]]]:
+        # IncrementalPCA needs at least n_components rows per partial_fit call
+        return _rebatch(iter_embedding_batches(shard_dir, self.batch_size), self.batch_size)
+
+    def reduce(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Project embeddings into the fitted PCA space.
+
+        Args:
+            embeddings (np.ndarray): Raw chunk embeddings
+
+        Returns:
+            np.ndarray: Scaled and reduced embeddings
+        """
+        return self.pca.transform(self.scaler.transform(embeddings))
+
+    def fit(self, shard_dir: Path, epochs: int = 1) -> "StreamingClusterer":
+        """
+        Fit the scaler, PCA and k-means by streaming over the embedding shards.
+
+        Args:
+            shard_dir (Path): Directory written by EmbeddingShardWriter
+            epochs (int, optional): Passes of MiniBatchKMeans over the corpus. Defaults to 1
+
+        Returns:
+            StreamingClusterer: The fitted clusterer
+        """
+        self._new_models()
+        for x, _ in iter_embedding_batches(shard_dir, self.batch_size):
+            self.scaler.partial_fit(x)
+        for x, _ in self._batches(shard_dir):
+            if len(x) >= self.n_components:
+                self.pca.partial_fit(self.scaler.transform(x))
+        for _ in range(epochs):
+            for x, _ in self._batches(shard_dir):
+                if len(x) >= self.n_clusters:
+                    self.kmeans.partial_fit(self.reduce(x))
+        return self
+
+    def predict(self, embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Assign embeddings to their nearest cluster.
+
+        Args:
+            embeddings (np.ndarray): Raw chunk embeddings
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Cluster labels and distances to the assigned centroid
+        """
+        reduced = self.reduce(embeddings)
+        labels = self.kmeans.predict(reduced)
+        distances = np.linalg.norm(reduced - self.kmeans.cluster_centers_[labels], axis=1)
+        return labels, distances
+
+    def _update_composition(self, labels: np.ndarray, metadata: List[Dict]) -> None:
+        for label, meta in zip(labels.tolist(), metadata):
+            cluster = self.composition.setdefault(int(label), {'size': 0, 'sections': Counter(), 'ciks': Counter()})
+            cluster['size'] += 1
+            cluster['sections'][meta.get('section')] += 1
+            cluster['ciks'][str(meta.get('cik'))] += 1
+
+    def assign(self, batches: Iterable[Tuple[np.ndarray, List[Dict]]]) -> int:
+        """
+        Assign embeddings to clusters, appending to the persisted assignments and composition.
+        New filings are assigned this way without refitting.
+
+        Args:
+            batches (Iterable[Tuple[np.ndarray, List[Dict]]]): Embedding batches with metadata
+
+        Returns:
+            int: Number of chunks assigned
+        """
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        count = 0
+        with open(self.model_dir / 'assignments.jsonl', 'a', encoding='utf-8') as f:
+            for x, metadata in batches:
+                labels, distances = self.predict(x)
+                for meta, label, distance in zip(metadata, labels.tolist(), distances.tolist()):
+                    f.write(json.dumps({**meta, 'cluster': int(label), 'distance': round(distance, 4)}) + "\n")
+                self._update_composition(labels, metadata)
+                count += len(x)
+        self._save_composition()
+        return count
+
+    def _assign_state(self) -> Dict:
+        return _read_state(self.model_dir / 'assigned_shards.json',
+                           {'shards': [], 'assignments_bytes': 0, 'composition': {}})
+
+    def assigned_shards(self) -> List[str]:
+        """Names of the shards whose chunks are in the persisted assignments"""
+        return self._assign_state()['shards']
+
+    def assign_new(self, shard_dir: Path) -> int:
+        """
+        Assign the shards that are not in the persisted assignments yet.
+        Each shard is recorded together with the length of the assignments and the composition
+        once its assignments are written, so rerunning after new filings were embedded only assigns
+        the new shards, and rows of a shard cut off by a crash are dropped before it is assigned again.
+
+        Args:
+            shard_dir (Path): Directory written by EmbeddingShardWriter
+
+        Returns:
+            int: Number of chunks assigned
+        """
+        state = self._assign_state()
+        assignments_path = self.model_dir / 'assignments.jsonl'
+        if assignments_path.exists() and assignments_path.stat().st_size != state['assignments_bytes']:
+            with open(assignments_path, 'r+b') as f:
+                f.truncate(state['assignments_bytes'])
+            self.composition = {
+                int(label): {'size': c['size'], 'sections': Counter(c['sections']), 'ciks': Counter(c['ciks'])}
+                for label, c in state['composition'].items()
+            }
+            self._save_composition()
+        count = 0
+        for name in list_shards(shard_dir):
+            if name in state['shards']:
+                continue
+            count += self.assign(iter_embedding_batches(shard_dir, self.batch_size, [name]))
+            state['shards'].append(name)
+            state['assignments_bytes'] = assignments_path.stat().st_size
+            state['composition'] = self._serializable_composition()
+            _write_state(self.model_dir / 'assigned_shards.json', state)
+        return count
+
+    def assign_corpus(self, shard_dir: Path) -> int:
+        """
+        Replace the persisted assignments with assignments of every shard.
+
+        Args:
+            shard_dir (Path): Directory written by EmbeddingShardWriter
+
+        Returns:
+            int: Number of chunks assigned
+        """
+        (self.model_dir / 'assignments.jsonl').unlink(missing_ok=True)
+        (self.model_dir / 'assigned_shards.json').unlink(missing_ok=True)
+        self.composition = {}
+        return self.assign_new(shard_dir)
+
+    def cluster_composition(self, top: int = 5) -> Dict[int, Dict]:
+        """
+        Summarize which sections and CIKs make up each cluster.
+
+        Args:
+            top (int, optional): Number of sections and CIKs listed per cluster. Defaults to 5
+
+        Returns:
+            Dict[int, Dict]: Per cluster, its 'size' and its most common 'sections' and 'ciks' as shares
+        """
+        summary = {}
+        for label, cluster in sorted(self.composition.items()):
+            size = cluster['size']
+            summary[label] = {
+                'size': size,
+                'sections': {k: round(v / size, 3) for k, v in cluster['sections'].most_common(top)},
+                'ciks': {k: round(v / size, 3) for k, v in cluster['ciks'].most_common(top)},
+            }
+        return summary
+
+    def _serializable_composition(self) -> Dict[str, Dict]:
+        return {
+            str(label): {'size': c['size'], 'sections': dict(c['sections']), 'ciks': dict(c['ciks'])}
+            for label, c in self.composition.items()
+        }
+
+    def _save_composition(self) -> None:
+        with open(self.model_dir / 'composition.json', 'w', encoding='utf-8') as f:
+            json.dump(self._serializable_composition(), f, indent=2)
+
+    def save(self) -> None:
+        """Persist the fitted models and the centroids."""
+        import joblib
+
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        joblib.dump(
+            {'scaler': self.scaler, 'pca': self.pca, 'kmeans': self.kmeans},
+            self.model_dir / 'clusterer.joblib',
+        )
+        np.save(self.model_dir / 'centroids.npy', self.kmeans.cluster_centers_)
+
+    @classmethod
+    def load(cls, model_dir: Path, batch_size: int = 4096) -> "StreamingClusterer":
+        """
+        Load a fitted clusterer and its composition.
+
+        Args:
+            model_dir (Path): Directory the clusterer was saved to
+            batch_size (int, optional): Rows streamed per batch. Defaults to 4096
+
+        Returns:
+            StreamingClusterer: The fitted clusterer
+        """
+        import joblib
+
+        models = joblib.load(Path(model_dir) / 'clusterer.joblib')
+        clusterer = cls(
+            model_dir,
+            n_clusters=models['kmeans'].n_clusters,
+            n_components=models['pca'].n_components,
+            batch_size=batch_size,
+        )
+        clusterer.scaler, clusterer.pca, clusterer.kmeans = models['scaler'], models['pca'], models['kmeans']
+        composition_path = Path(model_dir) / 'composition.json'
+        if composition_path.exists():
+            with open(composition_path, 'r', encoding='utf-8') as f:
+                for label, c in json.load(f).items():
+                    clusterer.composition[int(label)] = {
+                        'size': c['size'], 'sections': Counter(c['sections']), 'ciks': Counter(c['ciks'])
+                    }
+        return clusterer
+
+
+def inertia_curve(shard_dir: Path, cluster_counts: List[int], n_components: int = 50,
+                  batch_size: int = 4096) -> Dict[int, float]:
+    """
+    Elbow-method inertia for several cluster counts, fitted in shared streaming passes.
+
+    Args:
+        shard_dir (Path): Directory written by EmbeddingShardWriter
+        cluster_counts (List[int]): Cluster counts to evaluate
+        n_components (int, optional): PCA dimensions. Defaults to 50
+        batch_size (int, optional): Rows streamed per batch. Defaults to 4096
+
+    Returns:
+        Dict[int, float]: Sum of squared distances to the nearest centroid per cluster count
+    """
+    base = StreamingClusterer(Path(shard_dir), n_clusters=max(cluster_counts),
+                              n_components=n_components, batch_size=batch_size)
+    base.fit(shard_dir)
+    from sklearn.cluster import MiniBatchKMeans
+
+    models = {k: MiniBatchKMeans(n_clusters=k, batch_size=base.batch_size, random_state=42, n_init=3)
+              for k in cluster_counts}
+    for x, _ in base._batches(shard_dir):
+        reduced = base.reduce(x)
+        for k, model in models.items():
+            if len(reduced) >= k:
+                model.partial_fit(reduced)
+    inertia = {k: 0.0 for k in cluster_counts}
+    for x, _ in base._batches(shard_dir):
+        reduced = base.reduce(x)
+        for k, model in models.items():
+            inertia[k] += -model.score(reduced)
+    return inertia
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming topic clustering of chunk embeddings")
+    parser.add_argument('command', choices=['embed', 'fit', 'assign', 'composition', 'elbow'])
+    parser.add_argument('--shards', default=str(PROJECT_ROOT / 'data' / 'embeddings'), help="Embedding shard directory")
+    parser.add_argument('--model-dir', default=str(PROJECT_ROOT / 'data' / 'clustering'), help="Clusterer directory")
+    parser.add_argument('--chunks', nargs='*', default=None, help="Chunk files to embed (default: all under data/)")
+    parser.add_argument('--clusters', type=int, default=8)
+    parser.add_argument('--components', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=4096)
+    args = parser.parse_args()
+
+    if args.command == 'embed':
+        from embeddings.SentenceTransformer import SentenceTransformersEmbedder
+
+        from chunking.cache import ChunkCache
+
+        files = [Path(p) for p in args.chunks] if args.chunks else ChunkCache().files()
+        print(f"Embedded {embed_chunk_files(files, SentenceTransformersEmbedder(), Path(args.shards))} chunks")
+    elif args.command == 'fit':
+        clusterer = StreamingClusterer(Path(args.model_dir), args.clusters, args.components, args.batch_size)
+        clusterer.fit(Path(args.shards))
+        clusterer.save()
+        print(f"Assigned {clusterer.assign_corpus(Path(args.shards))} chunks to {args.clusters} clusters")
+    elif args.command == 'assign':
+        clusterer = StreamingClusterer.load(Path(args.model_dir), args.batch_size)
+        print(f"Assigned {clusterer.assign_new(Path(args.shards))} new chunks")
+    elif args.command == 'composition':
+        clusterer = StreamingClusterer.load(Path(args.model_dir), args.batch_size)
+        print(json.dumps(clusterer.cluster_composition(), indent=2))
+    elif args.command == 'elbow':
+        for k, value in inertia_curve(Path(args.shards), list(range(2, args.clusters + 1)),
+                                      args.components, args.batch_size).items():
+            print(f"k={k}: inertia={value:.1f}")
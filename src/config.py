@@ -1,10 +1,80 @@
+import json
+import hashlib
+
 config = {
 
     'embeddings': {
         'sentence_transformer': {
-            'model': 'all-mpnet-base-v2'
+            'model': 'all-mpnet-base-v2',
+            'batch_size': 32,  # Maximum chunks per length-bucketed batch
+            'max_batch_tokens': 8192,  # Maximum padded tokens per batch
+            'overflow': 'split',  # Chunks over the max sequence length: 'split' into windows or 'flag' only
+            'pool_workers': 0  # Embedding worker processes for ingest, 0 or 1 encodes in-process
+        }
+    },
+    'retrieval': {
+        'reranker': {
+            'model': 'cross-encoder/ms-marco-MiniLM-L-12-v2'
+        },
+        'max_concurrent_queries': 8,  # Parallel vector queries when analyzing several filings
+        'context': {
+            'max_tokens': 2000,  # Token budget for the context passed to the LLM
+            'near_duplicate_threshold': 0.8  # Estimated Jaccard similarity treated as a duplicate passage
         }
     },
+    'llm': {
+        'model': 'gemma2-9b-it',
+        'stream': True,  # Stream answers and stop as soon as they are complete
+        'max_tokens': 64,  # Token budget per answer
+        'stop': ['\n\n', '\nQuestion:', '\nContext:', '\nExample']  # The answer ends before these
+    },
+    'analysis': {
+        'cpu_concurrency': 1,  # Concurrent query embedding and reranking calls per filing analysis
+        'vector_concurrency': 4,  # Concurrent vector queries and chunk lookups
+        'llm_concurrency': 4  # Concurrent answer generation calls
+    },
+    'inference': {
+        'backend': 'torch',  # Options: 'torch', 'torch_int8', 'onnx'
+        'num_threads': None,  # Intra-op threads per process, None uses every available core
+        'cache_dir': 'models'  # Converted model artifacts, relative to the project root
+    },
+    'sharding': {
+        'scheme': 'cik_year',  # Options: 'cik_year' (a namespace per filing), 'year_split', 'single'
+        'prefix': '',  # Prefix of every namespace name
+        'namespace': 'ns1',  # Namespace of the 'single' scheme
+        'namespace_ttl': 60  # Seconds the list of existing namespaces is reused for fan-out queries
+    },
+    'chunk_store': {
+        'path': 'data/chunk_store.sqlite3',  # Chunk text keyed by vector ID, relative to the project root
+        'cache_size': 20000  # Chunks kept in the in-memory LRU
+    },
+    'dedup': {
+        'enabled': True,  # Reuse embeddings of chunks repeated from a company's other filings
+        'path': 'data/dedup',  # Per-CIK MinHash LSH indexes, relative to the project root
+        'threshold': 0.9  # Estimated Jaccard similarity treated as a duplicate chunk
+    },
+    'fetcher': {
+        'max_connections_per_host': 4,  # Concurrent requests per site (all sec.gov hosts count as one)
+        'requests_per_second': 8,  # Per site; SEC fair access allows at most 10
+        'max_retries': 5,  # Retries of throttled (429), 5xx and connection failures
+        'timeout': 30,  # Seconds per request
+        'miss_ttl': 600  # Seconds the app waits before requesting a filing it could not fetch again
+    },
+    'service': {
+        'host': '127.0.0.1',
+        'port': 8080,
+        'batch_max_items': 256,  # Question embeddings or cross-encoder pairs merged into one call
+        'batch_max_wait_ms': 5  # How long a model call waits for concurrent requests to join it
+    },
+    'profiling': {
+        'sample_every': 0,  # Profile one analysis run in N, 0 only when requested (sidebar, EDGAR_PROFILE=1)
+        'interval_ms': 10,  # Stack sampling interval
+        'trace_memory': True,  # tracemalloc snapshots at stage boundaries
+        'trace_sampled_memory': False,  # Also for runs picked by sample_every; tracemalloc slows every allocation
+        'traceback_frames': 1,  # Frames stored per traced allocation; more cost more overhead
+        'top_allocations': 20,  # Allocation sites listed per stage
+        'output_dir': 'data/profiles'  # Relative to the project root
+    },
     'chunking': {
         'method': 'nltk',  # Options: 'gpt2', 'nltk', 'character_and_token'
         'model': 'gpt2',
@@ -16,4 +86,15 @@ config = {
             'k': 10   # TextTiling smoothing parameter
         }
     }
-}
\ No newline at end of file
+}
+
+
+def get_config_hash() -> str:
+    """
+    Get a stable short hash of the configuration, used to key cached results.
+
+    Returns:
+        str: Hex digest of the sorted configuration
+    """
+    serialized = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,3 @@
+"""
+This module contains near-duplicate text detection functionality.
+"""
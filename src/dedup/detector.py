@@ -0,0 +1,291 @@
+import os
+import sys
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+from dedup.minhash import MinHasher, estimate_jaccard
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+
+
+@dataclass
+class DedupReport:
+    """Near-duplicate statistics for one filing"""
+    cik: str
+    year: int
+    total: int = 0
+    reused: int = 0
+
+    @property
+    def ratio(self) -> float:
+        return self.reused / self.total if self.total else 0.0
+
+
+class NearDuplicateIndex:
+    """
+    MinHash LSH index over one company's chunks, with the embedding stored for each chunk.
+    Persisted as 'signatures.npy', 'embeddings.npy', 'entries.json' and 'model.json' in its own
+    directory. An index written for another embedding model or inference backend is discarded
+    on load, since its embeddings cannot be mixed with new ones.
+    """
+
+    # Rows added when the arrays run out of space, at least; capacity otherwise doubles
+    MIN_GROWTH = 1024
+
+    def __init__(self, directory: Path, num_perm: int, bands: int, embedding_key: str = ''):
+        """
+        Initialize the index, loading it from disk if it exists.
+
+        Args:
+            directory (Path): Directory holding this company's index
+            num_perm (int): MinHash signature length
+            bands (int): Number of LSH bands; num_perm must be divisible by it
+            embedding_key (str, optional): Embedding model and inference backend the stored
+                embeddings come from. Defaults to ''
+        """
+        self.directory = Path(directory)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.embedding_key = embedding_key
+        self.entries: List[Dict] = []
+        self._signatures = np.zeros((0, num_perm), dtype=np.uint64)
+        self._embeddings: Optional[np.ndarray] = None
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+
+        if (self.directory / 'entries.json').exists() and self._stored_key() == embedding_key:
+            with open(self.directory / 'entries.json', 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+            self._signatures = np.load(self.directory / 'signatures.npy')
+            self._embeddings = np.load(self.directory / 'embeddings.npy')
+            for row, signature in enumerate(self.signatures):
+                self._add_to_buckets(row, signature)
+
+    def _stored_key(self) -> Optional[str]:
+        try:
+            with open(self.directory / 'model.json', 'r', encoding='utf-8') as f:
+                return json.load(f).get('embedding_key')
+        except FileNotFoundError:
+            return None
+
+    @property
+    def signatures(self) -> np.ndarray:
+        """MinHash signature of each indexed chunk"""
+        return self._signatures[:len(self.entries)]
+
+    @property
+    def embeddings(self) -> Optional[np.ndarray]:
+        """Embedding of each indexed chunk, or None while the index is empty"""
+        return None if self._embeddings is None else self._embeddings[:len(self.entries)]
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def _add_to_buckets(self, row: int, signature: np.ndarray) -> None:
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(row)
+
+    def query(self, signature: np.ndarray, threshold: float, exclude_year: int,
+              vector_id: str) -> Optional[Tuple[int, float]]:
+        """
+        Find the most similar indexed chunk from another year, or the same chunk indexed before.
+
+        Args:
+            signature (np.ndarray): MinHash signature of the new chunk
+            threshold (float): Minimum estimated Jaccard similarity
+            exclude_year (int): Year of the new chunk; other chunks of that filing do not count
+            vector_id (str): Vector ID of the new chunk
+
+        Returns:
+            Optional[Tuple[int, float]]: Row of the best match and its similarity, or None
+        """
+        candidates = {row for key in self._band_keys(signature) for row in self._buckets.get(key, [])}
+        best = None
+        for row in candidates:
+            entry = self.entries[row]
+            if entry['year'] == exclude_year and entry['id'] != vector_id:
+                continue
+            similarity = estimate_jaccard(signature, self._signatures[row])
+            if similarity >= threshold and (best is None or similarity > best[1]):
+                best = (row, similarity)
+        return best
+
+    @classmethod
+    def _grow(cls, array: np.ndarray, rows: int) -> np.ndarray:
+        """Return array with room for at least rows rows, copying it only when it is full."""
+        if rows <= len(array):
+            return array
+        grown = np.empty((max(rows, 2 * len(array), cls.MIN_GROWTH),) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def extend(self, records: List[Tuple[str, int]], signatures: np.ndarray, embeddings: np.ndarray) -> None:
+        """
+        Add chunks and their embeddings to the index.
+        The arrays grow geometrically, so adding n chunks in small batches copies O(n) rows.
+
+        Args:
+            records (List[Tuple[str, int]]): (vector ID, year) of each chunk
+            signatures (np.ndarray): One MinHash signature per chunk
+            embeddings (np.ndarray): One embedding per chunk
+        """
+        if not records:
+            return
+        start, end = len(self.entries), len(self.entries) + len(records)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self._embeddings is None:
+            self._embeddings = np.zeros((0, embeddings.shape[1]), dtype=np.float32)
+        self._signatures = self._grow(self._signatures, end)
+        self._embeddings = self._grow(self._embeddings, end)
+        self._signatures[start:end] = signatures
+        self._embeddings[start:end] = embeddings
+        self.entries.extend({'id': vector_id, 'year': year} for vector_id, year in records)
+        for offset, signature in enumerate(signatures):
+            self._add_to_buckets(start + offset, signature)
+
+    def save(self) -> None:
+        """Persist the index, replacing each file atomically."""
+        if self.embeddings is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for name, array in [('signatures', self.signatures), ('embeddings', self.embeddings)]:
+            tmp_path = self.directory / f"{name}.tmp.npy"
+            np.save(tmp_path, array)
+            os.replace(tmp_path, self.directory / f"{name}.npy")
+        for name, content in [('entries.json', self.entries), ('model.json', {'embedding_key': self.embedding_key})]:
+            tmp_path = self.directory / f"{name}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(content, f)
+            os.replace(tmp_path, self.directory / name)
+
+
+class NearDuplicateDetector:
+    """
+    Ingest-time detector of chunks that repeat a company's earlier filings.
+    Keeps a MinHash LSH index of chunk shingles per CIK and reuses the stored embedding
+    of a near-duplicate chunk instead of encoding it again.
+    """
+
+    def __init__(self, root_dir: Optional[str] = None, threshold: Optional[float] = None,
+                 num_perm: int = 128, bands: int = 16):
+        """
+        Initialize the NearDuplicateDetector.
+
+        Args:
+            root_dir (Optional[str]): Directory of the per-CIK indexes. Defaults to config['dedup']['path']
+            threshold (Optional[float]): Estimated Jaccard similarity treated as a duplicate.
+                Defaults to config['dedup']['threshold']
+            num_perm (int, optional): MinHash signature length. Defaults to 128
+            bands (int, optional): LSH bands; more bands find lower similarities. Defaults to 16
+        """
+        settings = config.get('dedup', {})
+        root_dir = Path(root_dir or settings.get('path', 'data/dedup'))
+        self.root_dir = root_dir if root_dir.is_absolute() else PROJECT_ROOT / root_dir
+        self.threshold = threshold or settings.get('threshold', 0.9)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.minhasher = MinHasher(num_perm=num_perm)
+        self._indexes: Dict[str, NearDuplicateIndex] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def embedding_key() -> str:
+        """The configured embedding model and inference backend, which stored embeddings must match"""
+        from embeddings.backends import canonical_model_name, get_inference_config
+
+        model = config.get('embeddings', {}).get('sentence_transformer', {}).get('model', '')
+        return f"{canonical_model_name(model)}@{get_inference_config()['backend']}"
+
+    def index_for(self, cik: str) -> NearDuplicateIndex:
+        """
+        Get the index of a company, loading it on first use.
+        An index built for another embedding model or inference backend is replaced by an empty one.
+
+        Args:
+            cik (str): Company CIK number
+
+        Returns:
+            NearDuplicateIndex: The company's index
+        """
+        cik = str(cik)
+        key = self.embedding_key()
+        index = self._indexes.get(cik)
+        if index is None or index.embedding_key != key:
+            index = NearDuplicateIndex(self.root_dir / cik, self.num_perm, self.bands, key)
+            self._indexes[cik] = index
+        return index
+
+    def save(self, cik: str) -> None:
+        """
+        Persist a company's index, typically once a filing has been ingested.
+
+        Args:
+            cik (str): Company CIK number
+        """
+        with self._lock:
+            self.index_for(cik).save()
+
+    def evict(self, cik: str) -> None:
+        """
+        Drop a company's index from memory, typically once its filing is saved.
+        It is loaded from disk again when the company's next filing is embedded, so a run
+        over many companies only holds the index of the filing in progress.
+
+        Args:
+            cik (str): Company CIK number
+        """
+        with self._lock:
+            self._indexes.pop(str(cik), None)
+
+    def embed(self, cik: str, year: int, vector_ids: List[str], texts: List[str],
+              vectorize: Callable[[List[str]], List[List[float]]],
+              report: Optional[DedupReport] = None) -> List[List[float]]:
+        """
+        Embed chunks, reusing stored embeddings of near-duplicates from the company's other filings.
+
+        Args:
+            cik (str): Company CIK number
+            year (int): Filing year
+            vector_ids (List[str]): Vector ID of each chunk
+            texts (List[str]): Chunk texts
+            vectorize (Callable[[List[str]], List[List[float]]]): Embeds the chunks that are not duplicates
+            report (Optional[DedupReport]): Report to add this batch's counts to
+
+        Returns:
+            List[List[float]]: One embedding per chunk, in input order
+        """
+        signatures = np.stack([self.minhasher.text_signature(text) for text in texts]) if texts \
+            else np.zeros((0, self.num_perm), dtype=np.uint64)
+
+        # The lock only covers the index lookups and inserts; encoding runs unlocked, so
+        # batches of other filings are not held up while this one is embedded
+        with self._lock:
+            index = self.index_for(cik)
+            matches = [index.query(signature, self.threshold, year, vector_id)
+                       for signature, vector_id in zip(signatures, vector_ids)]
+            embeddings: List[Optional[List[float]]] = [
+                index.embeddings[match[0]].tolist() if match is not None else None for match in matches
+            ]
+
+        new_rows = [i for i, match in enumerate(matches) if match is None]
+        if new_rows:
+            new_embeddings = np.asarray(vectorize([texts[i] for i in new_rows]), dtype=np.float32)
+            for offset, i in enumerate(new_rows):
+                embeddings[i] = new_embeddings[offset].tolist()
+            with self._lock:
+                index.extend(
+                    [(vector_ids[i], year) for i in new_rows],
+                    signatures[new_rows],
+                    new_embeddings,
+                )
+
+        if report is not None:
+            report.total += len(texts)
+            report.reused += len(texts) - len(new_rows)
+        return embeddings
@@ -0,0 +1,122 @@
+import re
+import zlib
+from typing import Iterable, Set
+
+import numpy as np
+
+# Mersenne prime for the universal hash family; 32-bit shingle hashes times
+# coefficients below it stay within uint64 without overflow.
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for duplicate detection: lowercase words separated by single spaces.
+
+    Args:
+        text (str): Text to normalize
+
+    Returns:
+        str: Normalized text
+    """
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def shingles(text: str, size: int = 5) -> Set[int]:
+    """
+    Hash the overlapping word n-grams of a text.
+
+    Args:
+        text (str): Text to shingle
+        size (int, optional): Words per shingle. Defaults to 5
+
+    Returns:
+        Set[int]: 32-bit hashes of the shingles; texts shorter than one shingle yield a single hash
+    """
+    words = normalize_text(text).split()
+    if len(words) <= size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i:i + size]).encode("utf-8"))
+        for i in range(len(words) - size + 1)
+    }
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    """
+    Exact Jaccard similarity of two shingle sets.
+
+    Args:
+        a (Set[int]): First shingle set
+        b (Set[int]): Second shingle set
+
+    Returns:
+        float: Size of the intersection over size of the union
+    """
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """
+    Compute MinHash signatures whose agreement rate estimates Jaccard similarity.
+    """
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        """
+        Initialize the MinHasher.
+
+        Args:
+            num_perm (int, optional): Number of hash permutations per signature. Defaults to 128
+            seed (int, optional): Seed for the permutation coefficients. Defaults to 1
+        """
+        self.num_perm = num_perm
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, int(_MERSENNE_PRIME), size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, int(_MERSENNE_PRIME), size=num_perm).astype(np.uint64)
+
+    def signature(self, shingle_set: Iterable[int]) -> np.ndarray:
+        """
+        Compute the MinHash signature of a shingle set.
+
+        Args:
+            shingle_set (Iterable[int]): 32-bit shingle hashes
+
+        Returns:
+            np.ndarray: uint64 signature of length num_perm
+        """
+        values = np.fromiter(shingle_set, dtype=np.uint64)
+        if values.size == 0:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        hashed = (np.outer(values, self._a) + self._b) % _MERSENNE_PRIME
+        return hashed.min(axis=0)
+
+    def text_signature(self, text: str, size: int = 5) -> np.ndarray:
+        """
+        Compute the MinHash signature of a text's shingles.
+
+        Args:
+            text (str): Text to sign
+            size (int, optional): Words per shingle. Defaults to 5
+
+        Returns:
+            np.ndarray: uint64 signature of length num_perm
+        """
+        return self.signature(shingles(text, size))
+
+
+def estimate_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Estimate the Jaccard similarity of two texts from their MinHash signatures.
+
+    Args:
+        a (np.ndarray): First signature
+        b (np.ndarray): Second signature
+
+    Returns:
+        float: Fraction of agreeing signature positions
+    """
+    return float(np.mean(a == b))
@@ -1,8 +1,10 @@
 import sys
 import os
+import threading
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import config
-from sentence_transformers import SentenceTransformer
+from embeddings.backends import load_sentence_transformer
+from embeddings.scheduler import EmbeddingScheduler, ScheduleReport
 
 
 
@@ -20,10 +22,57 @@ class SentenceTransformersEmbedder():
         self.config = {
             "Model": config.get('embeddings', {}).get('sentence_transformer', {}).get('model')
         }
+        self._model = None
+        self._scheduler = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.last_report = ScheduleReport()
+
+    @property
+    def model(self):
+        """
+        The embedding model, loaded once on the configured inference backend.
+        """
+        if self._model is None:
+            self._model = load_sentence_transformer(self.config.get("Model"))
+        return self._model
+
+    @property
+    def scheduler(self) -> EmbeddingScheduler:
+        """
+        The length-bucketed batch scheduler for the embedding model.
+        """
+        if self._scheduler is None:
+            settings = config.get('embeddings', {}).get('sentence_transformer', {})
+            self._scheduler = EmbeddingScheduler(
+                self.model,
+                batch_size=settings.get('batch_size', 32),
+                max_batch_tokens=settings.get('max_batch_tokens', 8192),
+                overflow=settings.get('overflow', 'split'),
+            )
+        return self._scheduler
+
+    @property
+    def pool(self):
+        """
+        The multi-process embedding pool, started on first use when pool_workers is above 1.
+        """
+        workers = config.get('embeddings', {}).get('sentence_transformer', {}).get('pool_workers', 0)
+        if self._pool is None and workers and workers > 1:
+            from embeddings.pool import EmbeddingPool
+
+            # Two threads embedding at once must not start two pools
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = EmbeddingPool(workers)
+        return self._pool
 
     def vectorize(self, content: list[str]) -> list[float]:
         """
         Generates vector embeddings for the provided content using the specified SentenceTransformer model.
+        Content is encoded in length-bucketed batches, across worker processes when pool_workers is
+        set; statistics of the call, including chunks longer than the model's maximum sequence
+        length, are kept in last_report.
 
         Args:
             content (list[str]): A list of text strings to be vectorized.
@@ -35,9 +84,9 @@ class SentenceTransformersEmbedder():
             Exception: If vectorization fails due to an error in the embedding process.
         """
         try:
-            model_name = self.config.get("Model")
-            model = SentenceTransformer(model_name)
-            embeddings = model.encode(content).tolist()
+            encoder = self.pool or self.scheduler
+            embeddings, self.last_report = encoder.encode(content)
+            embeddings = embeddings.tolist()
             return embeddings
         except Exception as e:
             raise Exception(f"Failed to vectorize chunks: {str(e)}")
@@ -0,0 +1,550 @@
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+
+BACKENDS = ('torch', 'torch_int8', 'onnx')
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+
+
+def get_inference_config() -> Dict:
+    """
+    Return the inference settings with defaults filled in.
+
+    Returns:
+        Dict: Settings with 'backend', 'num_threads' and 'cache_dir' keys
+    """
+    settings = config.get('inference', {})
+    return {
+        'backend': settings.get('backend', 'torch'),
+        'num_threads': settings.get('num_threads'),
+        'cache_dir': settings.get('cache_dir', 'models'),
+    }
+
+
+def resolve_num_threads(num_threads: Optional[int] = None) -> int:
+    """
+    Resolve the intra-op thread count, defaulting to the cores this process may run on.
+
+    Args:
+        num_threads (Optional[int]): Explicit thread count, or None for the configured value
+
+    Returns:
+        int: Number of intra-op threads to use
+    """
+    if num_threads is None:
+        num_threads = get_inference_config()['num_threads']
+    if num_threads:
+        return int(num_threads)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def pin_torch_threads(num_threads: Optional[int] = None) -> int:
+    """
+    Pin PyTorch intra-op threads and keep inter-op parallelism to a single thread.
+
+    Args:
+        num_threads (Optional[int]): Explicit thread count, or None for the configured value
+
+    Returns:
+        int: Number of intra-op threads applied
+    """
+    import torch
+
+    num_threads = resolve_num_threads(num_threads)
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Inter-op threads can only be set once, before any parallel work has started
+        pass
+    return num_threads
+
+
+def canonical_model_name(model_name: str) -> str:
+    """
+    Normalize a model name to its full Hugging Face ID.
+    sentence-transformers resolves a bare name such as 'all-mpnet-base-v2' to
+    'sentence-transformers/all-mpnet-base-v2', so both spellings name the same model and
+    must share one artifact directory and one loaded instance. Local paths are kept as given.
+
+    Args:
+        model_name (str): Hugging Face model name, with or without its organization, or a local path
+
+    Returns:
+        str: Model name including its organization
+    """
+    if '/' in model_name or os.path.isdir(model_name):
+        return model_name
+    return f"sentence-transformers/{model_name}"
+
+
+def get_artifact_dir(model_name: str, backend: str) -> Path:
+    """
+    Get the on-disk cache directory for a converted model.
+
+    Args:
+        model_name (str): Hugging Face model name
+        backend (str): Inference backend the artifact belongs to
+
+    Returns:
+        Path: Directory holding the converted artifacts
+    """
+    cache_dir = Path(get_inference_config()['cache_dir'])
+    if not cache_dir.is_absolute():
+        cache_dir = PROJECT_ROOT / cache_dir
+    return cache_dir / backend / canonical_model_name(model_name).replace('/', '--')
+
+
+def _atomic_torch_save(obj, path: Path) -> None:
+    """Save a torch object so that a crashed run never leaves a truncated artifact."""
+    import torch
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    torch.save(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _quantize(module):
+    """Apply dynamic int8 quantization to every Linear layer of a module."""
+    import torch
+
+    module.eval()
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _onnx_session(model_path: Path, num_threads: int):
+    """Create an ONNX Runtime CPU session with pinned thread counts."""
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise ImportError("The 'onnx' inference backend requires onnxruntime: pip install onnxruntime")
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = num_threads
+    options.inter_op_num_threads = 1
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(str(model_path), options, providers=['CPUExecutionProvider'])
+
+
+class OnnxSentenceEncoder:
+    """
+    ONNX Runtime replacement for SentenceTransformer.encode.
+    Pooling and normalization are part of the exported graph, so outputs match the torch model.
+    """
+
+    def __init__(self, artifact_dir: Path, num_threads: int):
+        from transformers import AutoTokenizer
+
+        with open(artifact_dir / 'meta.json', 'r') as f:
+            meta = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(str(artifact_dir))
+        self.max_seq_length = meta['max_seq_length']
+        self.dimension = meta['dimension']
+        self.session = _onnx_session(artifact_dir / 'model.onnx', num_threads)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        """
+        Encode sentences into embeddings.
+
+        Args:
+            sentences (Union[str, List[str]]): Text or list of texts to encode
+            batch_size (int, optional): Number of texts per inference call. Defaults to 32
+
+        Returns:
+            np.ndarray: A single embedding for a string input, otherwise one row per text
+        """
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        # Sort by length so each batch pads to similar lengths, then restore the input order
+        order = np.argsort([-len(s) for s in sentences])
+        embeddings = np.zeros((len(sentences), self.dimension), dtype=np.float32)
+        for start in range(0, len(sentences), batch_size):
+            batch_idx = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [sentences[i] for i in batch_idx],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np',
+            )
+            outputs = self.session.run(None, {
+                'input_ids': encoded['input_ids'].astype(np.int64),
+                'attention_mask': encoded['attention_mask'].astype(np.int64),
+            })
+            embeddings[batch_idx] = outputs[0]
+        return embeddings[0] if single else embeddings
+
+
+class OnnxCrossEncoder:
+    """
+    ONNX Runtime replacement for CrossEncoder.predict.
+    """
+
+    def __init__(self, artifact_dir: Path, num_threads: int):
+        from transformers import AutoTokenizer
+
+        with open(artifact_dir / 'meta.json', 'r') as f:
+            meta = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(str(artifact_dir))
+        self.max_length = meta['max_length']
+        self.num_labels = meta['num_labels']
+        self.session = _onnx_session(artifact_dir / 'model.onnx', num_threads)
+
+    def predict(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        """
+        Score (query, passage) pairs.
+
+        Args:
+            sentences (List[Tuple[str, str]]): Pairs to score
+            batch_size (int, optional): Number of pairs per inference call. Defaults to 32
+
+        Returns:
+            np.ndarray: One relevance score per pair, with the same activation CrossEncoder applies
+        """
+        scores = []
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            encoded = self.tokenizer(
+                [pair[0] for pair in batch],
+                [pair[1] for pair in batch],
+                padding=True,
+                truncation='longest_first',
+                max_length=self.max_length,
+                return_tensors='np',
+            )
+            token_type_ids = encoded.get('token_type_ids', np.zeros_like(encoded['input_ids']))
+            logits = self.session.run(None, {
+                'input_ids': encoded['input_ids'].astype(np.int64),
+                'attention_mask': encoded['attention_mask'].astype(np.int64),
+                'token_type_ids': token_type_ids.astype(np.int64),
+            })[0]
+            scores.append(logits)
+        if not scores:
+            return np.array([], dtype=np.float32)
+        logits = np.concatenate(scores)
+        if self.num_labels == 1:
+            return 1 / (1 + np.exp(-logits[:, 0]))
+        return logits
+
+
+def _export_sentence_transformer(model_name: str, artifact_dir: Path) -> None:
+    """Export a SentenceTransformer, tokenizer and metadata to an ONNX artifact directory."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    class SentenceEmbeddingGraph(torch.nn.Module):
+        """Expose the model as a plain tensor-in, tensor-out module."""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            features = self.model({'input_ids': input_ids, 'attention_mask': attention_mask})
+            return features['sentence_embedding']
+
+    model = SentenceTransformer(model_name, device='cpu')
+    model.eval()
+    artifact_dir.mkdir(parents=True, exist_ok=True)
+    dummy = model.tokenizer(["warm up"], return_tensors='pt')
+    tmp_path = artifact_dir / 'model.onnx.tmp'
+    torch.onnx.export(
+        SentenceEmbeddingGraph(model),
+        (dummy['input_ids'], dummy['attention_mask']),
+        str(tmp_path),
+        input_names=['input_ids', 'attention_mask'],
+        output_names=['sentence_embedding'],
+        dynamic_axes={
+            'input_ids': {0: 'batch', 1: 'sequence'},
+            'attention_mask': {0: 'batch', 1: 'sequence'},
+            'sentence_embedding': {0: 'batch'},
+        },
+        opset_version=14,
+    )
+    model.tokenizer.save_pretrained(str(artifact_dir))
+    with open(artifact_dir / 'meta.json', 'w') as f:
+        json.dump({
+            'model_name': model_name,
+            'max_seq_length': model.max_seq_length,
+            'dimension': model.get_sentence_embedding_dimension(),
+        }, f)
+    os.replace(tmp_path, artifact_dir / 'model.onnx')
+
+
+def _export_cross_encoder(model_name: str, artifact_dir: Path) -> None:
+    """Export a CrossEncoder, tokenizer and metadata to an ONNX artifact directory."""
+    import torch
+    from sentence_transformers import CrossEncoder
+
+    class CrossEncoderGraph(torch.nn.Module):
+        """Expose the classifier as a plain tensor-in, tensor-out module."""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                token_type_ids=token_type_ids,
+            ).logits
+
+    model = CrossEncoder(model_name, device='cpu')
+    model.model.eval()
+    artifact_dir.mkdir(parents=True, exist_ok=True)
+    dummy = model.tokenizer(["warm up"], ["warm up"], return_tensors='pt')
+    token_type_ids = dummy.get('token_type_ids', torch.zeros_like(dummy['input_ids']))
+    tmp_path = artifact_dir / 'model.onnx.tmp'
+    torch.onnx.export(
+        CrossEncoderGraph(model.model),
+        (dummy['input_ids'], dummy['attention_mask'], token_type_ids),
+        str(tmp_path),
+        input_names=['input_ids', 'attention_mask', 'token_type_ids'],
+        output_names=['logits'],
+        dynamic_axes={
+            'input_ids': {0: 'batch', 1: 'sequence'},
+            'attention_mask': {0: 'batch', 1: 'sequence'},
+            'token_type_ids': {0: 'batch', 1: 'sequence'},
+            'logits': {0: 'batch'},
+        },
+        opset_version=14,
+    )
+    model.tokenizer.save_pretrained(str(artifact_dir))
+    with open(artifact_dir / 'meta.json', 'w') as f:
+        json.dump({
+            'model_name': model_name,
+            'max_length': model.max_length or model.tokenizer.model_max_length,
+            'num_labels': model.config.num_labels,
+        }, f)
+    os.replace(tmp_path, artifact_dir / 'model.onnx')
+
+
+def load_sentence_transformer(model_name: str, backend: Optional[str] = None,
+                              num_threads: Optional[int] = None):
+    """
+    Load a sentence embedding model on the selected CPU inference backend.
+    The model is loaded once per process and backend; later calls, including ones naming
+    the model without its organization, share that instance.
+
+    Args:
+        model_name (str): SentenceTransformer model name
+        backend (Optional[str]): 'torch', 'torch_int8' or 'onnx'. Defaults to config['inference']['backend']
+        num_threads (Optional[int]): Intra-op threads. Defaults to config['inference']['num_threads']
+
+    Returns:
+        SentenceTransformer or OnnxSentenceEncoder: A model exposing encode()
+
+    Raises:
+        ValueError: If an unsupported backend is specified
+    """
+    from resources import get_resource
+
+    model_name = canonical_model_name(model_name)
+    backend = backend or get_inference_config()['backend']
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported inference backend: {backend}")
+    return get_resource(f"sentence_transformer:{backend}:{model_name}",
+                        lambda: _load_sentence_transformer(model_name, backend, num_threads))
+
+
+def _load_sentence_transformer(model_name: str, backend: str, num_threads: Optional[int]):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    num_threads = pin_torch_threads(num_threads)
+
+    if backend == 'torch':
+        return SentenceTransformer(model_name, device='cpu')
+    elif backend == 'torch_int8':
+        artifact = get_artifact_dir(model_name, backend) / 'model.pt'
+        if artifact.exists():
+            return torch.load(artifact)
+        model = _quantize(SentenceTransformer(model_name, device='cpu'))
+        _atomic_torch_save(model, artifact)
+        return model
+    elif backend == 'onnx':
+        artifact_dir = get_artifact_dir(model_name, backend)
+        if not (artifact_dir / 'model.onnx').exists():
+            _export_sentence_transformer(model_name, artifact_dir)
+        return OnnxSentenceEncoder(artifact_dir, num_threads)
+    else:
+        raise ValueError(f"Unsupported inference backend: {backend}")
+
+
+def load_cross_encoder(model_name: str, backend: Optional[str] = None,
+                       num_threads: Optional[int] = None):
+    """
+    Load a cross-encoder reranker on the selected CPU inference backend.
+    The model is loaded, and for 'torch_int8' quantized, once per process and backend.
+
+    Args:
+        model_name (str): CrossEncoder model name
+        backend (Optional[str]): 'torch', 'torch_int8' or 'onnx'. Defaults to config['inference']['backend']
+        num_threads (Optional[int]): Intra-op threads. Defaults to config['inference']['num_threads']
+
+    Returns:
+        CrossEncoder or OnnxCrossEncoder: A model exposing predict()
+
+    Raises:
+        ValueError: If an unsupported backend is specified
+    """
+    from resources import get_resource
+
+    model_name = canonical_model_name(model_name)
+    backend = backend or get_inference_config()['backend']
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported inference backend: {backend}")
+    return get_resource(f"cross_encoder:{backend}:{model_name}",
+                        lambda: _load_cross_encoder(model_name, backend, num_threads))
+
+
+def _load_cross_encoder(model_name: str, backend: str, num_threads: Optional[int]):
+    import torch
+    from sentence_transformers import CrossEncoder
+
+    num_threads = pin_torch_threads(num_threads)
+
+    if backend == 'torch':
+        return CrossEncoder(model_name, device='cpu')
+    elif backend == 'torch_int8':
+        # CrossEncoder is not an nn.Module, so only its classifier is quantized and cached
+        model = CrossEncoder(model_name, device='cpu')
+        artifact = get_artifact_dir(model_name, backend) / 'model.pt'
+        if artifact.exists():
+            model.model = torch.load(artifact)
+        else:
+            model.model = _quantize(model.model)
+            _atomic_torch_save(model.model, artifact)
+        return model
+    elif backend == 'onnx':
+        artifact_dir = get_artifact_dir(model_name, backend)
+        if not (artifact_dir / 'model.onnx').exists():
+            _export_cross_encoder(model_name, artifact_dir)
+        return OnnxCrossEncoder(artifact_dir, num_threads)
+    else:
+        raise ValueError(f"Unsupported inference backend: {backend}")
+
+
+def _rank_agreement(reference: np.ndarray, candidate: np.ndarray, top_k: int) -> Dict[str, float]:
+    """Compare two score vectors by Spearman rank correlation and top-k overlap."""
+    n = len(reference)
+    ref_rank = np.empty(n)
+    ref_rank[np.argsort(-reference)] = np.arange(n)
+    cand_rank = np.empty(n)
+    cand_rank[np.argsort(-candidate)] = np.arange(n)
+    spearman = 1.0 if n < 2 else float(1 - 6 * np.sum((ref_rank - cand_rank) ** 2) / (n * (n ** 2 - 1)))
+    k = min(top_k, n)
+    overlap = len(set(np.argsort(-reference)[:k]) & set(np.argsort(-candidate)[:k])) / max(k, 1)
+    return {'spearman': spearman, 'top_k_overlap': overlap}
+
+
+def check_parity(backend: str, queries: List[str], passages: List[str], top_k: int = 10) -> Dict[str, float]:
+    """
+    Compare a backend against the full-precision torch models.
+
+    Reports the cosine similarity between reference and backend embeddings, and the rank
+    agreement of both the embedding retrieval order and the reranker order per query.
+
+    Args:
+        backend (str): Backend to check ('torch_int8' or 'onnx')
+        queries (List[str]): Queries to rank passages for
+        passages (List[str]): Passages to embed and rerank
+        top_k (int, optional): Cut-off for the top-k overlap. Defaults to 10
+
+    Returns:
+        Dict[str, float]: Worst-case and mean parity metrics
+    """
+    embedding_model = config['embeddings']['sentence_transformer']['model']
+    reranker_model = config['retrieval']['reranker']['model']
+
+    ref_embedder = load_sentence_transformer(embedding_model, backend='torch')
+    new_embedder = load_sentence_transformer(embedding_model, backend=backend)
+    ref_passages = np.asarray(ref_embedder.encode(passages))
+    new_passages = np.asarray(new_embedder.encode(passages))
+    ref_queries = np.asarray(ref_embedder.encode(queries))
+    new_queries = np.asarray(new_embedder.encode(queries))
+
+    def normalize(x):
+        return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+    cosine = np.sum(normalize(ref_passages) * normalize(new_passages), axis=1)
+
+    ref_reranker = load_cross_encoder(reranker_model, backend='torch')
+    new_reranker = load_cross_encoder(reranker_model, backend=backend)
+
+    retrieval, rerank = [], []
+    for i, query in enumerate(queries):
+        retrieval.append(_rank_agreement(
+            normalize(ref_passages) @ normalize(ref_queries[i:i + 1])[0],
+            normalize(new_passages) @ normalize(new_queries[i:i + 1])[0],
+            top_k,
+        ))
+        pairs = [(query, passage) for passage in passages]
+        rerank.append(_rank_agreement(
+            np.asarray(ref_reranker.predict(pairs)),
+            np.asarray(new_reranker.predict(pairs)),
+            top_k,
+        ))
+
+    return {
+        'embedding_cosine_min': float(cosine.min()),
+        'embedding_cosine_mean': float(cosine.mean()),
+        'retrieval_spearman_mean': float(np.mean([r['spearman'] for r in retrieval])),
+        'retrieval_top_k_overlap_mean': float(np.mean([r['top_k_overlap'] for r in retrieval])),
+        'rerank_spearman_mean': float(np.mean([r['spearman'] for r in rerank])),
+        'rerank_top_k_overlap_mean': float(np.mean([r['top_k_overlap'] for r in rerank])),
+    }
+
+
+def _load_sample_passages(limit: int) -> List[str]:
+    """Collect chunk texts cached for the configured chunking variant."""
+    from chunking.cache import ChunkCache
+
+    passages = []
+    for chunks_file in ChunkCache().files():
+        with open(chunks_file, 'r', encoding='utf-8') as f:
+            chunks = json.load(f)
+        for section in chunks:
+            if section not in ['cik', 'year', 'split']:
+                passages.extend(chunks[section].get('chunks', []))
+        if len(passages) >= limit:
+            break
+    return passages[:limit]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check a CPU inference backend against the torch models")
+    parser.add_argument('--backend', choices=['torch_int8', 'onnx'], required=True)
+    parser.add_argument('--passages', type=int, default=200, help="Number of sample chunks to compare")
+    parser.add_argument('--min-cosine', type=float, default=0.98, help="Fail below this embedding cosine")
+    args = parser.parse_args()
+
+    sample_queries = [
+        "How many record holders of the common stock were reported for the latest year?",
+        "What is the employee headcount for the latest year?",
+        "What was the net sales for the latest year?",
+        "What was the total cash and cash equivalents for the latest year?",
+        "What is the quarterly cash dividend declared for the latest year?",
+    ]
+    report = check_parity(args.backend, sample_queries, _load_sample_passages(args.passages))
+    for metric, value in report.items():
+        print(f"{metric}: {value:.4f}")
+    sys.exit(0 if report['embedding_cosine_min'] >= args.min_cosine else 1)
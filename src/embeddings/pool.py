@@ -0,0 +1,309 @@
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+from embeddings.scheduler import EmbeddingScheduler, ScheduleReport
+
+
+def load_configured_model():
+    """Load the configured embedding model; the default model loader of pool workers."""
+    from embeddings.backends import load_sentence_transformer
+
+    return load_sentence_transformer(config['embeddings']['sentence_transformer']['model'])
+
+
+def pack_texts(texts: List[str]) -> shared_memory.SharedMemory:
+    """
+    Pack texts into one shared memory block: n + 1 int64 byte offsets, then UTF-8 data.
+
+    Args:
+        texts (List[str]): Texts to pack
+
+    Returns:
+        shared_memory.SharedMemory: The block; the caller unlinks it
+    """
+    encoded = [text.encode('utf-8') for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    header = offsets.nbytes
+    block = shared_memory.SharedMemory(create=True, size=max(header + int(offsets[-1]), 1))
+    block.buf[:header] = offsets.tobytes()
+    block.buf[header:header + int(offsets[-1])] = b''.join(encoded)
+    return block
+
+
+def unpack_texts(block: shared_memory.SharedMemory, count: int, start: int, end: int) -> List[str]:
+    """
+    Read texts start..end back from a block written by pack_texts.
+
+    Args:
+        block (shared_memory.SharedMemory): Attached block
+        count (int): Number of texts in the block
+        start (int): First text to read
+        end (int): One past the last text to read
+
+    Returns:
+        List[str]: The texts
+    """
+    offsets = np.ndarray((count + 1,), dtype=np.int64, buffer=block.buf)
+    header = offsets.nbytes
+    return [bytes(block.buf[header + offsets[i]:header + offsets[i + 1]]).decode('utf-8')
+            for i in range(start, end)]
+
+
+def _worker(worker_id: int, num_threads: int, cores: Optional[List[int]], model_loader: Callable,
+            scheduler_settings: Dict, tasks: mp.Queue, results: mp.Queue) -> None:
+    """Load the model once, then encode slices of shared input blocks into shared output arrays."""
+    for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[variable] = str(num_threads)
+    config.setdefault('inference', {})['num_threads'] = num_threads
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    try:
+        model = model_loader()
+        scheduler = EmbeddingScheduler(model, **scheduler_settings)
+        dimension = model.get_sentence_embedding_dimension()
+    except Exception as e:
+        results.put(('failed', worker_id, f"Could not load the model: {str(e)}"))
+        return
+    results.put(('ready', worker_id, dimension))
+
+    attached: Dict[str, shared_memory.SharedMemory] = {}
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        job, input_name, output_name, count, start, end = task
+        try:
+            # Blocks of earlier jobs are unlinked by the parent; drop our mappings of them
+            for name in [name for name in attached if name not in (input_name, output_name)]:
+                attached.pop(name).close()
+            for name in (input_name, output_name):
+                if name not in attached:
+                    attached[name] = shared_memory.SharedMemory(name=name)
+            texts = unpack_texts(attached[input_name], count, start, end)
+            embeddings, report = scheduler.encode(texts)
+            output = np.ndarray((count, dimension), dtype=np.float32, buffer=attached[output_name].buf)
+            output[start:end] = embeddings
+            del output
+            results.put(('done', job, (start, end, report.pieces, [start + i for i in report.overlong],
+                                       report.tokens, report.padded_tokens)))
+        except Exception as e:
+            results.put(('error', job, f"Worker {worker_id} failed on texts {start}-{end}: {str(e)}"))
+    for block in attached.values():
+        block.close()
+
+
+class EmbeddingPool:
+    """
+    Embed with several worker processes, each holding its own copy of the model.
+    Texts reach the workers as one shared memory block of UTF-8 data and vectors come back
+    in a shared float32 array, so only slice boundaries are pickled. Texts are sorted by
+    length before slicing, so each worker's length-bucketed batches pad little.
+    """
+
+    def __init__(self, num_workers: int, threads_per_worker: Optional[int] = None,
+                 slice_size: int = 256, pin_cores: bool = True, model_loader: Callable = load_configured_model):
+        """
+        Start the workers and wait until each has loaded the model.
+
+        Args:
+            num_workers (int): Worker processes
+            threads_per_worker (Optional[int]): Intra-op threads per worker. Defaults to the
+                available cores divided by num_workers
+            slice_size (int, optional): Texts per task handed to a worker. Defaults to 256
+            pin_cores (bool, optional): Give each worker its own set of cores. Defaults to True
+            model_loader (Callable, optional): Picklable function returning a model exposing
+                encode(), tokenizer and max_seq_length. Defaults to the configured model
+
+        Raises:
+            RuntimeError: If a worker cannot load the model
+        """
+        from embeddings.backends import resolve_num_threads
+
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker or max(1, resolve_num_threads() // num_workers)
+        self.slice_size = slice_size
+        settings = config.get('embeddings', {}).get('sentence_transformer', {})
+        scheduler_settings = {
+            'batch_size': settings.get('batch_size', 32),
+            'max_batch_tokens': settings.get('max_batch_tokens', 8192),
+            'overflow': settings.get('overflow', 'split'),
+        }
+
+        context = mp.get_context('spawn')
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._jobs = 0
+        # Every job uses all workers and reads the shared result queue, so jobs run one at a time
+        self._lock = threading.Lock()
+        self.workers = []
+        for worker_id in range(num_workers):
+            worker_cores = None
+            if pin_cores and len(cores) >= num_workers * self.threads_per_worker:
+                worker_cores = cores[worker_id * self.threads_per_worker:(worker_id + 1) * self.threads_per_worker]
+            process = context.Process(
+                target=_worker, name=f"embedding-worker-{worker_id}", daemon=True,
+                args=(worker_id, self.threads_per_worker, worker_cores, model_loader, scheduler_settings,
+                      self._tasks, self._results),
+            )
+            process.start()
+            self.workers.append(process)
+
+        self.dimension = None
+        for _ in range(num_workers):
+            kind, worker_id, payload = self._next_result()
+            if kind == 'failed':
+                self.close()
+                raise RuntimeError(payload)
+            self.dimension = payload
+
+    def _next_result(self) -> Tuple:
+        while True:
+            try:
+                return self._results.get(timeout=1.0)
+            except queue.Empty:
+                if not all(process.is_alive() for process in self.workers):
+                    self.close()
+                    raise RuntimeError("An embedding worker exited unexpectedly")
+
+    def encode(self, texts: List[str]) -> Tuple[np.ndarray, ScheduleReport]:
+        """
+        Encode texts across the workers.
+        Safe to call from several threads; concurrent calls are encoded one after another.
+
+        Args:
+            texts (List[str]): Texts to encode
+
+        Returns:
+            Tuple[np.ndarray, ScheduleReport]: One embedding per text in input order, and batch statistics
+        """
+        with self._lock:
+            return self._encode(texts)
+
+    def _encode(self, texts: List[str]) -> Tuple[np.ndarray, ScheduleReport]:
+        report = ScheduleReport(texts=len(texts))
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32), report
+
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        input_block = pack_texts([texts[i] for i in order])
+        output_block = shared_memory.SharedMemory(create=True, size=len(texts) * self.dimension * 4)
+        self._jobs += 1
+        job = self._jobs
+        try:
+            slices = [(start, min(start + self.slice_size, len(texts)))
+                      for start in range(0, len(texts), self.slice_size)]
+            for start, end in slices:
+                self._tasks.put((job, input_block.name, output_block.name, len(texts), start, end))
+
+            remaining = len(slices)
+            error = None
+            while remaining:
+                kind, result_job, payload = self._next_result()
+                if result_job != job:
+                    continue
+                remaining -= 1
+                if kind == 'error':
+                    error = error or payload
+                    continue
+                _, _, pieces, overlong, tokens, padded_tokens = payload
+                report.pieces += pieces
+                report.overlong.extend(int(order[i]) for i in overlong)
+                report.tokens += tokens
+                report.padded_tokens += padded_tokens
+            if error:
+                raise RuntimeError(error)
+
+            sorted_embeddings = np.ndarray((len(texts), self.dimension), dtype=np.float32, buffer=output_block.buf)
+            embeddings = np.empty_like(sorted_embeddings)
+            embeddings[order] = sorted_embeddings
+            del sorted_embeddings
+            report.overlong.sort()
+            return embeddings, report
+        finally:
+            for block in (input_block, output_block):
+                block.close()
+                block.unlink()
+
+    def close(self) -> None:
+        """Stop the workers."""
+        for process in self.workers:
+            if process.is_alive():
+                self._tasks.put(None)
+        for process in self.workers:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self.workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def scaling_report(texts: List[str], worker_counts: List[int], threads_per_worker: Optional[int] = None,
+                   model_loader: Callable = load_configured_model) -> List[Dict[str, float]]:
+    """
+    Measure embedding throughput for each worker count.
+
+    Model loading is excluded; each pool encodes a short warm-up sample before it is timed.
+
+    Args:
+        texts (List[str]): Texts to encode in each run
+        worker_counts (List[int]): Worker counts to try
+        threads_per_worker (Optional[int]): Intra-op threads per worker. Defaults to cores / workers
+        model_loader (Callable, optional): Model loader passed to the pool
+
+    Returns:
+        List[Dict[str, float]]: Per worker count, throughput, speedup and scaling efficiency
+    """
+    rows = []
+    for workers in worker_counts:
+        with EmbeddingPool(workers, threads_per_worker, model_loader=model_loader) as pool:
+            pool.encode(texts[:workers * 8])
+            started = time.perf_counter()
+            _, report = pool.encode(texts)
+            elapsed = time.perf_counter() - started
+        rows.append({
+            'workers': workers,
+            'threads_per_worker': pool.threads_per_worker,
+            'seconds': elapsed,
+            'texts_per_second': len(texts) / elapsed,
+            'padding_efficiency': report.padding_efficiency,
+        })
+    baseline = rows[0]['texts_per_second'] / rows[0]['workers']
+    for row in rows:
+        row['speedup'] = row['texts_per_second'] / rows[0]['texts_per_second']
+        row['efficiency'] = row['texts_per_second'] / (baseline * row['workers'])
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report embedding throughput across worker counts")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads-per-worker', type=int, default=None)
+    parser.add_argument('--texts', type=int, default=2000, help="Number of sample chunks to encode")
+    args = parser.parse_args()
+
+    from embeddings.backends import _load_sample_passages
+
+    sample = _load_sample_passages(args.texts)
+    print(f"Encoding {len(sample)} chunks")
+    print(f"{'workers':>7} {'threads':>7} {'seconds':>8} {'texts/s':>8} {'speedup':>7} {'efficiency':>10}")
+    for row in scaling_report(sample, args.workers, args.threads_per_worker):
+        print(f"{row['workers']:>7} {row['threads_per_worker']:>7} {row['seconds']:>8.2f} "
+              f"{row['texts_per_second']:>8.1f} {row['speedup']:>7.2f} {row['efficiency']:>10.0%}")
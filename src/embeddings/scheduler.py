@@ -0,0 +1,142 @@
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+import numpy as np
+
+
+@dataclass
+class ScheduleReport:
+    """Statistics of one scheduled encode call"""
+    texts: int = 0
+    pieces: int = 0
+    overlong: List[int] = field(default_factory=list)
+    tokens: int = 0
+    padded_tokens: int = 0
+
+    @property
+    def padding_efficiency(self) -> float:
+        """Share of encoded positions that hold real tokens rather than padding"""
+        return self.tokens / self.padded_tokens if self.padded_tokens else 1.0
+
+
+class EmbeddingScheduler:
+    """
+    Schedule texts for a SentenceTransformer-style model in length-bucketed batches.
+    Texts are sorted by token length so each batch pads to similar lengths, texts longer
+    than the model's maximum sequence length are flagged or split into windows whose
+    embeddings are averaged, and results come back in the original order.
+    """
+
+    def __init__(self, model, batch_size: int = 32, max_batch_tokens: int = 8192, overflow: str = 'split'):
+        """
+        Initialize the EmbeddingScheduler.
+
+        Args:
+            model: Model exposing encode(), tokenizer and max_seq_length
+            batch_size (int, optional): Maximum texts per batch. Defaults to 32
+            max_batch_tokens (int, optional): Maximum padded tokens per batch. Defaults to 8192
+            overflow (str, optional): 'split' embeds overlong texts window by window, 'flag' only
+                reports them and lets the model truncate. Defaults to 'split'
+        """
+        if overflow not in ('split', 'flag'):
+            raise ValueError(f"Unsupported overflow mode: {overflow}")
+        self.model = model
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.overflow = overflow
+        # Room for the special tokens the model adds around each sequence
+        self.max_tokens = model.max_seq_length - 2
+
+    def plan(self, texts: List[str], report: ScheduleReport) -> List[Tuple[int, str, int]]:
+        """
+        Measure texts in tokens and split the overlong ones.
+
+        Args:
+            texts (List[str]): Texts to encode
+            report (ScheduleReport): Report to record overlong texts in
+
+        Returns:
+            List[Tuple[int, str, int]]: (index of the source text, piece text, token count) per piece
+        """
+        encoded = self.model.tokenizer(
+            texts, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+        )
+        pieces = []
+        for i, (text, offsets) in enumerate(zip(texts, encoded['offset_mapping'])):
+            n_tokens = len(offsets)
+            if n_tokens <= self.max_tokens:
+                pieces.append((i, text, n_tokens))
+                continue
+            report.overlong.append(i)
+            if self.overflow == 'flag':
+                pieces.append((i, text, self.max_tokens))
+                continue
+            for start in range(0, n_tokens, self.max_tokens):
+                window = offsets[start:start + self.max_tokens]
+                pieces.append((i, text[window[0][0]:window[-1][1]], len(window)))
+        return pieces
+
+    def batches(self, pieces: List[Tuple[int, str, int]]) -> List[List[int]]:
+        """
+        Group pieces into batches of similar token length.
+
+        Args:
+            pieces (List[Tuple[int, str, int]]): Pieces returned by plan
+
+        Returns:
+            List[List[int]]: Indices into pieces, longest batch first
+        """
+        order = sorted(range(len(pieces)), key=lambda p: pieces[p][2], reverse=True)
+        batches, current = [], []
+        for p in order:
+            # The first piece of a batch is its longest, so it sets the padded length
+            longest = pieces[current[0]][2] if current else pieces[p][2]
+            if current and (len(current) >= self.batch_size or (len(current) + 1) * longest > self.max_batch_tokens):
+                batches.append(current)
+                current = []
+            current.append(p)
+        if current:
+            batches.append(current)
+        return batches
+
+    def encode(self, texts: List[str]) -> Tuple[np.ndarray, ScheduleReport]:
+        """
+        Encode texts in length-bucketed batches.
+
+        Args:
+            texts (List[str]): Texts to encode
+
+        Returns:
+            Tuple[np.ndarray, ScheduleReport]: One embedding per text in input order, and batch statistics
+        """
+        report = ScheduleReport(texts=len(texts))
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32), report
+
+        pieces = self.plan(texts, report)
+        report.pieces = len(pieces)
+        piece_embeddings = [None] * len(pieces)
+        for batch in self.batches(pieces):
+            batch_embeddings = np.asarray(self.model.encode(
+                [pieces[p][1] for p in batch], batch_size=len(batch), show_progress_bar=False
+            ))
+            for p, embedding in zip(batch, batch_embeddings):
+                piece_embeddings[p] = embedding
+            report.tokens += sum(pieces[p][2] for p in batch)
+            report.padded_tokens += len(batch) * pieces[batch[0]][2]
+
+        piece_embeddings = np.stack(piece_embeddings)
+        if len(pieces) == len(texts):
+            return piece_embeddings, report
+
+        # Token-weighted mean of the windows of each split text
+        normalized = np.allclose(np.linalg.norm(piece_embeddings, axis=1), 1.0, atol=1e-3)
+        embeddings = np.zeros((len(texts), piece_embeddings.shape[1]), dtype=np.float32)
+        weights = np.zeros(len(texts), dtype=np.float32)
+        for (i, _, n_tokens), embedding in zip(pieces, piece_embeddings):
+            embeddings[i] += n_tokens * embedding
+            weights[i] += n_tokens
+        embeddings /= weights[:, None]
+        if normalized:
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings, report
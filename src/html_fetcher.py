@@ -0,0 +1,360 @@
+import os
+import gzip
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from config import config
+from wasabi import msg
+
+PROJECT_ROOT = Path(__file__).parent.parent
+SUBMISSIONS_URL = "https://data.sec.gov/submissions"
+ARCHIVES_URL = "https://www.sec.gov/Archives/edgar/data"
+ANNUAL_REPORT_FORMS = ('10-K', '10-K405', '10-KSB', '10-KT')
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def html_path(cik: str, year: int, split: str, data_root: Optional[Path] = None) -> Path:
+    """Path of a filing's gzip-compressed HTML in the on-disk cache"""
+    return Path(data_root or PROJECT_ROOT / 'data') / f'edgar_corpus_{year}' / split / f'{cik}.html.gz'
+
+
+def find_filing_html(cik: str, year: int, split: str, data_root: Optional[Path] = None) -> Optional[Path]:
+    """
+    Find a filing's HTML, compressed or as a plain .html file placed by hand.
+
+    Args:
+        cik (str): Company CIK number
+        year (int): Filing year
+        split (str): Dataset split
+        data_root (Optional[Path]): Directory holding the edgar_corpus_* folders. Defaults to data/
+
+    Returns:
+        Optional[Path]: Path of the HTML file, or None if there is none
+    """
+    compressed = html_path(cik, year, split, data_root)
+    for path in [compressed, compressed.with_suffix('')]:
+        if path.exists():
+            return path
+    return None
+
+
+def _site(url: str) -> str:
+    """Rate limiting key: the registered domain, so www.sec.gov and data.sec.gov share a budget."""
+    netloc = urlparse(url).netloc
+    host = netloc.split(':')[0]
+    if host.replace('.', '').isdigit() or '.' not in host:
+        return netloc
+    return '.'.join(host.split('.')[-2:])
+
+
+class SiteLimiter:
+    """Cap concurrent requests and space request starts per site."""
+
+    def __init__(self, max_concurrent: int, requests_per_second: float):
+        self.max_concurrent = max_concurrent
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.Semaphore] = {}
+        self._next_start: Dict[str, float] = {}
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        site = _site(url)
+        with self._lock:
+            semaphore = self._semaphores.setdefault(site, threading.BoundedSemaphore(self.max_concurrent))
+        with semaphore:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start.get(site, now))
+                self._next_start[site] = start + self.interval
+            time.sleep(max(start - now, 0.0))
+            yield
+
+    def back_off(self, url: str, seconds: float) -> None:
+        """Hold back every request to a site, e.g. after it answered 429."""
+        site = _site(url)
+        with self._lock:
+            self._next_start[site] = max(self._next_start.get(site, 0.0), time.monotonic() + seconds)
+
+
+@dataclass
+class FetchResult:
+    cik: str
+    year: int
+    split: str
+    status: str  # 'fetched', 'not_modified', 'skipped', 'missing' or 'failed'
+    path: Optional[Path] = None
+    size: int = 0
+    error: Optional[str] = None
+
+
+class EdgarHTMLFetcher:
+    """
+    Bulk fetcher of EDGAR 10-K HTML into gzip-compressed files next to the filing JSON.
+    Uses one pooled requests.Session with a per-site concurrency cap and request spacing,
+    revalidates cached files with conditional GETs, and treats a filing as done only once
+    its '.html.meta' (URL, ETag, Last-Modified) is written, so interrupted runs resume.
+    """
+
+    def __init__(self, data_root: Optional[Path] = None, user_agent: Optional[str] = None,
+                 max_connections_per_host: Optional[int] = None, requests_per_second: Optional[float] = None,
+                 max_retries: Optional[int] = None, timeout: Optional[float] = None,
+                 submissions_url: str = SUBMISSIONS_URL, archives_url: str = ARCHIVES_URL):
+        """
+        Initialize the EdgarHTMLFetcher.
+
+        Args:
+            data_root (Optional[Path]): Directory holding the edgar_corpus_* folders. Defaults to data/
+            user_agent (Optional[str]): 'Name contact@email' identifying the client, as SEC requires.
+                Defaults to the SEC_USER_AGENT environment variable
+            max_connections_per_host (Optional[int]): Defaults to config['fetcher']
+            requests_per_second (Optional[float]): Defaults to config['fetcher']
+            max_retries (Optional[int]): Defaults to config['fetcher']
+            timeout (Optional[float]): Defaults to config['fetcher']
+            submissions_url (str, optional): Base URL of the submissions API
+            archives_url (str, optional): Base URL of the filing archives
+
+        Raises:
+            ValueError: If no user agent is configured
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        settings = config.get('fetcher', {})
+        user_agent = user_agent or os.getenv("SEC_USER_AGENT")
+        if not user_agent:
+            raise ValueError("Set SEC_USER_AGENT to 'Name contact@email', as required by SEC fair access policy")
+        self.data_root = Path(data_root or PROJECT_ROOT / 'data')
+        self.max_connections_per_host = max_connections_per_host or settings.get('max_connections_per_host', 4)
+        self.max_retries = max_retries if max_retries is not None else settings.get('max_retries', 5)
+        self.timeout = timeout or settings.get('timeout', 30)
+        self.submissions_url = submissions_url.rstrip('/')
+        self.archives_url = archives_url.rstrip('/')
+        self.limiter = SiteLimiter(self.max_connections_per_host,
+                                   requests_per_second or settings.get('requests_per_second', 8))
+
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': user_agent, 'Accept-Encoding': 'gzip, deflate'})
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_connections_per_host)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._submissions: Dict[str, Dict] = {}
+        self._submissions_lock = threading.Lock()
+
+    def _get(self, url: str, headers: Optional[Dict] = None):
+        """GET with retries on throttling, server errors and connection failures."""
+        import requests
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.limiter.slot(url):
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(min(2 ** attempt, 30))
+                continue
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            retry_after = response.headers.get('Retry-After', '')
+            delay = float(retry_after) if retry_after.isdigit() else min(2 ** attempt, 30)
+            if response.status_code == 429:
+                self.limiter.back_off(url, delay)
+            time.sleep(delay)
+        return response
+
+    def _get_json(self, url: str) -> Optional[Dict]:
+        response = self._get(url)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def _filing_index(self, cik: str) -> List[Dict]:
+        """All filings of a company from the submissions API, newest first."""
+        cik = str(int(cik))
+        with self._submissions_lock:
+            if cik in self._submissions:
+                return self._submissions[cik]
+        submissions = self._get_json(f"{self.submissions_url}/CIK{int(cik):010d}.json")
+        pages = []
+        if submissions:
+            pages.append(submissions['filings']['recent'])
+            for older in submissions['filings'].get('files', []):
+                page = self._get_json(f"{self.submissions_url}/{older['name']}")
+                if page:
+                    pages.append(page)
+        filings = [
+            {'form': form, 'filing_date': filing_date, 'accession': accession, 'document': document}
+            for page in pages
+            for form, filing_date, accession, document in zip(
+                page['form'], page['filingDate'], page['accessionNumber'], page['primaryDocument']
+            )
+        ]
+        with self._submissions_lock:
+            self._submissions[cik] = filings
+        return filings
+
+    def resolve_url(self, cik: str, year: int) -> Optional[str]:
+        """
+        Find the URL of a company's annual report filed in a given year.
+
+        Args:
+            cik (str): Company CIK number
+            year (int): Filing year
+
+        Returns:
+            Optional[str]: URL of the primary document, or None if there is no such filing
+        """
+        candidates = [filing for filing in self._filing_index(cik)
+                      if filing['form'] in ANNUAL_REPORT_FORMS and filing['filing_date'].startswith(str(year))
+                      and filing['document']]
+        if not candidates:
+            return None
+        filing = candidates[-1]  # the earliest original report of the year, not a later one
+        return f"{self.archives_url}/{int(cik)}/{filing['accession'].replace('-', '')}/{filing['document']}"
+
+    def fetch(self, cik: str, year: int, split: str, revalidate: bool = False) -> FetchResult:
+        """
+        Fetch a filing's HTML into the cache.
+
+        Args:
+            cik (str): Company CIK number
+            year (int): Filing year
+            split (str): Dataset split
+            revalidate (bool, optional): Send a conditional GET for files already cached. Defaults to False
+
+        Returns:
+            FetchResult: Outcome of the fetch
+        """
+        path = html_path(cik, year, split, self.data_root)
+        meta_path = path.with_name(f"{cik}.html.meta")
+        meta = {}
+        if meta_path.exists() and path.exists():
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if not revalidate:
+                return FetchResult(cik, year, split, 'skipped', path, path.stat().st_size)
+
+        try:
+            url = meta.get('url') or self.resolve_url(cik, year)
+            if not url:
+                return FetchResult(cik, year, split, 'missing', error=f"No annual report filed in {year}")
+            headers = {}
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+            response = self._get(url, headers)
+            if response.status_code == 304:
+                meta['checked_at'] = time.time()
+                self._write_meta(meta_path, meta)
+                return FetchResult(cik, year, split, 'not_modified', path, path.stat().st_size)
+            if response.status_code == 404:
+                return FetchResult(cik, year, split, 'missing', error=f"{url} not found")
+            response.raise_for_status()
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with gzip.open(tmp_path, 'wb') as f:
+                f.write(response.content)
+            os.replace(tmp_path, path)
+            self._write_meta(meta_path, {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'checked_at': time.time(),
+            })
+            return FetchResult(cik, year, split, 'fetched', path, path.stat().st_size)
+        except Exception as e:
+            return FetchResult(cik, year, split, 'failed', error=str(e))
+
+    @staticmethod
+    def _write_meta(meta_path: Path, meta: Dict) -> None:
+        tmp_path = meta_path.with_name(f"{meta_path.name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def fetch_many(self, filings: Iterable[Tuple[str, int, str]], revalidate: bool = False,
+                   max_workers: Optional[int] = None) -> List[FetchResult]:
+        """
+        Fetch many filings concurrently; the per-site limits still apply.
+
+        Args:
+            filings (Iterable[Tuple[str, int, str]]): (cik, year, split) of each filing
+            revalidate (bool, optional): Send conditional GETs for cached files. Defaults to False
+            max_workers (Optional[int]): Worker threads. Defaults to twice the per-host cap
+
+        Returns:
+            List[FetchResult]: One result per filing, in completion order
+        """
+        results = []
+        counts = Counter()
+        with ThreadPoolExecutor(max_workers=max_workers or 2 * self.max_connections_per_host) as executor:
+            futures = [executor.submit(self.fetch, cik, year, split, revalidate) for cik, year, split in filings]
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                results.append(result)
+                counts[result.status] += 1
+                if result.status == 'failed':
+                    msg.fail(f"{result.cik}_{result.year}: {result.error}")
+                if done % 100 == 0 or done == len(futures):
+                    print(f"{done}/{len(futures)} " + ", ".join(f"{k} {v}" for k, v in sorted(counts.items())))
+        return results
+
+
+def corpus_filings(data_root: Optional[Path] = None, years: Optional[List[int]] = None,
+                   splits: Optional[List[str]] = None) -> List[Tuple[str, int, str]]:
+    """
+    List the filings downloaded under data/ as (cik, year, split).
+
+    Args:
+        data_root (Optional[Path]): Directory holding the edgar_corpus_* folders. Defaults to data/
+        years (Optional[List[int]]): Only these years
+        splits (Optional[List[str]]): Only these splits
+
+    Returns:
+        List[Tuple[str, int, str]]: Filings found
+    """
+    filings = []
+    for path in sorted(Path(data_root or PROJECT_ROOT / 'data').glob('edgar_corpus_*/*/*_*.json')):
+        parts = path.stem.split('_')
+        if len(parts) != 2 or not parts[1].isdigit():
+            continue
+        cik, year, split = parts[0], int(parts[1]), path.parent.name
+        if (years is None or year in years) and (splits is None or split in splits):
+            filings.append((cik, year, split))
+    return filings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch EDGAR filing HTML into the local gzip cache")
+    parser.add_argument('--years', type=int, nargs='*', help="Only filings of these years")
+    parser.add_argument('--splits', nargs='*', help="Only filings of these splits")
+    parser.add_argument('--ciks', nargs='*', help="Fetch these CIKs for every --years and --splits value given")
+    parser.add_argument('--revalidate', action='store_true', help="Send conditional GETs for cached files")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--submissions-url', default=SUBMISSIONS_URL)
+    parser.add_argument('--archives-url', default=ARCHIVES_URL)
+    args = parser.parse_args()
+    if args.ciks and not (args.years and args.splits):
+        parser.error("--ciks requires --years and --splits")
+
+    if args.ciks:
+        targets = [(cik, year, split) for cik in args.ciks for year in args.years for split in args.splits]
+    else:
+        targets = corpus_filings(years=args.years, splits=args.splits)
+    fetcher = EdgarHTMLFetcher(submissions_url=args.submissions_url, archives_url=args.archives_url)
+    started = time.perf_counter()
+    fetched = fetcher.fetch_many(targets, revalidate=args.revalidate, max_workers=args.workers)
+    msg.info(f"Processed {len(fetched)} filing(s) in {time.perf_counter() - started:.1f}s")
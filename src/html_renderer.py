@@ -1,66 +1,195 @@
+import re
+import gzip
 import streamlit as st
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
 from typing import Dict, List, Optional
-import time
-import random
 from pathlib import Path
 
+# Inline styles EDGAR filings use to mark printed page boundaries
+PAGE_BREAK_BEFORE = re.compile(r'page-break-before\s*:\s*always', re.IGNORECASE)
+PAGE_BREAK_AFTER = re.compile(r'page-break-after\s*:\s*always', re.IGNORECASE)
+# Short blocks such as "Item 1A. Risk Factors" start a section
+ITEM_HEADING = re.compile(r'^\s*item\s+(\d+[a-c]?)\b\s*[.:\-—]?\s*(.{0,80})', re.IGNORECASE)
+MAX_HEADING_CHARS = 200
+
+
+def _html_parser() -> str:
+    """Use lxml when installed, it parses several times faster than html.parser"""
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
+
+def _find_content_root(soup):
+    """Find the main content element in a single pass over the content divs"""
+    candidates = soup.find_all('div', class_=['document', 'ix-content'])
+    for css_class in ['document', 'ix-content']:
+        for candidate in candidates:
+            if css_class in (candidate.get('class') or []):
+                return candidate
+    return soup.find('body')
+
+
+def _split_root(root):
+    """
+    Descend through single-child wrappers, such as a body wrapped in one <div> or in
+    <document><text>, to the element whose children are the filing's blocks
+    """
+    from bs4 import Tag
+
+    while True:
+        children = [child for child in root.children if str(child).strip()]
+        if len(children) != 1 or not isinstance(children[0], Tag):
+            return root
+        if not any(isinstance(grandchild, Tag) for grandchild in children[0].children):
+            return root
+        root = children[0]
+
+
+def split_filing(html_content: str, max_page_chars: int = 60000) -> Dict:
+    """
+    Split a filing into pages and index its sections.
+
+    Pages follow the filing's own page breaks, and a page is also closed once it
+    reaches max_page_chars of HTML so filings without page breaks stay paginated.
+
+    Args:
+        html_content (str): Raw filing HTML
+        max_page_chars (int, optional): Maximum HTML characters per page. Defaults to 60000
+
+    Returns:
+        Dict: 'pages' as a list of HTML fragments and 'sections' as a list of
+            (section title, page index) tuples in page order
+    """
+    from bs4 import BeautifulSoup, Tag
+
+    soup = BeautifulSoup(html_content, _html_parser())
+    root = _find_content_root(soup)
+    if root is None:
+        return {'pages': [], 'sections': []}
+    root = _split_root(root)
+
+    pages: List[str] = []
+    sections: Dict[str, tuple] = {}
+    current: List[str] = []
+    current_chars = 0
+
+    def close_page():
+        nonlocal current, current_chars
+        if current:
+            pages.append(''.join(current))
+            current, current_chars = [], 0
+
+    for child in root.children:
+        fragment = str(child)
+        if not fragment.strip():
+            continue
+        style = child.get('style', '') if isinstance(child, Tag) else ''
+        if PAGE_BREAK_BEFORE.search(style) or current_chars + len(fragment) > max_page_chars:
+            close_page()
+
+        if isinstance(child, Tag):
+            text = child.get_text(' ', strip=True)
+            match = ITEM_HEADING.match(text) if len(text) <= MAX_HEADING_CHARS else None
+            if match:
+                # The last heading wins, so table-of-contents entries give way to the body
+                item = match.group(1).upper()
+                sections[item] = (text, len(pages))
+
+        current.append(fragment)
+        current_chars += len(fragment)
+        if PAGE_BREAK_AFTER.search(style):
+            close_page()
+    close_page()
+
+    return {
+        'pages': pages,
+        'sections': sorted(sections.values(), key=lambda section: section[1]),
+    }
+
+
+def read_html(file_path: Path) -> str:
+    """Read an HTML file, gzip-compressed ('.gz') or plain"""
+    opener = gzip.open if file_path.suffix == '.gz' else open
+    with opener(file_path, 'rt', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_filing_pages(file_path: str, modified_time: float) -> Dict:
+    """
+    Read and split a filing once; reruns and other sessions reuse the result.
+
+    Args:
+        file_path (str): Path of the HTML file
+        modified_time (float): File modification time, so edited files are parsed again
+
+    Returns:
+        Dict: Split filing as returned by split_filing
+    """
+    return split_filing(read_html(Path(file_path)))
+
+
 class EdgarHTMLRenderer:
     """Class to handle HTML rendering of SEC EDGAR filings"""
-    
-    def __init__(self):
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Cache-Control': 'max-age=0'
-        }
-    
+
     def read_local_html(self, file_path: Path) -> Optional[str]:
         """Read HTML content from a local file"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            return read_html(file_path)
+        except Exception as e:
+            st.error(f"Error reading local HTML file: {str(e)}")
+            return None
+
+    def load_filing(self, file_path: Path) -> Optional[Dict]:
+        """Load the cached page structure of a filing"""
+        try:
+            return load_filing_pages(str(file_path), file_path.stat().st_mtime)
         except Exception as e:
             st.error(f"Error reading local HTML file: {str(e)}")
             return None
-    
+
     def render_filing(self, file_path: Path):
-        """Render an SEC EDGAR filing from local file"""
+        """Render one page of an SEC EDGAR filing from local file"""
         with st.spinner(f"Loading filing from {file_path}..."):
-            html_content = self.read_local_html(file_path)
-            if not html_content:
-                st.error("Failed to read the filing content. Please check if the file exists.")
-                return
-            
-            # Parse HTML with BeautifulSoup
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Extract and display the content
-            st.markdown("### SEC EDGAR Filing Content")
-            
-            # Find the main content area (adjust selectors based on SEC's HTML structure)
-            content = soup.find('div', {'class': 'document'})
-            if content:
-                # Convert HTML to string and render
-                st.markdown(content.prettify(), unsafe_allow_html=True)
-            else:
-                # Try alternative content selectors
-                content = soup.find('div', {'class': 'ix-content'})
-                if content:
-                    st.markdown(content.prettify(), unsafe_allow_html=True)
-                else:
-                    # If no specific content div is found, render the entire body
-                    body = soup.find('body')
-                    if body:
-                        st.markdown(body.prettify(), unsafe_allow_html=True)
-                    else:
-                        st.warning("Could not find main content area in the filing")
-    
+            filing = self.load_filing(file_path)
+        if not filing:
+            st.error("Failed to read the filing content. Please check if the file exists.")
+            return
+        if not filing['pages']:
+            st.warning("Could not find main content area in the filing")
+            return
+
+        st.markdown("### SEC EDGAR Filing Content")
+
+        # Widget keys are per file so several filings can be paged independently
+        page_key = f"filing_page_{file_path}"
+        section_key = f"filing_section_{file_path}"
+        page_count = len(filing['pages'])
+        section_pages = {title: page for title, page in filing['sections']}
+
+        def jump_to_section():
+            title = st.session_state[section_key]
+            if title in section_pages:
+                st.session_state[page_key] = section_pages[title] + 1
+
+        if section_pages:
+            st.selectbox(
+                "Jump to section:",
+                ["—"] + list(section_pages),
+                key=section_key,
+                on_change=jump_to_section,
+            )
+        page = st.number_input(
+            f"Page (of {page_count}):",
+            min_value=1,
+            max_value=page_count,
+            value=1,
+            key=page_key,
+        )
+        st.markdown(filing['pages'][page - 1], unsafe_allow_html=True)
+
     def render_multiple_filings(self, file_paths: List[Path]):
         """Render multiple SEC EDGAR filings"""
         for file_path in file_paths:
@@ -71,7 +200,7 @@ class EdgarHTMLRenderer:
 def main():
     st.set_page_config(page_title="SEC EDGAR Filing Viewer", layout="wide")
     st.title("SEC EDGAR Filing Viewer")
-    
+
     # Example file paths
     project_root = Path(__file__).parent.parent
     file_paths = [
@@ -79,9 +208,9 @@ def main():
         project_root / 'data' / 'edgar_corpus_2019' / 'train' / '29669.html',
         project_root / 'data' / 'edgar_corpus_2020' / 'train' / '29669.html'
     ]
-    
+
     renderer = EdgarHTMLRenderer()
     renderer.render_multiple_filings(file_paths)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
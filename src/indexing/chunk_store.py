@@ -0,0 +1,153 @@
+import os
+import sys
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+# SQLite limits the number of bound parameters per statement
+SQLITE_MAX_VARIABLES = 900
+
+
+class ChunkStore:
+    """
+    Local key-value store for chunk text, keyed by vector ID.
+    Vectors in Pinecone only carry compact metadata; their text is resolved here.
+    Backed by SQLite with an in-memory LRU for recently used chunks.
+    """
+
+    def __init__(self, path: Optional[str] = None, cache_size: Optional[int] = None):
+        """
+        Initialize the ChunkStore.
+
+        Args:
+            path (Optional[str]): SQLite file path. Defaults to config['chunk_store']['path']
+            cache_size (Optional[int]): Number of chunks kept in memory. Defaults to config['chunk_store']['cache_size']
+        """
+        settings = config.get('chunk_store', {})
+        path = Path(path or settings.get('path', 'data/chunk_store.sqlite3'))
+        if not path.is_absolute():
+            path = PROJECT_ROOT / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.path = path
+        self.cache_size = cache_size if cache_size is not None else settings.get('cache_size', 20000)
+        self._lock = threading.Lock()
+        self._cache: OrderedDict = OrderedDict()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, content TEXT NOT NULL)")
+        self._conn.commit()
+
+    def _remember(self, vector_id: str, content: str) -> None:
+        """Add a chunk to the in-memory LRU, evicting the least recently used ones."""
+        self._cache[vector_id] = content
+        self._cache.move_to_end(vector_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def put_many(self, records: Iterable[Tuple[str, str]]) -> None:
+        """
+        Store chunk texts, replacing any existing text for the same vector IDs.
+
+        Args:
+            records (Iterable[Tuple[str, str]]): (vector ID, chunk text) pairs
+        """
+        records = list(records)
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO chunks (id, content) VALUES (?, ?)", records)
+            self._conn.commit()
+            for vector_id, content in records:
+                if vector_id in self._cache:
+                    self._cache[vector_id] = content
+
+    def get_many(self, vector_ids: List[str]) -> Dict[str, str]:
+        """
+        Fetch the text of several chunks with a single batched lookup for cache misses.
+
+        Args:
+            vector_ids (List[str]): Vector IDs to resolve
+
+        Returns:
+            Dict[str, str]: Chunk text per vector ID; unknown IDs are left out
+        """
+        found = {}
+        with self._lock:
+            missing = []
+            for vector_id in vector_ids:
+                if vector_id in self._cache:
+                    self._cache.move_to_end(vector_id)
+                    found[vector_id] = self._cache[vector_id]
+                else:
+                    missing.append(vector_id)
+
+            for start in range(0, len(missing), SQLITE_MAX_VARIABLES):
+                batch = missing[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT id, content FROM chunks WHERE id IN ({placeholders})", batch
+                ).fetchall()
+                for vector_id, content in rows:
+                    found[vector_id] = content
+                    self._remember(vector_id, content)
+        return found
+
+    def get(self, vector_id: str) -> Optional[str]:
+        """
+        Fetch the text of a single chunk.
+
+        Args:
+            vector_id (str): Vector ID to resolve
+
+        Returns:
+            Optional[str]: Chunk text, or None if the ID is unknown
+        """
+        return self.get_many([vector_id]).get(vector_id)
+
+    def ids_with_prefix(self, prefix: str) -> List[str]:
+        """
+        List the stored vector IDs starting with a prefix.
+
+        Args:
+            prefix (str): ID prefix, e.g. the prefix of one filing's vectors
+
+        Returns:
+            List[str]: Matching vector IDs
+        """
+        if not prefix:
+            with self._lock:
+                rows = self._conn.execute("SELECT id FROM chunks").fetchall()
+            return [vector_id for vector_id, in rows]
+        # A range over the primary key is answered from its index instead of scanning the table:
+        # IDs starting with the prefix sort between it and the prefix with its last character bumped
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM chunks WHERE id >= ? AND id < ?", (prefix, upper)
+            ).fetchall()
+        return [vector_id for vector_id, in rows]
+
+    def delete_many(self, vector_ids: List[str]) -> None:
+        """
+        Remove the text of several chunks.
+
+        Args:
+            vector_ids (List[str]): Vector IDs to remove; unknown IDs are ignored
+        """
+        with self._lock:
+            for start in range(0, len(vector_ids), SQLITE_MAX_VARIABLES):
+                batch = vector_ids[start:start + SQLITE_MAX_VARIABLES]
+                self._conn.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+            self._conn.commit()
+            for vector_id in vector_ids:
+                self._cache.pop(vector_id, None)
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
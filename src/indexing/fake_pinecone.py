@@ -0,0 +1,376 @@
+import os
+import sys
+import json
+import random
+import argparse
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wasabi import msg
+
+
+def matches_filter(metadata: Dict, flt: Optional[Dict]) -> bool:
+    """
+    Evaluate a Pinecone metadata filter against a vector's metadata.
+
+    Args:
+        metadata (Dict): Metadata of the vector
+        flt (Optional[Dict]): Filter using Pinecone's operators ($eq, $ne, $gt, $gte, $lt,
+            $lte, $in, $nin, $exists, $and, $or); a bare value means $eq
+
+    Returns:
+        bool: True if the metadata satisfies the filter
+    """
+    if not flt:
+        return True
+    for key, condition in flt.items():
+        if key == '$and':
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == '$or':
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        value = metadata.get(key)
+        for op, operand in condition.items():
+            if op == '$exists':
+                ok = (key in metadata) == bool(operand)
+            elif key not in metadata:
+                ok = op in ('$ne', '$nin')
+            elif op == '$eq':
+                ok = value == operand
+            elif op == '$ne':
+                ok = value != operand
+            elif op == '$in':
+                ok = value in operand
+            elif op == '$nin':
+                ok = value not in operand
+            elif op == '$gt':
+                ok = value > operand
+            elif op == '$gte':
+                ok = value >= operand
+            elif op == '$lt':
+                ok = value < operand
+            elif op == '$lte':
+                ok = value <= operand
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            if not ok:
+                return False
+    return True
+
+
+@dataclass
+class FaultProfile:
+    """
+    Latency and failure injection applied to every request.
+
+    latency_dist is 'fixed' (always latency_ms), 'uniform' (latency_ms ± jitter_ms) or
+    'lognormal' (median latency_ms, sigma lognormal_sigma, so a long tail). Requests are
+    throttled with HTTP 429 at throttle_rate, or whenever max_rps is exceeded, and fail
+    with HTTP 500/503 at error_rate.
+    """
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    latency_dist: str = 'fixed'
+    lognormal_sigma: float = 0.5
+    throttle_rate: float = 0.0
+    error_rate: float = 0.0
+    max_rps: Optional[float] = None
+    seed: Optional[int] = None
+    _random: random.Random = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _window: List[float] = field(default_factory=list, init=False, repr=False)
+
+    def __post_init__(self):
+        if self.latency_dist not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError(f"Unsupported latency distribution: {self.latency_dist}")
+        self._random = random.Random(self.seed)
+
+    def latency(self) -> float:
+        """Draw one request latency in seconds."""
+        with self._lock:
+            if self.latency_dist == 'uniform':
+                ms = self._random.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+            elif self.latency_dist == 'lognormal' and self.latency_ms > 0:
+                ms = self._random.lognormvariate(np.log(self.latency_ms), self.lognormal_sigma)
+            else:
+                ms = self.latency_ms
+        return max(ms, 0.0) / 1000
+
+    def fault(self) -> Optional[int]:
+        """Decide whether a request fails, returning the HTTP status to fail it with."""
+        now = time.monotonic()
+        with self._lock:
+            if self.max_rps:
+                self._window = [t for t in self._window if now - t < 1.0]
+                if len(self._window) >= self.max_rps:
+                    return 429
+                self._window.append(now)
+            draw = self._random.random()
+        if draw < self.throttle_rate:
+            return 429
+        if draw < self.throttle_rate + self.error_rate:
+            return 503 if draw < self.throttle_rate + self.error_rate / 2 else 500
+        return None
+
+
+class VectorStore:
+    """In-memory namespaces of vectors with brute-force similarity search."""
+
+    def __init__(self, metric: str = 'cosine'):
+        if metric not in ('cosine', 'dotproduct', 'euclidean'):
+            raise ValueError(f"Unsupported metric: {metric}")
+        self.metric = metric
+        self.dimension: Optional[int] = None
+        self.namespaces: Dict[str, Dict[str, Tuple[np.ndarray, Dict]]] = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors: List[Dict], namespace: str) -> int:
+        with self._lock:
+            records = self.namespaces.setdefault(namespace, {})
+            for vector in vectors:
+                values = np.asarray(vector['values'], dtype=np.float32)
+                if self.dimension is None:
+                    self.dimension = len(values)
+                if len(values) != self.dimension:
+                    raise ValueError(f"Vector dimension {len(values)} does not match the dimension of the index {self.dimension}")
+                records[vector['id']] = (values, vector.get('metadata') or {})
+        return len(vectors)
+
+    def query(self, vector: List[float], top_k: int, namespace: str, flt: Optional[Dict],
+              include_values: bool, include_metadata: bool) -> List[Dict]:
+        with self._lock:
+            records = [(vector_id, values, metadata)
+                       for vector_id, (values, metadata) in self.namespaces.get(namespace, {}).items()
+                       if matches_filter(metadata, flt)]
+        if not records:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        matrix = np.stack([values for _, values, _ in records])
+        if self.metric == 'cosine':
+            norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+            scores = matrix @ query / np.where(norms == 0, 1.0, norms)
+        elif self.metric == 'dotproduct':
+            scores = matrix @ query
+        else:
+            scores = -np.sum((matrix - query) ** 2, axis=1)
+        top = np.argsort(-scores)[:top_k]
+        matches = []
+        for i in top:
+            vector_id, values, metadata = records[i]
+            match = {'id': vector_id, 'score': float(scores[i]), 'values': values.tolist() if include_values else []}
+            if include_metadata:
+                match['metadata'] = metadata
+            matches.append(match)
+        return matches
+
+    def fetch(self, ids: List[str], namespace: str) -> Dict[str, Dict]:
+        with self._lock:
+            records = self.namespaces.get(namespace, {})
+            return {vector_id: {'id': vector_id, 'values': records[vector_id][0].tolist(),
+                                'metadata': records[vector_id][1]}
+                    for vector_id in ids if vector_id in records}
+
+    def list_ids(self, namespace: str, prefix: str = '') -> List[str]:
+        with self._lock:
+            return sorted(vector_id for vector_id in self.namespaces.get(namespace, {}) if vector_id.startswith(prefix))
+
+    def delete(self, namespace: str, ids: Optional[List[str]] = None, delete_all: bool = False,
+               flt: Optional[Dict] = None) -> None:
+        with self._lock:
+            records = self.namespaces.get(namespace, {})
+            if delete_all:
+                records.clear()
+                return
+            if flt:
+                ids = [vector_id for vector_id, (_, metadata) in records.items() if matches_filter(metadata, flt)]
+            for vector_id in ids or []:
+                records.pop(vector_id, None)
+
+    def stats(self, flt: Optional[Dict] = None) -> Dict:
+        with self._lock:
+            namespaces = {
+                name: {'vectorCount': sum(1 for _, metadata in records.values() if matches_filter(metadata, flt))}
+                for name, records in self.namespaces.items()
+            }
+        return {
+            'namespaces': namespaces,
+            'dimension': self.dimension or 0,
+            'indexFullness': 0.0,
+            'totalVectorCount': sum(ns['vectorCount'] for ns in namespaces.values()),
+        }
+
+
+class FakePineconeHandler(BaseHTTPRequestHandler):
+    """Serve the Pinecone data-plane REST endpoints used by the SDK."""
+
+    server: "FakePineconeServer"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: Dict) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status: int, message: str) -> None:
+        self._send(status, {'code': status, 'message': message, 'details': []})
+
+    def _body(self) -> Dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+    def _handle(self, method: str) -> None:
+        url = urlparse(self.path)
+        route = (method, url.path)
+        body = self._body() if method == 'POST' else {}
+        time.sleep(self.server.faults.latency())
+        status = self.server.faults.fault()
+        self.server.record(url.path, status or 200)
+        if status == 429:
+            return self._error(429, "Request was throttled by the fake Pinecone server")
+        if status:
+            return self._error(status, "Error injected by the fake Pinecone server")
+
+        store = self.server.store
+        query = parse_qs(url.query)
+        try:
+            if route == ('POST', '/vectors/upsert'):
+                upserted = store.upsert(body.get('vectors', []), body.get('namespace', ''))
+                return self._send(200, {'upsertedCount': upserted})
+            if route == ('POST', '/query'):
+                vector = body.get('vector')
+                namespace = body.get('namespace', '')
+                if vector is None and body.get('id'):
+                    fetched = store.fetch([body['id']], namespace)
+                    vector = fetched[body['id']]['values'] if fetched else None
+                if vector is None:
+                    return self._error(400, "Query requires a vector or the ID of an existing vector")
+                matches = store.query(vector, int(body.get('topK', 10)), namespace, body.get('filter'),
+                                      bool(body.get('includeValues')), bool(body.get('includeMetadata')))
+                return self._send(200, {'matches': matches, 'namespace': namespace, 'usage': {'readUnits': 1}})
+            if route in (('POST', '/describe_index_stats'), ('GET', '/describe_index_stats')):
+                return self._send(200, store.stats(body.get('filter')))
+            if route == ('GET', '/vectors/fetch'):
+                namespace = query.get('namespace', [''])[0]
+                return self._send(200, {'vectors': store.fetch(query.get('ids', []), namespace),
+                                        'namespace': namespace, 'usage': {'readUnits': 1}})
+            if route == ('GET', '/vectors/list'):
+                namespace = query.get('namespace', [''])[0]
+                ids = store.list_ids(namespace, query.get('prefix', [''])[0])
+                start = int(query.get('paginationToken', ['0'])[0])
+                limit = int(query.get('limit', ['100'])[0])
+                response = {'vectors': [{'id': vector_id} for vector_id in ids[start:start + limit]],
+                            'namespace': namespace, 'usage': {'readUnits': 1}}
+                if start + limit < len(ids):
+                    response['pagination'] = {'next': str(start + limit)}
+                return self._send(200, response)
+            if route == ('POST', '/vectors/delete'):
+                store.delete(body.get('namespace', ''), body.get('ids'), bool(body.get('deleteAll')), body.get('filter'))
+                return self._send(200, {})
+            return self._error(404, f"Unknown endpoint {method} {url.path}")
+        except (ValueError, KeyError, TypeError) as e:
+            return self._error(400, str(e))
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class FakePineconeServer(ThreadingHTTPServer):
+    """
+    Local stand-in for a Pinecone index, backed by an in-memory VectorStore.
+    Point the app at it with PINECONE_HOST=http://localhost:<port>.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str = 'localhost', port: int = 5081, faults: Optional[FaultProfile] = None,
+                 metric: str = 'cosine', verbose: bool = False):
+        super().__init__((host, port), FakePineconeHandler)
+        self.store = VectorStore(metric)
+        self.faults = faults or FaultProfile()
+        self.verbose = verbose
+        self.requests: Counter = Counter()
+        self._requests_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, path: str, status: int) -> None:
+        with self._requests_lock:
+            self.requests[(path, status)] += 1
+
+    def summary(self) -> str:
+        with self._requests_lock:
+            return "\n".join(f"  {path:<24} {status}  {count}" for (path, status), count in sorted(self.requests.items()))
+
+
+def start_fake_pinecone(port: int = 0, faults: Optional[FaultProfile] = None, **kwargs) -> FakePineconeServer:
+    """
+    Start a fake Pinecone server in a background thread, e.g. for load tests.
+
+    Args:
+        port (int, optional): Port to listen on; 0 picks a free one. Defaults to 0
+        faults (Optional[FaultProfile]): Latency and failure injection. Defaults to none
+
+    Returns:
+        FakePineconeServer: The running server; call shutdown() to stop it
+    """
+    server = FakePineconeServer(port=port, faults=faults, **kwargs)
+    threading.Thread(target=server.serve_forever, name='fake-pinecone', daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake Pinecone index with latency and fault injection")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5081)
+    parser.add_argument('--metric', default='cosine', choices=['cosine', 'dotproduct', 'euclidean'])
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--latency-dist', default='fixed', choices=['fixed', 'uniform', 'lognormal'])
+    parser.add_argument('--lognormal-sigma', type=float, default=0.5)
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with 500/503")
+    parser.add_argument('--max-rps', type=float, default=None, help="Throttle requests beyond this rate")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    fault_profile = FaultProfile(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, latency_dist=args.latency_dist,
+        lognormal_sigma=args.lognormal_sigma, throttle_rate=args.throttle_rate, error_rate=args.error_rate,
+        max_rps=args.max_rps, seed=args.seed,
+    )
+    fake = FakePineconeServer(args.host, args.port, fault_profile, args.metric, args.verbose)
+    msg.info(f"Fake Pinecone listening on {fake.url} ({fault_profile})")
+    msg.info(f"Use it with: PINECONE_HOST={fake.url}")
+    try:
+        fake.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.server_close()
+        print(fake.summary())
@@ -1,26 +1,41 @@
 from embeddings.SentenceTransformer import SentenceTransformersEmbedder
-from typing import Dict, List, Optional
-from pinecone import Pinecone
+from embeddings.scheduler import ScheduleReport
+from indexing.chunk_store import ChunkStore
+from indexing.sharding import ShardRouter
+from chunking.cache import chunking_key
+from indexing.vector_ids import filing_prefix, vector_id, delete_stale_vectors
+from dedup.detector import NearDuplicateDetector, DedupReport
+from typing import Dict, List, Optional, TYPE_CHECKING
 
 import sys
 import os
 import streamlit as st
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+if TYPE_CHECKING:
+    from pinecone import Pinecone
+
 class Indexer:
-    def __init__(self, embedder: SentenceTransformersEmbedder, index: Pinecone):
+    def __init__(self, embedder: SentenceTransformersEmbedder, index: "Pinecone",
+                 chunk_store: Optional[ChunkStore] = None,
+                 dedup: Optional[NearDuplicateDetector] = None,
+                 router: Optional[ShardRouter] = None):
         """
         Initialize the Indexer with required parameters.
         
         Args:
             embedder (SentenceTransformersEmbedder): The embedding model to use
-            index_name (str): Name of the Pinecone index
-            cik (str): Company CIK number
-            year (int): Year of the filing
-            split (str): Dataset split (train/test/validate)
+            index (Pinecone): The Pinecone index to upsert into
+            chunk_store (Optional[ChunkStore]): Local store for chunk text. Defaults to a new ChunkStore
+            dedup (Optional[NearDuplicateDetector]): Reuses embeddings of chunks repeated from the
+                company's other filings. None encodes every chunk
+            router (Optional[ShardRouter]): Maps filings to namespaces. Defaults to the configured scheme
         """
         self.embedder = embedder
         self.index = index
+        self.chunk_store = chunk_store or ChunkStore()
+        self.dedup = dedup
+        self.router = router or ShardRouter()
 
 
 
@@ -38,57 +53,102 @@ class Indexer:
             print(f"Error getting index stats: {str(e)}")
             raise
 
-    def index_chunks(self, chunks: Dict, cik: str, year: int, split: str) -> None:
+    def index_chunks(self, chunks: Dict, cik: str, year: int, split: str) -> Optional[DedupReport]:
         """
         Index chunks into Pinecone.
         
         Args:
             chunks (Dict): Dictionary containing text chunks to index
+            
+        Returns:
+            Optional[DedupReport]: Share of chunks whose embedding was reused, when dedup is enabled
         """
         # Index chunks into Pinecone
         st.info("\nIndexing chunks into Pinecone...")
-        for section in chunks:
-            if section not in ['cik', 'year', 'split']:     # Skip metadata fields
-                try:
-                    section_chunks = chunks[section]['chunks']
-                    item_number = chunks[section]['item_number']
-                    item_name = chunks[section]['item_name']
+        report = DedupReport(cik, year) if self.dedup else None
+        namespace = self.router.namespace(cik, year, split)
+        variant = chunking_key()
+        prefix = filing_prefix(cik, year, split, variant)
+        sections = [section for section in chunks
+                    if section not in ['cik', 'year', 'split'] and chunks[section].get('chunks')]     # Skip metadata fields
+
+        # Embed the chunks of all sections together so batches are bucketed by length across sections
+        texts = [chunk for section in sections for chunk in chunks[section]['chunks']]
+        self.embedder.last_report = ScheduleReport()
+        try:
+            if self.dedup:
+                vector_ids = [vector_id(cik, year, split, section, i, variant)
+                              for section in sections for i in range(len(chunks[section]['chunks']))]
+                all_embeddings = self.dedup.embed(cik, year, vector_ids, texts, self.embedder.vectorize, report)
+            else:
+                all_embeddings = self.embedder.vectorize(texts)
+        except Exception as e:
+            print(f"Error embedding chunks: {str(e)}")
+            return report
+        overlong = len(self.embedder.last_report.overlong)
+        if overlong:
+            st.info(f"{overlong} chunk(s) exceeded the embedding model's max sequence length and were "
+                    f"embedded in windows")
 
-                    # Get embeddings for all chunks in this section
-                    embeddings = self.embedder.vectorize(section_chunks)
-                    # Convert embeddings to list if they're numpy arrays
-                    embeddings = [emb.tolist() if hasattr(emb, 'tolist') else emb for emb in embeddings]
+        offset = 0
+        written: List[str] = []
+        complete = True
+        for section in sections:
+            try:
+                section_chunks = chunks[section]['chunks']
+                embeddings = all_embeddings[offset:offset + len(section_chunks)]
+                offset += len(section_chunks)
+                # Convert embeddings to list if they're numpy arrays
+                embeddings = [emb.tolist() if hasattr(emb, 'tolist') else emb for emb in embeddings]
 
-            
-                    # Prepare vectors for Pinecone
-                    vectors = []
-                    for i, (chunk, embedding) in enumerate(zip(section_chunks, embeddings)):
-                        vector = {
-                            "id": f"{cik}_{year}_{section}_{i}",
-                            "values": embedding,
-                            "metadata": {
-                                "cik": cik,
-                                "year": year,
-                                "split": split,
-                                "section": section,
-                                "item_number": item_number,
-                                "item_name": item_name,
-                                "chunk_index": i,
-                                "content": chunk
-                            }
+                # Prepare vectors for Pinecone; chunk text goes to the local chunk store
+                vectors = []
+                for i, (chunk, embedding) in enumerate(zip(section_chunks, embeddings)):
+                    vector = {
+                        "id": vector_id(cik, year, split, section, i, variant),
+                        "values": embedding,
+                        "metadata": {
+                            "cik": cik,
+                            "year": year,
+                            "split": split,
+                            "chunking": variant,
+                            "section": section,
+                            "chunk_index": i
                         }
-                        vectors.append(vector)
+                    }
+                    vectors.append(vector)
+                self.chunk_store.put_many(
+                    (vector["id"], chunk) for vector, chunk in zip(vectors, section_chunks)
+                )
+                written.extend(vector["id"] for vector in vectors)
+
+                # Batch upsert to Pinecone (in smaller batches)
+                batch_size = 10
+                for i in range(0, len(vectors), batch_size):
+                    batch = vectors[i:i + batch_size]
+                    try:
+                        self.index.upsert(vectors=batch, namespace=namespace)
 
-                    # Batch upsert to Pinecone (in smaller batches)
-                    batch_size = 10
-                    for i in range(0, len(vectors), batch_size):
-                        batch = vectors[i:i + batch_size]
-                        try:
-                            self.index.upsert(vectors=batch, namespace="ns1")
+                    except Exception as e:
+                        complete = False
+                        print(f"Error upserting batch: {str(e)}")
 
-                        except Exception as e:
-                            print(f"Error upserting batch: {str(e)}")
-                   
-                except Exception as e:
-                    print(f"Error indexing section {section}: {str(e)}")
+            except Exception as e:
+                complete = False
+                print(f"Error indexing section {section}: {str(e)}")
+        self.router.register(namespace)
+        # A filing with failed sections keeps its earlier vectors rather than losing them
+        if complete:
+            try:
+                stale = delete_stale_vectors(self.index, self.chunk_store, namespace, prefix, written)
+                if stale:
+                    st.info(f"Removed {stale} chunk(s) left over from an earlier indexing of this filing")
+            except Exception as e:
+                print(f"Error removing stale chunks: {str(e)}")
+        if report:
+            self.dedup.save(cik)
+            self.dedup.evict(cik)
+            st.info(f"Reused embeddings for {report.reused} of {report.total} chunks "
+                    f"({report.ratio:.0%}) from other {cik} filings")
         st.success('✅  Completed indexing')
+        return report
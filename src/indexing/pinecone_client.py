@@ -0,0 +1,23 @@
+import os
+
+
+def get_pinecone_index(index_name: str = None):
+    """
+    Connect to the Pinecone index configured in the environment.
+    PINECONE_API_KEY and PINECONE_INDEX_NAME select the index; if PINECONE_HOST is set
+    (e.g. 'http://localhost:5081' for the fake server in indexing.fake_pinecone) the data plane
+    is reached there directly and no index lookup is made.
+
+    Args:
+        index_name (str, optional): Index name. Defaults to PINECONE_INDEX_NAME
+
+    Returns:
+        Index: Pinecone index client
+    """
+    from pinecone import Pinecone
+
+    host = os.getenv("PINECONE_HOST")
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY") or ("local" if host else None))
+    if host:
+        return pc.Index(host=host)
+    return pc.Index(index_name or os.getenv("PINECONE_INDEX_NAME"))
@@ -0,0 +1,469 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+from indexing.sharding import ShardRouter
+from indexing.vector_ids import filing_prefix, vector_id, delete_stale_vectors
+from wasabi import msg
+
+_DONE = object()
+
+
+def iter_json_object_items(path: Path, read_size: int = 1 << 16) -> Iterator[Tuple[str, Any]]:
+    """
+    Stream the top-level key/value pairs of a JSON object file.
+    Only the value being decoded is held in memory, so memory is bounded by the largest
+    section rather than by the size of the filing.
+
+    Args:
+        path (Path): JSON file containing a single object
+        read_size (int, optional): Characters read per refill. Defaults to 65536
+
+    Yields:
+        Tuple[str, Any]: Each key and its decoded value, in file order
+
+    Raises:
+        ValueError: If the file is not a JSON object
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer, pos, eof = '', 0, False
+
+        def refill(size: int) -> bool:
+            nonlocal buffer, pos, eof
+            chunk = f.read(size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            return bool(chunk)
+
+        def peek() -> str:
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                if not refill(read_size):
+                    raise ValueError(f"Unexpected end of {path}")
+
+        def decode() -> Any:
+            nonlocal pos
+            size = read_size
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # A value ending exactly at the buffer end may be a truncated number
+                    if end < len(buffer) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                refill(size)
+                size *= 2
+
+        if peek() != '{':
+            raise ValueError(f"{path} does not contain a JSON object")
+        pos += 1
+        while True:
+            char = peek()
+            if char == '}':
+                return
+            if char == ',':
+                pos += 1
+                continue
+            key = decode()
+            if peek() != ':':
+                raise ValueError(f"Malformed object in {path}")
+            pos += 1
+            peek()
+            yield key, decode()
+
+
+def parse_filing_path(path: Path) -> Tuple[str, int, str]:
+    """
+    Get (cik, year, split) from a 'data/edgar_corpus_{year}/{split}/{cik}_{year}.json' path.
+
+    Args:
+        path (Path): Filing JSON path
+
+    Returns:
+        Tuple[str, int, str]: CIK, year and split of the filing
+    """
+    cik, year = Path(path).stem.split('_')[:2]
+    return cik, int(year), Path(path).parent.name
+
+
+@dataclass
+class SectionText:
+    cik: str
+    year: int
+    split: str
+    section: str
+    text: str
+
+
+@dataclass
+class SectionChunks:
+    cik: str
+    year: int
+    split: str
+    section: str
+    chunks: List[str]
+    embeddings: Optional[List[List[float]]] = None
+
+
+@dataclass
+class FilingEnd:
+    cik: str
+    year: int
+    split: str
+    sections: int = 0
+    chunks: int = 0
+    reused_embeddings: int = 0
+
+
+@dataclass
+class QueueStats:
+    """Occupancy samples of one bounded queue"""
+    capacity: int
+    samples: int = 0
+    total: int = 0
+    peak: int = 0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.samples if self.samples else 0.0
+
+
+@dataclass
+class PipelineReport:
+    """Outcome and stage statistics of a pipeline run"""
+    filings: List[FilingEnd] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    queues: Dict[str, QueueStats] = field(default_factory=dict)
+    stage_items: Dict[str, int] = field(default_factory=dict)
+    stage_busy_seconds: Dict[str, float] = field(default_factory=dict)
+    elapsed_seconds: float = 0.0
+
+    def summary(self) -> str:
+        lines = [f"Ingested {len(self.filings)} filing(s), "
+                 f"{sum(f.chunks for f in self.filings)} chunks in {self.elapsed_seconds:.1f}s"]
+        for name, stats in self.queues.items():
+            lines.append(f"  queue {name:<10} capacity {stats.capacity:>3}  "
+                         f"mean {stats.mean:5.1f}  peak {stats.peak:>3}")
+        for name, busy in self.stage_busy_seconds.items():
+            lines.append(f"  stage {name:<10} items {self.stage_items.get(name, 0):>6}  busy {busy:7.1f}s")
+        for error in self.errors:
+            lines.append(f"  error: {error}")
+        return "\n".join(lines)
+
+
+class IngestPipeline:
+    """
+    Bounded-memory ingest from filing JSON to the vector index.
+    Section reader, chunker, embedder and upserter run as threads connected by bounded
+    queues, so a slow stage applies backpressure upstream and peak memory depends on the
+    queue sizes, not on the size or number of filings.
+    """
+
+    def __init__(self, chunker, embedder, index, chunk_store, dedup=None, queue_size: int = 8,
+                 embed_batch_chunks: int = 256, upsert_batch_size: int = 100,
+                 sample_interval: float = 0.5, router: Optional[ShardRouter] = None):
+        """
+        Initialize the IngestPipeline.
+
+        Args:
+            chunker (TextChunker): Splits section text into chunks
+            embedder (SentenceTransformersEmbedder): Embeds chunks
+            index (Pinecone): Index to upsert vectors into
+            chunk_store (ChunkStore): Local store for chunk text
+            dedup (Optional[NearDuplicateDetector]): Reuses embeddings of repeated chunks
+            queue_size (int, optional): Capacity of each inter-stage queue. Defaults to 8
+            embed_batch_chunks (int, optional): Chunks gathered across sections per embedding call. Defaults to 256
+            upsert_batch_size (int, optional): Vectors per upsert request. Defaults to 100
+            sample_interval (float, optional): Seconds between queue occupancy samples. Defaults to 0.5
+            router (Optional[ShardRouter]): Maps filings to namespaces. Defaults to the configured scheme
+        """
+        self.chunker = chunker
+        self.embedder = embedder
+        self.index = index
+        self.chunk_store = chunk_store
+        self.dedup = dedup
+        self.queue_size = queue_size
+        self.embed_batch_chunks = embed_batch_chunks
+        self.upsert_batch_size = upsert_batch_size
+        self.sample_interval = sample_interval
+        self.router = router or ShardRouter()
+        self._failed = threading.Event()
+        self._report = PipelineReport()
+        self._report_lock = threading.Lock()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """Block until the queue has room, giving up if another stage failed. Returns whether the item was queued."""
+        while not self._failed.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._failed.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _error(self, message: str) -> None:
+        msg.fail(message)
+        with self._report_lock:
+            self._report.errors.append(message)
+
+    def _run_stage(self, name: str, inbox: Optional[queue.Queue], outbox: Optional[queue.Queue],
+                   handle: Callable[[Any], Iterable[Any]], source: Optional[Iterable[Any]] = None) -> None:
+        """Run one stage: take items from the inbox (or source), emit results to the outbox."""
+        items = 0
+        busy = 0.0
+        try:
+            upstream = source if source is not None else iter(lambda: self._get(inbox), _DONE)
+            for item in upstream:
+                # Once a stage has failed the run is abandoned, so stop reading and processing
+                if self._failed.is_set():
+                    break
+                started = time.perf_counter()
+                outputs = list(handle(item))
+                busy += time.perf_counter() - started
+                items += 1
+                if outbox is not None and not all(self._put(outbox, output) for output in outputs):
+                    break
+        except Exception as e:
+            self._error(f"Stage {name} stopped: {str(e)}")
+            self._failed.set()
+        finally:
+            if hasattr(source, 'close'):
+                source.close()
+            with self._report_lock:
+                self._report.stage_items[name] = items
+                self._report.stage_busy_seconds[name] = busy
+            if outbox is not None:
+                self._put(outbox, _DONE)
+
+    def _read(self, path: Path) -> Iterator[Any]:
+        cik, year, split = parse_filing_path(path)
+        for key, value in iter_json_object_items(path):
+            if key.startswith('section') and isinstance(value, str) and value:
+                yield SectionText(cik, year, split, key, value)
+        yield FilingEnd(cik, year, split)
+
+    def _chunk(self, item) -> Iterator[Any]:
+        if isinstance(item, FilingEnd):
+            yield item
+            return
+        try:
+            chunks = self.chunker.chunk_text(item.text, method=config['chunking']['method'], config=config['chunking'])
+            yield SectionChunks(item.cik, item.year, item.split, item.section, chunks)
+        except Exception as e:
+            self._incomplete.add((item.cik, item.year, item.split))
+            self._error(f"Error chunking {item.cik}_{item.year} {item.section}: {str(e)}")
+
+    def _make_embed_handler(self) -> Callable[[Any], Iterator[Any]]:
+        pending: List[SectionChunks] = []
+        counts = {'sections': 0, 'chunks': 0, 'reused': 0}
+
+        def flush() -> List[SectionChunks]:
+            if not pending:
+                return []
+            batch = list(pending)
+            pending.clear()
+            first = batch[0]
+            texts = [chunk for section in batch for chunk in section.chunks]
+            try:
+                if self.dedup:
+                    from dedup.detector import DedupReport
+
+                    report = DedupReport(first.cik, first.year)
+                    vector_ids = [vector_id(s.cik, s.year, s.split, s.section, i, self._variant)
+                                  for s in batch for i in range(len(s.chunks))]
+                    embeddings = self.dedup.embed(first.cik, first.year, vector_ids, texts,
+                                                  self.embedder.vectorize, report)
+                    counts['reused'] += report.reused
+                else:
+                    embeddings = self.embedder.vectorize(texts)
+            except Exception as e:
+                self._incomplete.update((s.cik, s.year, s.split) for s in batch)
+                self._error(f"Error embedding {first.cik}_{first.year}: {str(e)}")
+                return []
+            offset = 0
+            for section in batch:
+                section.embeddings = embeddings[offset:offset + len(section.chunks)]
+                offset += len(section.chunks)
+                counts['sections'] += 1
+                counts['chunks'] += len(section.chunks)
+            return batch
+
+        def handle(item) -> Iterator[Any]:
+            if isinstance(item, FilingEnd):
+                yield from flush()
+                if self.dedup:
+                    self.dedup.save(item.cik)
+                    self.dedup.evict(item.cik)
+                item.sections, item.chunks, item.reused_embeddings = counts['sections'], counts['chunks'], counts['reused']
+                counts.update(sections=0, chunks=0, reused=0)
+                yield item
+                return
+            if not item.chunks:
+                return
+            pending.append(item)
+            if sum(len(section.chunks) for section in pending) >= self.embed_batch_chunks:
+                yield from flush()
+
+        return handle
+
+    def _upsert(self, item) -> Iterator[Any]:
+        filing = (item.cik, item.year, item.split)
+        namespace = self.router.namespace(item.cik, item.year, item.split)
+        if isinstance(item, FilingEnd):
+            written = self._written.pop(filing, [])
+            # A filing with failed sections keeps its earlier vectors rather than losing them
+            if filing not in self._incomplete:
+                try:
+                    delete_stale_vectors(self.index, self.chunk_store, namespace,
+                                         filing_prefix(item.cik, item.year, item.split, self._variant), written)
+                except Exception as e:
+                    self._error(f"Error removing stale chunks of {item.cik}_{item.year}: {str(e)}")
+            self._incomplete.discard(filing)
+            with self._report_lock:
+                self._report.filings.append(item)
+            msg.good(f"Indexed {item.cik}_{item.year}: {item.chunks} chunks, "
+                     f"{item.reused_embeddings} reused embeddings")
+            return iter(())
+        vectors = [
+            {
+                "id": vector_id(item.cik, item.year, item.split, item.section, i, self._variant),
+                "values": embedding.tolist() if hasattr(embedding, 'tolist') else embedding,
+                "metadata": {
+                    "cik": item.cik,
+                    "year": item.year,
+                    "split": item.split,
+                    "chunking": self._variant,
+                    "section": item.section,
+                    "chunk_index": i
+                }
+            }
+            for i, embedding in enumerate(item.embeddings)
+        ]
+        self.chunk_store.put_many((vector["id"], chunk) for vector, chunk in zip(vectors, item.chunks))
+        self._written.setdefault(filing, []).extend(vector["id"] for vector in vectors)
+        for start in range(0, len(vectors), self.upsert_batch_size):
+            try:
+                self.index.upsert(vectors=vectors[start:start + self.upsert_batch_size], namespace=namespace)
+            except Exception as e:
+                self._incomplete.add(filing)
+                self._error(f"Error upserting batch of {item.cik}_{item.year} {item.section}: {str(e)}")
+        self.router.register(namespace)
+        return iter(())
+
+    def _monitor(self, queues: Dict[str, queue.Queue], stop: threading.Event) -> None:
+        while not stop.wait(self.sample_interval):
+            for name, q in queues.items():
+                stats = self._report.queues[name]
+                size = q.qsize()
+                stats.samples += 1
+                stats.total += size
+                stats.peak = max(stats.peak, size)
+
+    def run(self, filing_paths: Iterable[Path]) -> PipelineReport:
+        """
+        Ingest filings through the pipeline.
+
+        Args:
+            filing_paths (Iterable[Path]): Filing JSON files, consumed lazily
+
+        Returns:
+            PipelineReport: Filings ingested, errors and per-stage queue occupancy
+        """
+        from chunking.cache import chunking_key
+
+        self._failed.clear()
+        self._report = PipelineReport()
+        self._variant = chunking_key()
+        # Vector IDs written per filing, so vectors of an earlier indexing can be removed
+        self._written: Dict[Tuple[str, int, str], List[str]] = {}
+        self._incomplete: set = set()
+        queues = {name: queue.Queue(maxsize=self.queue_size) for name in ['sections', 'chunks', 'vectors']}
+        self._report.queues = {name: QueueStats(self.queue_size) for name in queues}
+
+        def sections() -> Iterator[Any]:
+            for path in filing_paths:
+                try:
+                    yield from self._read(Path(path))
+                except Exception as e:
+                    self._error(f"Error reading {path}: {str(e)}")
+
+        threads = [
+            threading.Thread(target=self._run_stage, name='reader',
+                             args=('reader', None, queues['sections'], lambda item: [item], sections())),
+            threading.Thread(target=self._run_stage, name='chunker',
+                             args=('chunker', queues['sections'], queues['chunks'], self._chunk)),
+            threading.Thread(target=self._run_stage, name='embedder',
+                             args=('embedder', queues['chunks'], queues['vectors'], self._make_embed_handler())),
+            threading.Thread(target=self._run_stage, name='upserter',
+                             args=('upserter', queues['vectors'], None, self._upsert)),
+        ]
+        stop_monitor = threading.Event()
+        monitor = threading.Thread(target=self._monitor, args=(queues, stop_monitor), daemon=True)
+
+        started = time.perf_counter()
+        monitor.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stop_monitor.set()
+        monitor.join()
+        self._report.elapsed_seconds = time.perf_counter() - started
+        return self._report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream filings into the vector index with bounded memory")
+    parser.add_argument('filings', nargs='+', help="Filing JSON files, e.g. data/edgar_corpus_2020/test/*_2020.json")
+    parser.add_argument('--queue-size', type=int, default=8)
+    parser.add_argument('--embed-batch-chunks', type=int, default=256)
+    parser.add_argument('--embedding-workers', type=int, default=None,
+                        help="Embedding worker processes (default: config pool_workers)")
+    args = parser.parse_args()
+    if args.embedding_workers is not None:
+        config['embeddings']['sentence_transformer']['pool_workers'] = args.embedding_workers
+
+    from chunking.chunker import TextChunker
+    from embeddings.SentenceTransformer import SentenceTransformersEmbedder
+    from indexing.chunk_store import ChunkStore
+    from dedup.detector import NearDuplicateDetector
+    from indexing.pinecone_client import get_pinecone_index
+
+    pipeline = IngestPipeline(
+        TextChunker(model_name=config['chunking']['model']),
+        SentenceTransformersEmbedder(),
+        get_pinecone_index(),
+        ChunkStore(),
+        NearDuplicateDetector() if config.get('dedup', {}).get('enabled') else None,
+        queue_size=args.queue_size,
+        embed_batch_chunks=args.embed_batch_chunks,
+    )
+    # Chunk files share the directory with filings; only '{cik}_{year}.json' files are ingested
+    paths = (Path(p) for p in args.filings if not p.endswith('_chunks.json'))
+    print(pipeline.run(paths).summary())
@@ -0,0 +1,267 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+from wasabi import msg
+
+# Metadata fields holding the chunk text of vectors indexed before the chunk store
+LEGACY_TEXT_FIELDS = ('content', 'text')
+
+# Filing fields each scheme puts in the namespace name, in order
+SCHEMES = {
+    'cik_year': ('cik', 'year'),
+    'year_split': ('year', 'split'),
+    'single': (),
+}
+
+
+class ShardRouter:
+    """
+    Map filings to Pinecone namespaces.
+    With the 'cik_year' scheme every filing lives in its own namespace ('cik-320193-2020'),
+    so single-filing lookups only search that filing's vectors; 'year_split' groups a
+    year's split ('2020-test'); 'single' keeps everything in one namespace.
+    Queries that do not pin every field of the scheme fan out over the matching
+    namespaces, found from the index statistics.
+    """
+
+    def __init__(self, scheme: Optional[str] = None, prefix: Optional[str] = None,
+                 namespace: Optional[str] = None, namespace_ttl: Optional[float] = None):
+        """
+        Initialize the ShardRouter.
+
+        Args:
+            scheme (Optional[str]): 'cik_year', 'year_split' or 'single'. Defaults to config['sharding']['scheme']
+            prefix (Optional[str]): Prefix of every namespace name. Defaults to config['sharding']['prefix']
+            namespace (Optional[str]): Namespace of the 'single' scheme. Defaults to config['sharding']['namespace']
+            namespace_ttl (Optional[float]): Seconds the list of existing namespaces is reused.
+                Defaults to config['sharding']['namespace_ttl']
+
+        Raises:
+            ValueError: If the scheme is unknown
+        """
+        settings = config.get('sharding', {})
+        self.scheme = scheme or settings.get('scheme', 'cik_year')
+        if self.scheme not in SCHEMES:
+            raise ValueError(f"Unsupported sharding scheme: {self.scheme}")
+        self.fields = SCHEMES[self.scheme]
+        self.prefix = prefix if prefix is not None else settings.get('prefix', '')
+        # CIKs are bare numbers; tag them so 'cik_year' names are not mistaken for 'year_split' ones
+        self._name_prefix = f"{self.prefix}cik-" if self.scheme == 'cik_year' else self.prefix
+        self.single_namespace = namespace or settings.get('namespace', 'ns1')
+        self.namespace_ttl = namespace_ttl if namespace_ttl is not None else settings.get('namespace_ttl', 60)
+        self._known: Optional[set] = None
+        self._known_at = 0.0
+        self._lock = threading.Lock()
+
+    def namespace(self, cik: str, year: int, split: str) -> str:
+        """
+        Get the namespace holding a filing's vectors.
+
+        Args:
+            cik (str): Company CIK number
+            year (int): Filing year
+            split (str): Dataset split
+
+        Returns:
+            str: Namespace name
+        """
+        if not self.fields:
+            return self.single_namespace
+        values = {'cik': cik, 'year': year, 'split': split}
+        return f"{self._name_prefix}{'-'.join(str(values[name]) for name in self.fields)}"
+
+    def parse(self, namespace: str) -> Optional[Dict[str, str]]:
+        """
+        Recover the filing fields encoded in a namespace name.
+
+        Args:
+            namespace (str): Namespace name
+
+        Returns:
+            Optional[Dict[str, str]]: Field values, or None if the name does not follow this scheme
+        """
+        if not self.fields:
+            return {} if namespace == self.single_namespace else None
+        if not namespace.startswith(self._name_prefix):
+            return None
+        name = namespace[len(self._name_prefix):]
+        parts = dict(zip(self.fields, name.split('-', len(self.fields) - 1)))
+        if len(parts) != len(self.fields) or not all(parts.values()):
+            return None
+        if not all(parts[name].isdigit() for name in ('cik', 'year') if name in parts):
+            return None
+        return parts
+
+    def known_namespaces(self, index, refresh: bool = False) -> List[str]:
+        """
+        List the namespaces of this scheme that exist in the index.
+        The list is taken from the index statistics and reused for namespace_ttl seconds.
+
+        Args:
+            index (Index): Pinecone index client
+            refresh (bool, optional): Ignore the reused list. Defaults to False
+
+        Returns:
+            List[str]: Namespace names
+        """
+        with self._lock:
+            if refresh or self._known is None or time.monotonic() - self._known_at > self.namespace_ttl:
+                stats = index.describe_index_stats()
+                self._known = {name for name in stats.namespaces if self.parse(name) is not None}
+                self._known_at = time.monotonic()
+            return sorted(self._known)
+
+    def register(self, namespace: str) -> None:
+        """Record a namespace just written to, so queries see it before the next refresh."""
+        with self._lock:
+            if self._known is not None:
+                self._known.add(namespace)
+
+    def route(self, index, cik: Optional[str] = None, year: Optional[int] = None,
+              split: Optional[str] = None) -> List[str]:
+        """
+        Get the namespaces a query must search.
+        A query pinning every field of the scheme goes to exactly one namespace without
+        consulting the index; otherwise it fans out over the existing namespaces that match.
+
+        Args:
+            index (Index): Pinecone index client
+            cik (Optional[str]): Company CIK number
+            year (Optional[int]): Filing year
+            split (Optional[str]): Dataset split
+
+        Returns:
+            List[str]: Namespaces to query
+        """
+        values = {'cik': cik, 'year': year, 'split': split}
+        if all(values[name] for name in self.fields):
+            return [self.namespace(cik, year, split)]
+        wanted = {name: str(values[name]) for name in self.fields if values[name]}
+        return [namespace for namespace in self.known_namespaces(index)
+                if all(self.parse(namespace)[name] == value for name, value in wanted.items())]
+
+
+def _iter_ids(index, namespace: str, page_size: int) -> Iterator[List[str]]:
+    """
+    Page through the vector IDs of a namespace.
+    All IDs are listed before the first page is yielded, so deleting vectors of a page
+    cannot shift the listing past IDs not yet seen.
+    """
+    ids = [vector_id for page in index.list(namespace=namespace, limit=page_size) for vector_id in page]
+    for start in range(0, len(ids), page_size):
+        yield ids[start:start + page_size]
+
+
+def migrate(index, router: ShardRouter, source_namespaces: Optional[List[str]] = None,
+            batch_size: int = 100, delete_source: bool = False, dry_run: bool = False,
+            chunk_store=None, variant: Optional[str] = None) -> Dict[str, int]:
+    """
+    Move vectors into the namespaces the router assigns them.
+    Vectors are fetched with their values and metadata, upserted into their target
+    namespace and, once written, optionally deleted from the source. Vectors already in
+    their target namespace are left alone, so the migration can be resumed or rerun.
+    Vectors indexed before chunking variants existed are upgraded on the way: they are
+    stamped with the chunking variant, given IDs in the current format, and their text is
+    moved from the metadata into the chunk store, so queries and the indexed check find them.
+
+    Args:
+        index (Index): Pinecone index client
+        router (ShardRouter): Target sharding scheme
+        source_namespaces (Optional[List[str]]): Namespaces to re-shard. Defaults to every namespace in the index
+        batch_size (int, optional): Vectors fetched and upserted per request. Defaults to 100
+        delete_source (bool, optional): Delete moved vectors from their source namespace. Defaults to False
+        dry_run (bool, optional): Only count what would move. Defaults to False
+        chunk_store (Optional[ChunkStore]): Store receiving the text of upgraded vectors. Defaults to a new ChunkStore
+        variant (Optional[str]): Chunking variant key stamped on upgraded vectors. Defaults to the configured variant;
+            configure the chunking the legacy vectors were cut with before migrating
+
+    Returns:
+        Dict[str, int]: Vectors moved into each target namespace
+    """
+    from chunking.cache import chunking_key
+    from indexing.chunk_store import ChunkStore
+    from indexing.vector_ids import vector_id as current_vector_id
+
+    variant = variant or chunking_key()
+    if chunk_store is None and not dry_run:
+        chunk_store = ChunkStore()
+    if source_namespaces is None:
+        source_namespaces = sorted(index.describe_index_stats().namespaces)
+    moved: Dict[str, int] = {}
+    for source in source_namespaces:
+        for ids in _iter_ids(index, source, batch_size):
+            fetched = index.fetch(ids=ids, namespace=source).vectors
+            targets: Dict[str, List[Dict]] = {}
+            sources: Dict[str, List[str]] = {}
+            texts: List[Tuple[str, str]] = []
+            for vector_id, vector in fetched.items():
+                metadata = dict(vector.metadata or {})
+                if not all(metadata.get(name) is not None for name in ('cik', 'year', 'split')):
+                    msg.warn(f"Skipping {vector_id} in '{source}': no cik, year and split metadata")
+                    continue
+                cik, year, split = metadata['cik'], int(metadata['year']), metadata['split']
+                target = router.namespace(cik, year, split)
+                new_id = vector_id
+                if 'chunking' not in metadata:
+                    text = None
+                    for field in LEGACY_TEXT_FIELDS:
+                        text = metadata.pop(field, None) or text
+                    if text is None and chunk_store is not None:
+                        text = chunk_store.get(vector_id)
+                    if text is None and not dry_run:
+                        msg.warn(f"Skipping {vector_id} in '{source}': its text is neither in the metadata "
+                                 f"nor in the chunk store, index the filing again instead")
+                        continue
+                    metadata['chunking'] = variant
+                    if metadata.get('section') is not None and metadata.get('chunk_index') is not None:
+                        new_id = current_vector_id(cik, year, split, metadata['section'],
+                                                   int(metadata['chunk_index']), variant)
+                    texts.append((new_id, text))
+                elif target == source:
+                    continue
+                targets.setdefault(target, []).append(
+                    {'id': new_id, 'values': list(vector.values), 'metadata': metadata}
+                )
+                sources.setdefault(target, []).append(vector_id)
+            if not dry_run and texts:
+                # The text goes in first, so no upgraded vector is searchable without it
+                chunk_store.put_many(texts)
+            for target, vectors in targets.items():
+                moved[target] = moved.get(target, 0) + len(vectors)
+                if dry_run:
+                    continue
+                index.upsert(vectors=vectors, namespace=target)
+                router.register(target)
+                if delete_source:
+                    stale = [old_id for old_id, vector in zip(sources[target], vectors)
+                             if target != source or old_id != vector['id']]
+                    if stale:
+                        index.delete(ids=stale, namespace=source)
+    return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-shard vectors into the configured namespace scheme")
+    parser.add_argument('--scheme', choices=sorted(SCHEMES), default=None,
+                        help="Target scheme (default: config['sharding']['scheme'])")
+    parser.add_argument('--source', nargs='+', default=None,
+                        help="Namespaces to re-shard (default: every namespace), e.g. ns1")
+    parser.add_argument('--delete-source', action='store_true', help="Delete vectors once copied")
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    from indexing.pinecone_client import get_pinecone_index
+
+    moved = migrate(get_pinecone_index(), ShardRouter(args.scheme), args.source,
+                    batch_size=args.batch_size, delete_source=args.delete_source, dry_run=args.dry_run)
+    action = "Would move" if args.dry_run else "Moved"
+    print(f"{action} {sum(moved.values())} vector(s) into {len(moved)} namespace(s)")
+    for target, count in sorted(moved.items()):
+        print(f"  {target}: {count}")
@@ -0,0 +1,74 @@
+import os
+import sys
+from typing import Iterable, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Pinecone accepts up to 1000 IDs per delete request
+DELETE_BATCH_SIZE = 1000
+
+
+def filing_prefix(cik: str, year: int, split: str, variant: Optional[str] = None) -> str:
+    """
+    Get the prefix shared by the vector IDs of one filing chunked with one chunking variant.
+
+    Args:
+        cik (str): Company CIK number
+        year (int): Filing year
+        split (str): Dataset split
+        variant (Optional[str]): Chunking variant key. Defaults to the configured variant
+
+    Returns:
+        str: ID prefix, e.g. '320193_2020_test_3f2a9c0d1e7b4a65_'
+    """
+    if variant is None:
+        from chunking.cache import chunking_key
+
+        variant = chunking_key()
+    return f"{cik}_{year}_{split}_{variant}_"
+
+
+def vector_id(cik: str, year: int, split: str, section: str, chunk_index: int,
+              variant: Optional[str] = None) -> str:
+    """
+    Get the ID of a chunk's vector, also the key of its text in the chunk store.
+    Chunks of the same filing cut by different chunking variants get different IDs, so
+    indexing one variant never overwrites or mixes with the vectors of another.
+
+    Args:
+        cik (str): Company CIK number
+        year (int): Filing year
+        split (str): Dataset split
+        section (str): Filing section the chunk comes from
+        chunk_index (int): Position of the chunk within its section
+        variant (Optional[str]): Chunking variant key. Defaults to the configured variant
+
+    Returns:
+        str: Vector ID, ending in '{section}_{chunk_index}'
+    """
+    return f"{filing_prefix(cik, year, split, variant)}{section}_{chunk_index}"
+
+
+def delete_stale_vectors(index, chunk_store, namespace: str, prefix: str, keep: Iterable[str]) -> int:
+    """
+    Delete a filing's vectors and chunk texts that were not written by its latest indexing.
+    Re-indexing with fewer chunks than before would otherwise leave the surplus chunks
+    of the earlier run searchable.
+
+    Args:
+        index (Index): Pinecone index client
+        chunk_store (ChunkStore): Local store for chunk text
+        namespace (str): Namespace holding the filing's vectors
+        prefix (str): ID prefix of the filing, from filing_prefix
+        keep (Iterable[str]): IDs written by the latest indexing
+
+    Returns:
+        int: Number of stale vectors deleted
+    """
+    keep = set(keep)
+    stale: List[str] = [vector_id for page in index.list(prefix=prefix, namespace=namespace)
+                        for vector_id in page if vector_id not in keep]
+    for start in range(0, len(stale), DELETE_BATCH_SIZE):
+        index.delete(ids=stale[start:start + DELETE_BATCH_SIZE], namespace=namespace)
+    chunk_store.delete_many([vector_id for vector_id in chunk_store.ids_with_prefix(prefix) if vector_id not in keep])
+    return len(stale)
@@ -1,18 +1,31 @@
 import os
 import json
+import time
+import threading
 import streamlit as st
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
 from dataclasses import dataclass
-from pinecone import Pinecone
 import warnings
+from wasabi import msg
 from pathlib import Path
 from chunking.chunker import TextChunker
+from chunking.cache import ChunkCache
 from embeddings.SentenceTransformer import SentenceTransformersEmbedder
 from retrieval.retriever import PineconeRetriever
 from indexing.index import Indexer
-from rag.answer import QueryAnswerer
+from indexing.chunk_store import ChunkStore
+from indexing.pinecone_client import get_pinecone_index
+from indexing.sharding import ShardRouter
+from dedup.detector import NearDuplicateDetector
+from rag.answer import QueryAnswerer, ANSWER_ERROR
+from rag.pipeline import QuestionPipeline
 from utilities import download_edgar_entry_for_cik
 from html_renderer import EdgarHTMLRenderer
+from html_fetcher import EdgarHTMLFetcher, find_filing_html
+from prompts.financial_questions import FINANCIAL_QUESTIONS
+from resources import get_resource, warm_up, ResultCache
+import profiling
+from config import config, get_config_hash
 # Suppress warnings
 warnings.filterwarnings("ignore")
 
@@ -32,13 +45,18 @@ class EdgarAnalyzer:
     def __init__(self):
         self.config = Config()
         self._setup_environment()
-        self.pc = Pinecone(api_key=self.config.PINECONE_API_KEY)
-        self.index = self.pc.Index(self.config.PINECONE_INDEX_NAME)
+        self.index = get_pinecone_index(self.config.PINECONE_INDEX_NAME)
         self.embedder = SentenceTransformersEmbedder()
-        self.indexer = Indexer(self.embedder, self.index)
+        self.chunk_store = ChunkStore()
+        self.dedup = NearDuplicateDetector() if config.get('dedup', {}).get('enabled') else None
+        self.router = ShardRouter()
+        self.indexer = Indexer(self.embedder, self.index, self.chunk_store, self.dedup, self.router)
         self.answerer = QueryAnswerer()
-        self.retriever = PineconeRetriever(self.config.PINECONE_INDEX_NAME)
+        self.retriever = PineconeRetriever(self.config.PINECONE_INDEX_NAME, chunk_store=self.chunk_store,
+                                           index=self.index, router=self.router)
+        self.question_pipeline = QuestionPipeline(self.retriever, self.answerer)
         self.chunker = TextChunker(model_name="sentence-transformers/all-mpnet-base-v2")
+        self.chunk_cache = ChunkCache()
         
     def _setup_environment(self):
         """Set up environment variables and configurations"""
@@ -51,78 +69,100 @@ class EdgarAnalyzer:
         os.environ["LANGSMITH_PROJECT"] = self.config.LANGSMITH_PROJECT
 
     def _get_file_paths(self, cik: str, year: int, split: str) -> Dict[str, Path]:
-        """Get file paths for data and chunks"""
+        """Get file paths for data"""
         project_root = Path(__file__).parent.parent
         data_dir = project_root / 'data' / f'edgar_corpus_{year}' / split
         
         return {
             'data_file': data_dir / f'{cik}_{year}.json',
-            'chunks_file': data_dir / f'{cik}_{year}_chunks.json'
         }
 
     def _process_document(self, cik: str, year: int, split: str) -> Optional[List[Dict]]:
-        """Process and chunk the document"""
+        """Process and chunk the document, reusing chunks cached for the configured chunking variant"""
+        chunks = self.chunk_cache.get(cik, year, split)
+        if chunks is not None:
+            return chunks
+
         paths = self._get_file_paths(cik, year, split)
         
         if not paths['data_file'].exists():
-            results = download_edgar_entry_for_cik(cik, years=[year], splits=[split])
+            with profiling.stage('download'):
+                results = download_edgar_entry_for_cik(cik, years=[year], splits=[split])
             if not results:
                 return None
 
-        with open(paths['data_file'], 'r') as f:
+        with profiling.stage('load'), open(paths['data_file'], 'r') as f:
             data = json.load(f)
 
-        if paths['chunks_file'].exists():
-            with open(paths['chunks_file'], 'r', encoding='utf-8') as f:
-                return json.load(f)
-
-        chunks = self.chunker.chunk_data(data, cik, year, split)
-        with open(paths['chunks_file'], 'w', encoding='utf-8') as f:
-            json.dump(chunks, f, indent=2, ensure_ascii=False)
+        with profiling.stage('chunking'):
+            chunks = self.chunker.chunk_data(data, cik, year, split)
+        self.chunk_cache.put(cik, year, split, chunks)
         st.success("✅ Chunking completed!")
         return chunks
 
-    def analyze_filing(self, cik: str, year: int, split: str) -> Dict[str, Dict[str, str]]:
-        """Analyze EDGAR filing and return results"""
-        results = {}
-        
-        if not self.retriever.is_file_indexed_in_pinecone(cik, year, split):
+    def _ensure_indexed(self, cik: str, year: int, split: str) -> None:
+        """Chunk and index the filing unless it is already in Pinecone"""
+        with profiling.stage('index_check'):
+            indexed = self.retriever.is_file_indexed_in_pinecone(cik, year, split)
+        if not indexed:
             st.info("File is not indexed in Pinecone")
             chunks = self._process_document(cik, year, split)
-            self.indexer.index_chunks(chunks, cik, year, split)
+            with profiling.stage('indexing'):
+                self.indexer.index_chunks(chunks, cik, year, split)
             st.success("✅ File indexed in Pinecone")
                 
         else:
             st.success("✅ File already indexed in Pinecone")
-            
-        shorter_questions = [
-            'Total stockholders',
-            'Employee headcount',
-            'Net sales',
-            'Total cash and cash equivalents',
-            'Quarterly cash dividend'
-        ]
-
-        financial_questions = [
-            "How many record holders of the common stock were reported for the latest year?",
-            "What is the employee headcount for the latest year?",
-            "What was the net sales for the latest year?",
-            "What was the total cash and cash equivalents for the latest year?",
-            "What is the quarterly cash dividend declared for the latest year?"
-        ]
-
-        for _id in range(len(financial_questions)):
-            st.info(f"Analyzing questions")
-            context, chunk_ids = self.retriever.retrieve_documents(financial_questions[_id], cik, year, split)
+
+    def analyze_filing(self, cik: str, year: int, split: str,
+                       on_answer: Optional[Callable[[str, str], None]] = None,
+                       profile: bool = False,
+                       on_profile: Optional[Callable[[Dict], None]] = None) -> Dict[str, Dict[str, str]]:
+        """Analyze EDGAR filing and return results, overlapping retrieval and generation across questions.
+        on_answer is called with a data point and its answer so far while answers stream in.
+        With profile, or when the profiling settings sample this run, CPU and memory profiles are written
+        and on_profile is called with the profile's record (see profiling.ProfileSession.record)"""
+        with profiling.profile_run(cik, year, split, requested=profile) as session:
+            results = {}
+            self._ensure_indexed(cik, year, split)
+
+            st.info("Analyzing questions")
+            labels = list(FINANCIAL_QUESTIONS)
+            on_token = (lambda i, text: on_answer(labels[i], text)) if on_answer else None
+            with profiling.stage('questions'):
+                answers, report = self.question_pipeline.run(list(FINANCIAL_QUESTIONS.values()), cik, year, split,
+                                                             on_token)
+            for label, answer in zip(FINANCIAL_QUESTIONS, answers):
+                if answer:
+                    results[label] = {
+                        'answer': answer[0],
+                        'chunk_ids': answer[1]
+                    }
+            msg.info(report.summary())
+        if session is not None and session.record and on_profile:
+            on_profile(session.record)
+        return results
+
+    def analyze_filings(self, filings: List[Tuple[str, int, str]]) -> Dict[Tuple[str, int, str], Dict[str, Dict[str, str]]]:
+        """Analyze several filings, embedding each question once and reranking in shared batches"""
+        filings = list(dict.fromkeys((str(cik), int(year), split) for cik, year, split in filings))
+        for cik, year, split in filings:
+            self._ensure_indexed(cik, year, split)
+
+        st.info("Analyzing questions")
+        labels = {question: label for label, question in FINANCIAL_QUESTIONS.items()}
+        retrievals = self.retriever.retrieve_documents_many(list(FINANCIAL_QUESTIONS.values()), filings)
+
+        results = {filing: {} for filing in filings}
+        for (question, filing), (context, chunk_ids) in retrievals.items():
             if context:
-                answer, used_chunk_ids = self.answerer.answer_query(financial_questions[_id], context, chunk_ids)
-                results[shorter_questions[_id]] = {
+                answer, used_chunk_ids = self.answerer.answer_query(question, context, chunk_ids)
+                results[filing][labels[question]] = {
                     'answer': answer,
                     'chunk_ids': used_chunk_ids
                 }
-
         return results
-    
+
     def analyze_filing_graph(self, cik: str, year: int, split: str) -> Dict[str, str]:
         """Analyze EDGAR filing and return results"""
         results = {}
@@ -130,8 +170,136 @@ class EdgarAnalyzer:
 
 
 
+def build_results_table(results: Dict[Tuple[str, int, str], Dict[str, Dict[str, str]]]) -> List[Dict]:
+    """Flatten analyze_filings results into one row per CIK, year and data point"""
+    return [
+        {
+            'CIK': cik,
+            'Year': year,
+            'Split': split,
+            'Data Point': data_point,
+            'Answer': result['answer'],
+            'Source Chunks': "\n\n".join([f"• {chunk}" for chunk in result['chunk_ids']])
+        }
+        for (cik, year, split), filing_results in results.items()
+        for data_point, result in filing_results.items()
+    ]
+
+
+def is_complete_analysis(results: Dict[str, Dict[str, str]]) -> bool:
+    """Whether every answer of an analysis was generated, so the results may be cached"""
+    return not any(result['answer'].startswith(ANSWER_ERROR) for result in results.values())
+
+
+def fetch_filing_html(cik: str, year: int, split: str) -> Optional[Path]:
+    """Fetch a filing's HTML from EDGAR when it is not cached yet.
+    The fetcher and its connection pool are shared by every session, and a filing that
+    could not be fetched is not requested again for config['fetcher']['miss_ttl'] seconds"""
+    misses = get_resource(FETCH_MISSES_RESOURCE, dict)
+    filing = (cik, int(year), split)
+    miss = misses.get(filing)
+    if miss and time.monotonic() - miss[1] < config.get('fetcher', {}).get('miss_ttl', 600):
+        st.warning(f"Could not fetch the filing HTML: {miss[0]}")
+        return None
+    try:
+        fetcher = get_resource(FETCHER_RESOURCE, EdgarHTMLFetcher)
+    except ValueError as e:
+        st.warning(str(e))
+        return None
+    with st.spinner("Fetching filing HTML from EDGAR..."):
+        result = fetcher.fetch(cik, year, split)
+    if result.error:
+        misses[filing] = (result.error, time.monotonic())
+        st.warning(f"Could not fetch the filing HTML: {result.error}")
+    else:
+        misses.pop(filing, None)
+    return result.path
+
+
+ANALYZER_RESOURCE = "edgar_analyzer"
+ANALYSIS_CACHE_RESOURCE = "analysis_cache"
+FETCHER_RESOURCE = "edgar_html_fetcher"
+# (cik, year, split) -> (error, monotonic time) of filings whose HTML could not be fetched
+FETCH_MISSES_RESOURCE = "edgar_html_fetch_misses"
+
+
+def get_analyzer() -> EdgarAnalyzer:
+    """Get the analyzer shared by every session of this server process"""
+    return get_resource(ANALYZER_RESOURCE, EdgarAnalyzer)
+
+
+def run_analysis(cik: str, year: int, split: str,
+                 on_answer: Optional[Callable[[str, str], None]] = None,
+                 profile: bool = False,
+                 on_profile: Optional[Callable[[Dict], None]] = None) -> Dict[str, Dict[str, str]]:
+    """Analyze a filing, reusing the result of an earlier run with the same configuration.
+    A profiled run is always computed afresh, and on_profile receives the record of its profile"""
+    cache = get_resource(ANALYSIS_CACHE_RESOURCE, ResultCache)
+    key = (cik, int(year), split, get_config_hash())
+    if profile:
+        cache.invalidate(key)
+    return cache.get_or_compute(key, lambda: get_analyzer().analyze_filing(cik, int(year), split, on_answer, profile,
+                                                                                on_profile),
+                                cacheable=is_complete_analysis)
+
+
+def show_results_table(placeholder, results: Dict[str, Dict[str, str]]) -> None:
+    """Display analysis results in a table, replacing the placeholder's content"""
+    table_data = []
+    for question, result in results.items():
+        # Format source chunks for better readability
+        source_chunks = "\n\n".join([f"• {chunk}" for chunk in result['chunk_ids']])
+
+        table_data.append({
+            'Data Point': question,
+            'Answer': result['answer'],
+            'Source Chunks': source_chunks
+        })
+
+    # Display results in a clean table with full width
+    placeholder.dataframe(
+        table_data,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "Data Point": st.column_config.TextColumn(
+                "Data Point",
+                width="medium",
+            ),
+            "Answer": st.column_config.TextColumn(
+                "Answer",
+                width="small",
+            ),
+            "Source Chunks": st.column_config.TextColumn(
+                "Source Chunks",
+                width="large",
+            ),
+        }
+    )
+
+
+def streaming_results_table(placeholder, min_interval: float = 0.1) -> Callable[[str, str], None]:
+    """Get an on_answer callback that shows answers in the table as they stream in"""
+    answers = {}
+    lock = threading.Lock()
+    last_update = [0.0]
+
+    def on_answer(label: str, text: str) -> None:
+        with lock:
+            answers[label] = {'answer': text, 'chunk_ids': []}
+            # Redraw at most every min_interval seconds; the final table follows the analysis
+            if time.monotonic() - last_update[0] < min_interval:
+                return
+            last_update[0] = time.monotonic()
+            show_results_table(placeholder, {label: answers[label] for label in FINANCIAL_QUESTIONS if label in answers})
+    return on_answer
+
+
 def main():
     """Main Streamlit application"""
+    # Load the models while the user fills in the form; no-op after the first run
+    warm_up(ANALYZER_RESOURCE, EdgarAnalyzer)
+
     st.title("📊 EDGAR Filing Analysis")
     st.markdown("""
     Enter the CIK, year, and split to begin analysis.
@@ -145,63 +313,50 @@ def main():
     tab1, tab2 = st.tabs(["Analysis Results", "Filing Content"])
 
 
+    profile = st.sidebar.checkbox("Profile the next analysis", help="Write CPU and memory profiles of the run "
+                                  "to data/profiles")
+
+    # Run the analysis only when asked; keep its results on screen across reruns, e.g. while
+    # paging through the filing, without analyzing the filing again
+    with tab1:
+        st.subheader("Analysis Results")
+        table = st.empty()
+
     if st.button("🚀 Analyze", type="secondary"):
         with st.spinner("⚙️ Processing..."):
-            analyzer = EdgarAnalyzer()
-            results = analyzer.analyze_filing(cik, year, split)
-            
-            with tab1:
-                st.subheader("Analysis Results")
-                
-                # Create a list to store all results
-                table_data = []
-                
-                for question, result in results.items():
-                    # Format source chunks for better readability
-                    source_chunks = "\n\n".join([f"• {chunk}" for chunk in result['chunk_ids']])
-                    
-                    table_data.append({
-                        'Data Point': question,
-                        'Answer': result['answer'],
-                        'Source Chunks': source_chunks
-                    })
-                
-                # Display results in a clean table with full width
-                st.dataframe(
-                    table_data,
-                    use_container_width=True,
-                    hide_index=True,
-                    column_config={
-                        "Data Point": st.column_config.TextColumn(
-                            "Data Point",
-                            width="medium",
-                        ),
-                        "Answer": st.column_config.TextColumn(
-                            "Answer",
-                            width="small",
-                        ),
-                        "Source Chunks": st.column_config.TextColumn(
-                            "Source Chunks",
-                            width="large",
-                        ),
-                    }
-                )
-                
-                # Add a success message
-                st.success('✅ Results displayed successfully')
-            
-            with tab2:
-                st.subheader("Filing Content")
-                renderer = EdgarHTMLRenderer()
-                # Construct the file path for the HTML file
-                project_root = Path(__file__).parent.parent
-                file_path = project_root / 'data' / f'edgar_corpus_{year}' / split / f'{cik}.html'
-                
-                if not file_path.exists():
-                    st.error(f"No HTML file found for CIK {cik} in year {year}")
-                    return
-                    
-                renderer.render_filing(file_path)
+            def remember_profile(record: Dict) -> None:
+                # Kept per session: runs of other sessions may be profiled at the same time
+                st.session_state['last_profile'] = record
+
+            results = run_analysis(cik, year, split, on_answer=streaming_results_table(table), profile=profile,
+                                   on_profile=remember_profile)
+        st.session_state['analysis_results'] = ((cik, year, split), results)
+
+    written = st.session_state.get('last_profile')
+    if written:
+        st.sidebar.caption(f"Last profile ({written['cik']}_{written['year']}_{written['split']}, "
+                           f"{written['seconds']:.1f}s):\n\n{written['collapsed']}\n\n{written['allocations']}")
+
+    if 'analysis_results' in st.session_state:
+        (cik, year, split), results = st.session_state['analysis_results']
+        with tab1:
+            show_results_table(table, results)
+
+            # Add a success message
+            st.success('✅ Results displayed successfully')
+
+        with tab2:
+            st.subheader("Filing Content")
+            renderer = EdgarHTMLRenderer()
+            file_path = find_filing_html(cik, year, split)
+            if file_path is None:
+                file_path = fetch_filing_html(cik, year, split)
+
+            if file_path is None:
+                st.error(f"No HTML file found for CIK {cik} in year {year}")
+                return
+
+            renderer.render_filing(file_path)
 
 if __name__ == "__main__":
     # Create data directory
@@ -0,0 +1,395 @@
+import os
+import re
+import sys
+import time
+import argparse
+import threading
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import config
+from wasabi import msg
+
+PROJECT_ROOT = Path(__file__).parent.parent
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Set to profile every run, e.g. EDGAR_PROFILE=1; EDGAR_PROFILE_EVERY=N profiles one run in N
+PROFILE_ENV = "EDGAR_PROFILE"
+PROFILE_EVERY_ENV = "EDGAR_PROFILE_EVERY"
+
+_THREAD_NUMBER = re.compile(r"[_-]\d+$")
+# Innermost frames of threads parked until there is work for them, left out of the samples
+IDLE_FRAMES = {('threading.py', 'wait'), ('queue.py', 'get'), ('selectors.py', 'select')}
+
+_active: ContextVar[Optional["ProfileSession"]] = ContextVar("active_profile", default=None)
+# tracemalloc sees the whole process, so one run is profiled at a time
+_session_lock = threading.Lock()
+_run_counter_lock = threading.Lock()
+_run_counter = 0
+_recent: Deque[Dict] = deque(maxlen=20)
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler.
+    A background thread reads the stacks of the threads added to it with sys._current_frames()
+    at a fixed interval and counts the stacks, so time spent waiting on the network shows up
+    next to CPU work. Threads idling until there is work for them are not counted, nor are the
+    threads of other runs in the same process. Its cost is bounded by the interval and measured.
+    """
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 64):
+        """
+        Initialize the SamplingProfiler.
+
+        Args:
+            interval (float, optional): Seconds between samples. Defaults to 0.01
+            max_depth (int, optional): Innermost frames kept per stack. Defaults to 64
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sampling_seconds = 0.0
+        self._stop = threading.Event()
+        self._paused = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._threads: Counter = Counter()
+        self._threads_lock = threading.Lock()
+
+    def add_thread(self, ident: Optional[int] = None) -> None:
+        """Sample a thread, the current one by default, until it is removed as often as it was added."""
+        with self._threads_lock:
+            self._threads[ident or threading.get_ident()] += 1
+
+    def remove_thread(self, ident: Optional[int] = None) -> None:
+        with self._threads_lock:
+            ident = ident or threading.get_ident()
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        filename = code.co_filename
+        if filename.startswith(SRC_DIR):
+            filename = os.path.relpath(filename, SRC_DIR)
+        else:
+            filename = os.path.basename(filename)
+        return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+    def _sample(self) -> None:
+        with self._threads_lock:
+            threads = set(self._threads)
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id not in threads:
+                continue
+            if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+            # Pool threads differ only by a number suffix; merge them into one root
+            thread_name = _THREAD_NUMBER.sub('', names.get(thread_id, str(thread_id)))
+            stack.append(f"thread {thread_name}")
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            if self._paused.is_set():
+                continue
+            started = time.perf_counter()
+            self._sample()
+            self.sampling_seconds += time.perf_counter() - started
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        """Skip samples while the profiler's owner does its own bookkeeping."""
+        self._paused.set()
+        try:
+            yield
+        finally:
+            self._paused.clear()
+
+    def collapsed(self) -> str:
+        """Stacks in collapsed format ('root;...;leaf count'), as read by flamegraph.pl and speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+@dataclass
+class StageRecord:
+    name: str
+    seconds: float
+    traced_bytes: int
+    peak_bytes: int
+    top_allocations: List[tracemalloc.StatisticDiff] = field(default_factory=list)
+
+
+class ProfileSession:
+    """
+    CPU and memory profile of one analysis run, tagged with the filing.
+    Runs the sampling profiler for the whole run and takes a tracemalloc snapshot at each
+    stage boundary. On exit it writes '{cik}_{year}_{split}_{time}.collapsed' (stacks for a
+    flame graph) and '{cik}_{year}_{split}_{time}_allocations.txt' (stage times and the
+    allocations each stage left behind).
+    """
+
+    def __init__(self, cik: str, year: int, split: str, output_dir: Optional[Path] = None,
+                 interval_ms: Optional[float] = None, trace_memory: Optional[bool] = None,
+                 traceback_frames: Optional[int] = None, top: Optional[int] = None):
+        """
+        Initialize the ProfileSession.
+
+        Args:
+            cik (str): Company CIK number
+            year (int): Filing year
+            split (str): Dataset split
+            output_dir (Optional[Path]): Report directory. Defaults to config['profiling']['output_dir']
+            interval_ms (Optional[float]): Sampling interval. Defaults to config['profiling']['interval_ms']
+            trace_memory (Optional[bool]): Take tracemalloc snapshots. Defaults to config['profiling']['trace_memory']
+            traceback_frames (Optional[int]): Frames stored per allocation. Defaults to config['profiling']['traceback_frames']
+            top (Optional[int]): Allocation sites listed per stage. Defaults to config['profiling']['top_allocations']
+        """
+        settings = config.get('profiling', {})
+        self.tags = {'cik': cik, 'year': year, 'split': split}
+        output_dir = Path(output_dir or settings.get('output_dir', 'data/profiles'))
+        self.output_dir = output_dir if output_dir.is_absolute() else PROJECT_ROOT / output_dir
+        self.profiler = SamplingProfiler((interval_ms or settings.get('interval_ms', 10)) / 1000)
+        self.trace_memory = settings.get('trace_memory', True) if trace_memory is None else trace_memory
+        self.traceback_frames = traceback_frames or settings.get('traceback_frames', 1)
+        self.top = top or settings.get('top_allocations', 20)
+        self.stages: List[StageRecord] = []
+        self.paths: Dict[str, Path] = {}
+        # Filing tags, wall time and report paths, once the profile is written
+        self.record: Optional[Dict] = None
+        self._started_tracing = False
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self.snapshot_seconds = 0.0
+        self._token = None
+
+    def _top(self, statistics: List) -> List:
+        """The largest entries, leaving out sites under 1 KB and the profiler's own allocations."""
+        own = (__file__, tracemalloc.__file__)
+        return [stat for stat in statistics
+                if abs(getattr(stat, 'size_diff', stat.size)) >= 1024
+                and stat.traceback[0].filename not in own][:self.top]
+
+    def __enter__(self) -> "ProfileSession":
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.traceback_frames)
+                self._started_tracing = True
+            self._snapshot = tracemalloc.take_snapshot()
+        self._token = _active.set(self)
+        self.started = time.time()
+        self._perf_started = time.perf_counter()
+        self.profiler.add_thread()
+        self.profiler.start()
+        return self
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a stage and record the allocations it leaves behind."""
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self.profiler.add_thread()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.profiler.remove_thread()
+            record = StageRecord(name, seconds, 0, 0)
+            if self.trace_memory:
+                record.traced_bytes, record.peak_bytes = tracemalloc.get_traced_memory()
+                snapshot_started = time.perf_counter()
+                with self.profiler.paused():
+                    snapshot = tracemalloc.take_snapshot()
+                    record.top_allocations = self._top(snapshot.compare_to(self._snapshot, 'lineno'))
+                self._snapshot = snapshot
+                self.snapshot_seconds += time.perf_counter() - snapshot_started
+            self.stages.append(record)
+
+    def __exit__(self, *exc) -> None:
+        self.profiler.stop()
+        self.profiler.remove_thread()
+        self.wall_seconds = time.perf_counter() - self._perf_started
+        _active.reset(self._token)
+        final_top = self._top(self._snapshot.statistics('lineno')) if self.trace_memory else []
+        if self._started_tracing:
+            tracemalloc.stop()
+        try:
+            self._write(final_top)
+        except OSError as e:
+            msg.warn(f"Could not write the profile of {self.name}: {str(e)}")
+
+    @property
+    def name(self) -> str:
+        return f"{self.tags['cik']}_{self.tags['year']}_{self.tags['split']}"
+
+    def _write(self, final_top: List[tracemalloc.Statistic]) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))
+        collapsed_path = self.output_dir / f"{self.name}_{stamp}.collapsed"
+        report_path = self.output_dir / f"{self.name}_{stamp}_allocations.txt"
+        collapsed_path.write_text(self.profiler.collapsed(), encoding='utf-8')
+        report_path.write_text(self.report(final_top), encoding='utf-8')
+        self.paths = {'collapsed': collapsed_path, 'allocations': report_path}
+        self.record = {**self.tags, 'seconds': self.wall_seconds, **self.paths}
+        with _run_counter_lock:
+            _recent.append(self.record)
+        msg.info(f"Profile of {self.name} ({self.wall_seconds:.1f}s) written to {collapsed_path} and {report_path}")
+
+    def report(self, final_top: Optional[List[tracemalloc.Statistic]] = None) -> str:
+        """Stage times, memory and top allocation sites as text."""
+        mb = 1 << 20
+        overhead = self.profiler.sampling_seconds / self.wall_seconds if self.wall_seconds else 0.0
+        lines = [
+            f"cik={self.tags['cik']} year={self.tags['year']} split={self.tags['split']}",
+            f"started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started))}, "
+            f"wall {self.wall_seconds:.2f}s, {self.profiler.samples} samples every "
+            f"{self.profiler.interval * 1000:.0f} ms (sampler overhead {overhead:.1%}, "
+            f"memory snapshots {self.snapshot_seconds:.2f}s, not sampled)",
+            "",
+            f"{'stage':<20} {'seconds':>8} {'traced MB':>10} {'peak MB':>8}",
+        ]
+        for stage in self.stages:
+            lines.append(f"{stage.name:<20} {stage.seconds:>8.2f} {stage.traced_bytes / mb:>10.1f} "
+                         f"{stage.peak_bytes / mb:>8.1f}")
+        if not self.trace_memory:
+            return "\n".join(lines) + "\n"
+        for stage in self.stages:
+            lines += ["", f"Allocations left by stage '{stage.name}' (growth, blocks, site)"]
+            lines += [f"  {diff.size_diff / 1024:>+11.1f} KB {diff.count_diff:>+9} {diff.traceback}"
+                      for diff in stage.top_allocations]
+        lines += ["", "Largest live allocations at the end of the run (size, blocks, site)"]
+        lines += [f"  {stat.size / 1024:>11.1f} KB {stat.count:>9} {stat.traceback}" for stat in final_top or []]
+        return "\n".join(lines) + "\n"
+
+
+def _explicitly_requested(requested: bool) -> bool:
+    return requested or os.getenv(PROFILE_ENV, '').lower() in ('1', 'true', 'yes')
+
+
+def should_profile(requested: bool = False) -> bool:
+    """
+    Decide whether a run is profiled: when requested, when EDGAR_PROFILE is set, or for one
+    run in every N (EDGAR_PROFILE_EVERY or config['profiling']['sample_every']; 0 never).
+
+    Args:
+        requested (bool, optional): Profiling was asked for this run, e.g. from the sidebar. Defaults to False
+
+    Returns:
+        bool: Whether to profile the run
+    """
+    global _run_counter
+    if _explicitly_requested(requested):
+        return True
+    every = int(os.getenv(PROFILE_EVERY_ENV) or config.get('profiling', {}).get('sample_every', 0) or 0)
+    if every <= 0:
+        return False
+    with _run_counter_lock:
+        _run_counter += 1
+        return _run_counter % every == 0
+
+
+@contextmanager
+def profile_run(cik: str, year: int, split: str, requested: bool = False) -> Iterator[Optional[ProfileSession]]:
+    """
+    Profile a run when should_profile() says so and no other run is being profiled.
+    Runs picked by sample_every only trace memory with config['profiling']['trace_sampled_memory'],
+    as tracemalloc slows down every allocation of the run.
+
+    Args:
+        cik (str): Company CIK number
+        year (int): Filing year
+        split (str): Dataset split
+        requested (bool, optional): Profiling was asked for this run. Defaults to False
+
+    Yields:
+        Optional[ProfileSession]: The session, or None if the run is not profiled
+    """
+    if not should_profile(requested):
+        yield None
+        return
+    if not _session_lock.acquire(blocking=False):
+        msg.warn(f"Not profiling {cik}_{year}_{split}: another run is being profiled")
+        yield None
+        return
+    trace_memory = None if _explicitly_requested(requested) else \
+        config.get('profiling', {}).get('trace_sampled_memory', False)
+    try:
+        with ProfileSession(cik, year, split, trace_memory=trace_memory) as session:
+            yield session
+    finally:
+        _session_lock.release()
+
+
+def stage(name: str):
+    """Mark a stage of the run being profiled in this context; a no-op when none is."""
+    session = _active.get()
+    return session.stage(name) if session else nullcontext()
+
+
+def in_run(fn: Callable) -> Callable:
+    """
+    Carry the run being profiled in the calling context over to fn, e.g. for a pool thread
+    working for the run: its stack is sampled while it runs fn. Returns fn itself when no
+    run is being profiled.
+    """
+    session = _active.get()
+    if session is None:
+        return fn
+
+    def run(*args, **kwargs):
+        token = _active.set(session)
+        session.profiler.add_thread()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            session.profiler.remove_thread()
+            _active.reset(token)
+    return run
+
+
+def recent_profiles() -> List[Dict]:
+    """Profiles written by this process, most recent last."""
+    with _run_counter_lock:
+        return list(_recent)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze filings with CPU and memory profiling")
+    parser.add_argument('filings', nargs='+', help="Filings as cik:year:split, e.g. 320193:2020:test")
+    parser.add_argument('--every', type=int, default=1, help="Profile one filing in N (default: all)")
+    args = parser.parse_args()
+
+    from main import EdgarAnalyzer
+
+    analyzer = EdgarAnalyzer()
+    for i, filing in enumerate(args.filings):
+        cik, year, split = filing.split(':')
+        analyzer.analyze_filing(cik, int(year), split, profile=i % args.every == 0)
+    for profile in recent_profiles():
+        print(f"{profile['cik']}_{profile['year']}_{profile['split']}: {profile['seconds']:.1f}s  "
+              f"{profile['collapsed']}  {profile['allocations']}")
@@ -0,0 +1,8 @@
+# Standard data points extracted from every filing, keyed by the label shown in the results table
+FINANCIAL_QUESTIONS = {
+    'Total stockholders': "How many record holders of the common stock were reported for the latest year?",
+    'Employee headcount': "What is the employee headcount for the latest year?",
+    'Net sales': "What was the net sales for the latest year?",
+    'Total cash and cash equivalents': "What was the total cash and cash equivalents for the latest year?",
+    'Quarterly cash dividend': "What is the quarterly cash dividend declared for the latest year?",
+}
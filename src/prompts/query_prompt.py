@@ -1,11 +1,13 @@
 import os
-import yaml
+from functools import lru_cache
 from typing import List, Dict
 from .prompt_template import BASE_TEMPLATE
 
+@lru_cache(maxsize=None)
 def load_examples() -> List[Dict]:
     """
     Load financial examples from the YAML configuration file.
+    The file is parsed once; later calls return the same list.
     
     Returns:
         List[Dict]: List of example dictionaries containing:
@@ -17,6 +19,8 @@ def load_examples() -> List[Dict]:
         FileNotFoundError: If the YAML file is not found
         yaml.YAMLError: If there's an error parsing the YAML file
     """
+    import yaml
+
     current_dir = os.path.dirname(os.path.abspath(__file__))
     yaml_path = os.path.join(current_dir, 'financial_examples.yaml')
     
@@ -52,12 +56,24 @@ Answer: {example['expected_answer']}
 """
     return formatted_examples
 
-# Load examples from YAML
-EXAMPLES = load_examples()
+@lru_cache(maxsize=None)
+def get_query_template() -> str:
+    """
+    Build the query prompt template, loading and formatting the examples on first use.
+
+    Returns:
+        str: The base template with the formatted examples filled in
+    """
+    return BASE_TEMPLATE.replace("{examples}", format_examples(load_examples()))
 
-# Format the examples once
-FORMATTED_EXAMPLES = format_examples(EXAMPLES)
 
-# Create the final template with examples
-QUERY_TEMPLATE = BASE_TEMPLATE.replace("{examples}", FORMATTED_EXAMPLES)
+def __getattr__(name: str):
+    # Keep the module-level names importable without parsing the YAML at import time
+    if name == "EXAMPLES":
+        return load_examples()
+    if name == "FORMATTED_EXAMPLES":
+        return format_examples(load_examples())
+    if name == "QUERY_TEMPLATE":
+        return get_query_template()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
@@ -1,61 +1,155 @@
 import os
+import re
 import streamlit as st
-from langchain_groq import ChatGroq
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
-from prompts.query_prompt import QUERY_TEMPLATE
-from typing import Tuple, List
+from prompts.query_prompt import get_query_template
+from config import config
+from typing import Callable, Optional, Tuple, List
+
+# A figure with its unit, e.g. '$190.8 million', '21.5%', '12,000 employees', '$0.25 per share'
+NUMERIC_ANSWER = re.compile(
+    r"\d[\d,]*(?:\.\d+)?\s*(?:%|percent\b|(?:thousand|million|billion|trillion)s?\b|per share\b|"
+    r"employees\b|(?:stock|share)?holders\b|record holders\b)",
+    re.IGNORECASE,
+)
+# Start of the answer returned when generation fails; such answers must not be cached
+ANSWER_ERROR = "Error generating answer:"
+# End of the sentence or line holding the answer. A period followed by a digit is a decimal
+# point, and one followed by a letter or closing a single-letter token is part of an
+# abbreviation such as 'U.S.' or 'J. Smith'
+ANSWER_END = re.compile(r"[;!?]|(?<!\b[A-Za-z])\.(?![\dA-Za-z])|\n")
+
+
+def complete_answer(text: str, stop: List[str]) -> Optional[str]:
+    """
+    Check whether a partially generated answer is already complete.
+
+    Args:
+        text (str): Text generated so far
+        stop (List[str]): Sequences the answer ends before, e.g. the start of another example
+
+    Returns:
+        Optional[str]: The finished answer, or None if generation should continue
+    """
+    positions = [text.find(sequence) for sequence in stop if sequence in text]
+    if positions:
+        return text[:min(positions)].strip()
+    match = NUMERIC_ANSWER.search(text)
+    if match:
+        end = ANSWER_END.search(text, match.end())
+        if end:
+            return text[:end.end()].strip()
+    return None
+
 
 class QueryAnswerer:
     def __init__(self):
         """
         Initialize the QueryAnswerer with Groq API key and LLM chain.
         """
-        # Get API key from environment variable
+        from langchain_groq import ChatGroq
+        from langchain.chains import LLMChain
+        from langchain.prompts import PromptTemplate
+
+        settings = config.get('llm', {})
+        self.max_tokens = settings.get('max_tokens', 64)
+        self.stop = settings.get('stop', [])
+        self.streaming = settings.get('stream', True)
+
+        # Get API key from environment variable; a local endpoint set with GROQ_API_BASE needs none
         st.info("Initializing LLM")
-        groq_api_key = os.getenv('GROQ_API_KEY')
+        groq_api_key = os.getenv('GROQ_API_KEY') or ("local" if os.getenv('GROQ_API_BASE') else None)
         if not groq_api_key:
             raise ValueError("GROQ_API_KEY environment variable is not set")
-        
+
         # Initialize the Groq LLM
         self.llm = ChatGroq(
             groq_api_key=groq_api_key,
-            model_name="gemma2-9b-it",
+            model_name=settings.get('model', "gemma2-9b-it"),
             temperature=0,
-            max_tokens=None
+            max_tokens=self.max_tokens
         )
-        
+
         # Create the prompt template
         self.prompt = PromptTemplate(
             input_variables=["query", "context"],
-            template=QUERY_TEMPLATE
+            template=get_query_template()
         )
-        
+
         # Create the chain with the prompt template
         self.chain = LLMChain(
             llm=self.llm,
             prompt=self.prompt
         )
-    
-    def answer_query(self, query: str, context: str, chunk_ids: List[str]) -> Tuple[str, List[str]]:
+
+    def answer_query(self, query: str, context: str, chunk_ids: List[str],
+                     on_token: Optional[Callable[[str], None]] = None,
+                     max_tokens: Optional[int] = None) -> Tuple[str, List[str]]:
         """
         Generate an answer to the query using the provided context.
-        
+
         Args:
             query (str): The question to answer
             context (str): The relevant context from retrieved documents
             chunk_ids (List[str]): List of chunk IDs used in the context
-            
+            on_token (Optional[Callable[[str], None]]): Called with the answer so far as tokens stream in
+            max_tokens (Optional[int]): Token budget of this answer. Defaults to config['llm']['max_tokens']
+
         Returns:
             Tuple[str, List[str]]: The generated answer and list of chunk IDs used
         """
         try:
-            # Run the chain to generate the answer
-            response = self.chain.run(
-                query=query,
-                context=context
-            )
+            if self.streaming:
+                response = self.stream_answer(query, context, on_token, max_tokens)
+            else:
+                # Run the chain to generate the answer
+                response = self.chain.run(
+                    query=query,
+                    context=context
+                )
             st.success(" ✅ Generated answer !!")
             return response.strip(), chunk_ids
         except Exception as e:
-            return f"Error generating answer: {str(e)}", []
+            return f"{ANSWER_ERROR} {str(e)}", []
+
+    def stream_answer(self, query: str, context: str, on_token: Optional[Callable[[str], None]] = None,
+                      max_tokens: Optional[int] = None) -> str:
+        """
+        Stream an answer, stopping as soon as it is complete.
+        Generation ends at a stop sequence, once a figure with its unit and the sentence
+        holding it are complete, or when the token budget is spent. Closing the stream early
+        stops the model from generating the rest.
+
+        Args:
+            query (str): The question to answer
+            context (str): The relevant context from retrieved documents
+            on_token (Optional[Callable[[str], None]]): Called with the answer so far after each token
+            max_tokens (Optional[int]): Token budget. Defaults to config['llm']['max_tokens']
+
+        Returns:
+            str: The answer
+        """
+        max_tokens = max_tokens or self.max_tokens
+        prompt = self.prompt.format(query=query, context=context)
+        # Stream with the Groq client ChatGroq wraps: closing it also closes the HTTP response
+        stream = self.llm.client.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=self.llm.model_name,
+            temperature=0,
+            max_tokens=max_tokens,
+            stop=self.stop or None,
+            stream=True,
+        )
+        text, tokens = "", 0
+        with stream:
+            for chunk in stream:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if not token:
+                    continue
+                text += token
+                tokens += 1
+                answer = complete_answer(text, self.stop)
+                if on_token:
+                    on_token(answer if answer is not None else text)
+                if answer is not None or tokens >= max_tokens:
+                    return answer if answer is not None else text.strip()
+        return complete_answer(text, self.stop) or text.strip()
@@ -0,0 +1,197 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wasabi import msg
+
+FIGURE = re.compile(r"\$?\d[\d,]*(?:\.\d+)?\s*(?:%|(?:thousand|million|billion)\b|employees\b)", re.IGNORECASE)
+# Appended to every answer, like a model that keeps explaining after giving the figure
+RAMBLE = (" This figure is reported in the company's annual filing and reflects the results of its "
+          "operations for the fiscal year. Management discusses the drivers of the change in the "
+          "Management's Discussion and Analysis section, including pricing, volume and currency "
+          "effects, and notes that future results may differ materially from past performance due "
+          "to the risk factors described elsewhere in the report.\n\nQuestion: What else is disclosed?")
+
+
+def scripted_answer(prompt: str, answers: Dict[str, str]) -> str:
+    """
+    Answer from the prompt: a scripted answer for the question, else the first figure in the context.
+
+    Args:
+        prompt (str): Prompt of the completion request
+        answers (Dict[str, str]): Answers keyed by a substring of the question
+
+    Returns:
+        str: Answer followed by rambling text
+    """
+    question = prompt.rsplit("Question:", 1)[-1]
+    for key, answer in answers.items():
+        if key.lower() in question.lower():
+            return answer + RAMBLE
+    context = prompt.rsplit("Context:", 1)[-1]
+    figure = FIGURE.search(context)
+    answer = figure.group(0) + "." if figure else "I cannot find this information in the provided context."
+    return answer + RAMBLE
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into word-sized tokens that concatenate back to it."""
+    return re.findall(r"\s*\S+|\s+", text)
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """Serve OpenAI-compatible chat completions, streamed as server-sent events or whole."""
+
+    server: "FakeLLMServer"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: Dict) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if self.path not in ('/openai/v1/chat/completions', '/v1/chat/completions'):
+            return self._send(404, {'error': {'message': f"Unknown endpoint {self.path}"}})
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        prompt = "\n".join(str(message.get('content', '')) for message in body.get('messages', []))
+        tokens = tokenize(scripted_answer(prompt, self.server.answers))
+
+        max_tokens = body.get('max_tokens') or len(tokens)
+        finish_reason = 'length' if len(tokens) > max_tokens else 'stop'
+        text = "".join(tokens[:max_tokens])
+        stop = body.get('stop') or []
+        stop = [stop] if isinstance(stop, str) else stop
+        positions = [text.find(sequence) for sequence in stop if sequence in text]
+        if positions:
+            text, finish_reason = text[:min(positions)], 'stop'
+        tokens = tokenize(text)
+
+        model = body.get('model', 'fake')
+        time.sleep(self.server.first_token_ms / 1000)
+        if not body.get('stream'):
+            time.sleep(len(tokens) * self.server.token_ms / 1000)
+            self.server.record(len(tokens), cancelled=False)
+            return self._send(200, {
+                'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                             'finish_reason': finish_reason}],
+                'usage': {'prompt_tokens': len(tokenize(prompt)), 'completion_tokens': len(tokens),
+                          'total_tokens': len(tokenize(prompt)) + len(tokens)},
+            })
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        def event(delta: Dict, finish: Optional[str] = None) -> bytes:
+            chunk = {'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish}]}
+            return f"data: {json.dumps(chunk)}\n\n".encode('utf-8')
+
+        sent = 0
+        try:
+            self.wfile.write(event({'role': 'assistant', 'content': ''}))
+            for token in tokens:
+                self.wfile.write(event({'content': token}))
+                self.wfile.flush()
+                sent += 1
+                time.sleep(self.server.token_ms / 1000)
+            self.wfile.write(event({}, finish_reason))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream early
+            self.server.record(sent, cancelled=True)
+            return
+        self.server.record(sent, cancelled=False)
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """
+    Local stand-in for an OpenAI-compatible LLM endpoint such as Groq, with a fixed time to
+    first token and per-token delay. Point the app at it with GROQ_API_BASE=http://localhost:<port>.
+    Counts the tokens it streamed and the streams the client closed before the end.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str = 'localhost', port: int = 5082, first_token_ms: float = 200.0,
+                 token_ms: float = 20.0, answers: Optional[Dict[str, str]] = None, verbose: bool = False):
+        super().__init__((host, port), FakeLLMHandler)
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.answers = answers or {}
+        self.verbose = verbose
+        self.completions = 0
+        self.cancelled = 0
+        self.tokens_sent = 0
+        self._stats_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, tokens: int, cancelled: bool) -> None:
+        with self._stats_lock:
+            self.completions += 1
+            self.cancelled += int(cancelled)
+            self.tokens_sent += tokens
+
+    def summary(self) -> str:
+        with self._stats_lock:
+            return (f"{self.completions} completion(s), {self.cancelled} closed early by the client, "
+                    f"{self.tokens_sent} token(s) streamed")
+
+
+def start_fake_llm(port: int = 0, **kwargs) -> FakeLLMServer:
+    """
+    Start a fake LLM server in a background thread, e.g. for tests of streamed answers.
+
+    Args:
+        port (int, optional): Port to listen on; 0 picks a free one. Defaults to 0
+
+    Returns:
+        FakeLLMServer: The running server; call shutdown() to stop it
+    """
+    server = FakeLLMServer(port=port, **kwargs)
+    threading.Thread(target=server.serve_forever, name='fake-llm', daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake OpenAI-compatible streaming LLM endpoint")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5082)
+    parser.add_argument('--first-token-ms', type=float, default=200.0)
+    parser.add_argument('--token-ms', type=float, default=20.0)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    fake = FakeLLMServer(args.host, args.port, args.first_token_ms, args.token_ms, verbose=args.verbose)
+    msg.info(f"Fake LLM listening on {fake.url}")
+    msg.info(f"Use it with: GROQ_API_BASE={fake.url}")
+    try:
+        fake.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.server_close()
+        print(fake.summary())
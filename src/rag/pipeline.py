@@ -0,0 +1,157 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import profiling
+from config import config
+from wasabi import msg
+
+# Resource classes a question's stages are limited by
+STAGES = ('cpu', 'vector', 'llm')
+
+
+@dataclass
+class PipelineReport:
+    """Wall-clock time of a run against the busy time of each resource class"""
+    questions: int = 0
+    wall_seconds: float = 0.0
+    stage_seconds: Dict[str, float] = field(default_factory=lambda: {stage: 0.0 for stage in STAGES})
+
+    @property
+    def sequential_seconds(self) -> float:
+        """Time the same work takes when every stage of every question runs one after another"""
+        return sum(self.stage_seconds.values())
+
+    def summary(self) -> str:
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.stage_seconds.items())
+        return (f"{self.questions} question(s) in {self.wall_seconds:.2f}s "
+                f"(sequential {self.sequential_seconds:.2f}s; {stages})")
+
+
+def _with_script_context(fn: Callable) -> Callable:
+    """
+    Run fn with the calling Streamlit script's context, so st.* calls made from pool
+    threads reach the page instead of being dropped with a missing-context warning.
+    """
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+
+    def run(*args):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    return run
+
+
+class QuestionPipeline:
+    """
+    Answer a filing's questions with their stages overlapped.
+    Each question runs query embedding and reranking (CPU model work), the vector query
+    and chunk lookup (vector store I/O) and answer generation (LLM I/O) in turn, but while
+    one question waits on the LLM the next ones are retrieved and reranked. Every resource
+    class has its own concurrency limit, so the CPU models are not oversubscribed while
+    several LLM calls are in flight.
+    """
+
+    def __init__(self, retriever, answerer, cpu_concurrency: Optional[int] = None,
+                 vector_concurrency: Optional[int] = None, llm_concurrency: Optional[int] = None):
+        """
+        Initialize the QuestionPipeline.
+
+        Args:
+            retriever (PineconeRetriever): Embeds, queries and reranks
+            answerer (QueryAnswerer): Generates answers
+            cpu_concurrency (Optional[int]): Concurrent embedding and reranking calls.
+                Defaults to config['analysis']['cpu_concurrency']
+            vector_concurrency (Optional[int]): Concurrent vector queries and chunk lookups.
+                Defaults to config['analysis']['vector_concurrency']
+            llm_concurrency (Optional[int]): Concurrent LLM calls. Defaults to config['analysis']['llm_concurrency']
+        """
+        settings = config.get('analysis', {})
+        self.retriever = retriever
+        self.answerer = answerer
+        self.limits = {
+            'cpu': cpu_concurrency or settings.get('cpu_concurrency', 1),
+            'vector': vector_concurrency or settings.get('vector_concurrency', 4),
+            'llm': llm_concurrency or settings.get('llm_concurrency', 4),
+        }
+
+    def _retrieve(self, vector: List[float], cik: str, year: int, split: str) -> Tuple[List[str], List[str]]:
+        """Vector query and chunk text lookup for an embedded question."""
+        response = self.retriever.query_index_by_vector(vector, cik, year, split)
+        return self.retriever.get_passages(response['matches'])
+
+    def _rerank(self, question: str, passages: List[str], chunk_ids: List[str]) -> Tuple[str, List[str]]:
+        scores = self.retriever.generate_cross_encoder_score(question, passages)
+        _, context, used_chunk_ids = self.retriever.context_assembler.assemble(passages, chunk_ids, scores)
+        return context, used_chunk_ids
+
+    async def _answer_question(self, run_stage: Callable, question: str, cik: str, year: int, split: str,
+                               on_token: Optional[Callable[[str], None]]) -> Optional[Tuple[str, List[str]]]:
+        try:
+            # Standard questions are precomputed, so embedding usually costs a cache lookup
+            vector = await run_stage('cpu', self.retriever.get_query_vector, question)
+            passages, chunk_ids = await run_stage('vector', self._retrieve, vector, cik, year, split)
+            if not passages:
+                return None
+            context, used_chunk_ids = await run_stage('cpu', self._rerank, question, passages, chunk_ids)
+        except Exception as e:
+            msg.error(f"Error retrieving documents for '{question}': {str(e)}")
+            return None
+        if not context:
+            return None
+        return await run_stage('llm', self.answerer.answer_query, question, context, used_chunk_ids, on_token)
+
+    async def _run(self, questions: List[str], cik: str, year: int, split: str, report: PipelineReport,
+                   on_token: Optional[Callable[[int, str], None]]) -> List[Optional[Tuple[str, List[str]]]]:
+        loop = asyncio.get_running_loop()
+        semaphores = {stage: asyncio.Semaphore(limit) for stage, limit in self.limits.items()}
+
+        with ThreadPoolExecutor(max_workers=sum(self.limits.values()), thread_name_prefix='question-stage') as pool:
+            async def run_stage(stage: str, fn: Callable, *args):
+                async with semaphores[stage]:
+                    started = time.perf_counter()
+                    try:
+                        return await loop.run_in_executor(pool, _with_script_context(profiling.in_run(fn)), *args)
+                    finally:
+                        report.stage_seconds[stage] += time.perf_counter() - started
+
+            # gather keeps question order whatever order the questions finish in
+            return await asyncio.gather(*(
+                self._answer_question(run_stage, question, cik, year, split,
+                                      partial(on_token, i) if on_token else None)
+                for i, question in enumerate(questions)
+            ))
+
+    def run(self, questions: List[str], cik: str, year: int, split: str,
+            on_token: Optional[Callable[[int, str], None]] = None
+            ) -> Tuple[List[Optional[Tuple[str, List[str]]]], PipelineReport]:
+        """
+        Answer questions about one filing.
+        The pipeline is shared by concurrent analyses, so each run returns its own report.
+
+        Args:
+            questions (List[str]): Questions to answer
+            cik (str): Company CIK number
+            year (int): Filing year
+            split (str): Dataset split
+            on_token (Optional[Callable[[int, str], None]]): Called with a question's index and its
+                answer so far while the answer streams in
+
+        Returns:
+            Tuple[List[Optional[Tuple[str, List[str]]]], PipelineReport]: Per question in input order,
+                the answer and the chunk IDs it used, or None if no context was retrieved; and the
+                stage timings of this run
+        """
+        report = PipelineReport(questions=len(questions))
+        started = time.perf_counter()
+        results = asyncio.run(self._run(questions, cik, year, split, report, on_token))
+        report.wall_seconds = time.perf_counter() - started
+        return results, report
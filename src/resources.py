@@ -0,0 +1,254 @@
+import time
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from wasabi import msg
+
+# Streamlit re-executes the app script on every interaction, but imported modules stay
+# loaded, so state kept here lives for the whole server process and is shared by sessions.
+_registry_lock = threading.Lock()
+_resources: Dict[str, Any] = {}
+_resource_locks: Dict[str, threading.Lock] = {}
+_warm_threads: Dict[str, threading.Thread] = {}
+
+
+def get_resource(name: str, factory: Callable[[], Any]) -> Any:
+    """
+    Get a process-lifetime singleton, building it on first use.
+
+    Concurrent callers asking for a resource that is still being built wait for that
+    build instead of starting their own.
+
+    Args:
+        name (str): Name the resource is registered under
+        factory (Callable[[], Any]): Builds the resource when it does not exist yet
+
+    Returns:
+        Any: The shared resource
+    """
+    if name in _resources:
+        return _resources[name]
+    with _registry_lock:
+        lock = _resource_locks.setdefault(name, threading.Lock())
+    with lock:
+        if name not in _resources:
+            _resources[name] = factory()
+    return _resources[name]
+
+
+def warm_up(name: str, factory: Callable[[], Any]) -> threading.Thread:
+    """
+    Build a resource in a background thread, once per process.
+
+    A failed warm-up is logged and the resource is built again on first use.
+
+    Args:
+        name (str): Name the resource is registered under
+        factory (Callable[[], Any]): Builds the resource
+
+    Returns:
+        threading.Thread: The warm-up thread
+    """
+    def _warm():
+        try:
+            get_resource(name, factory)
+            msg.good(f"Warmed up resource: {name}")
+        except Exception as e:
+            msg.warn(f"Warm-up of {name} failed, it will be built on first use: {str(e)}")
+
+    with _registry_lock:
+        thread = _warm_threads.get(name)
+        if thread is None:
+            thread = threading.Thread(target=_warm, name=f"warm-{name}", daemon=True)
+            _warm_threads[name] = thread
+            thread.start()
+    return thread
+
+
+class _Abandoned(Exception):
+    """The computation a caller was waiting on was interrupted before it produced a result"""
+
+
+class ResultCache:
+    """
+    Thread-safe LRU memo of computed results.
+    Concurrent callers with the same key share a single computation.
+    """
+
+    def __init__(self, max_entries: int = 128):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries (int, optional): Number of results to keep. Defaults to 128
+        """
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._results: OrderedDict = OrderedDict()
+        self._pending: Dict[Hashable, Future] = {}
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any],
+                       cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Return the cached result for a key, computing it if needed.
+        A computation that raises an exception fails every caller waiting on it. One
+        interrupted by a BaseException such as KeyboardInterrupt or SystemExit is abandoned
+        instead: a waiting caller takes it over and computes the result itself.
+
+        Args:
+            key (Hashable): Cache key
+            compute (Callable[[], Any]): Produces the result on a cache miss
+            cacheable (Optional[Callable[[Any], bool]]): Tells whether a result may be kept.
+                Rejected results are still returned to every waiting caller. Defaults to keeping all
+
+        Returns:
+            Any: The cached or freshly computed result
+        """
+        while True:
+            with self._lock:
+                if key in self._results:
+                    self._results.move_to_end(key)
+                    return self._results[key]
+                future = self._pending.get(key)
+                owner = future is None
+                if owner:
+                    future = Future()
+                    self._pending[key] = future
+
+            if owner:
+                break
+            try:
+                return future.result()
+            except _Abandoned:
+                continue
+
+        try:
+            result = compute()
+        except Exception as e:
+            with self._lock:
+                self._pending.pop(key, None)
+            future.set_exception(e)
+            raise
+        except BaseException:
+            with self._lock:
+                self._pending.pop(key, None)
+            future.set_exception(_Abandoned())
+            raise
+
+        with self._lock:
+            if cacheable is None or cacheable(result):
+                self._results[key] = result
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+            self._pending.pop(key, None)
+        future.set_result(result)
+        return result
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Drop a cached result.
+
+        Args:
+            key (Hashable): Cache key
+        """
+        with self._lock:
+            self._results.pop(key, None)
+
+
+class MicroBatcher:
+    """
+    Merge calls made by concurrent threads into one batched call.
+    Each caller passes a list of items; calls arriving within max_wait_ms of the first,
+    until max_items are gathered, are concatenated, run through the batch function once,
+    and every caller gets back the slice of results for its own items.
+    """
+
+    def __init__(self, fn: Callable[[list], Any], max_items: int = 256, max_wait_ms: float = 5.0,
+                 name: str = "batcher"):
+        """
+        Initialize the batcher.
+
+        Args:
+            fn (Callable[[list], Any]): Batch function returning one result per item, in order
+            max_items (int, optional): Items per merged call. Defaults to 256
+            max_wait_ms (float, optional): How long the first call waits for others. Defaults to 5.0
+            name (str, optional): Name of the worker thread. Defaults to "batcher"
+        """
+        self.fn = fn
+        self.max_items = max_items
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self.calls = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.items = 0
+        self._queue: "queue.Queue[Tuple[list, Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def __call__(self, items: list) -> Any:
+        """
+        Run items through the batch function, merged with concurrent calls.
+
+        Args:
+            items (list): Items of this call
+
+        Returns:
+            Any: Results for these items
+        """
+        items = list(items)
+        if not items:
+            return self.fn(items)
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+        future = Future()
+        self._queue.put((items, future))
+        return future.result()
+
+    def _run(self) -> None:
+        while True:
+            calls = [self._queue.get()]
+            total = len(calls[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while total < self.max_items:
+                try:
+                    call = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                calls.append(call)
+                total += len(call[0])
+
+            try:
+                results = self.fn([item for items, _ in calls for item in items])
+            except BaseException as e:
+                # Fail this batch's callers but keep the worker alive for later calls;
+                # a worker that died here would leave every later caller waiting forever
+                for _, future in calls:
+                    future.set_exception(e)
+                with self._lock:
+                    self.failed_batches += 1
+                continue
+            offset = 0
+            for items, future in calls:
+                future.set_result(results[offset:offset + len(items)])
+                offset += len(items)
+            with self._lock:
+                self.calls += len(calls)
+                self.batches += 1
+                self.items += total
+
+    def stats(self) -> Dict[str, float]:
+        """Counts of calls, merged batches, failed batches and items, and the mean batch size"""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'batches': self.batches,
+                'failed_batches': self.failed_batches,
+                'items': self.items,
+                'mean_batch_items': self.items / self.batches if self.batches else 0.0,
+            }
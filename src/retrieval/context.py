@@ -0,0 +1,167 @@
+import os
+import sys
+import hashlib
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+from dedup.minhash import MinHasher, estimate_jaccard, normalize_text
+
+
+@dataclass
+class Passage:
+    """A retrieved chunk, or a run of adjacent chunks from the same section"""
+    chunk_ids: List[str]
+    text: str
+    score: float
+    tokens: int = 0
+    signature: Optional[object] = field(default=None, repr=False)
+
+
+def split_chunk_id(chunk_id: str) -> Tuple[str, Optional[int]]:
+    """
+    Split a vector ID of the form '{cik}_{year}_{split}_{chunking_key}_{section}_{i}' into its section
+    prefix and chunk index.
+
+    Args:
+        chunk_id (str): Vector ID
+
+    Returns:
+        Tuple[str, Optional[int]]: Section prefix and chunk index, or (chunk_id, None) if the ID has another shape
+    """
+    prefix, _, index = chunk_id.rpartition('_')
+    if not prefix or not index.isdigit():
+        return chunk_id, None
+    return prefix, int(index)
+
+
+def approximate_token_count(text: str) -> int:
+    """Estimate tokens from words when no tokenizer is available"""
+    return int(len(text.split()) * 1.3) + 1
+
+
+class ContextAssembler:
+    """
+    Build the LLM context from reranked passages.
+    Removes exact and near-duplicate passages, packs the best-scoring ones greedily into
+    a token budget and merges adjacent chunks of the same section into one block.
+    """
+
+    def __init__(self, count_tokens: Optional[Callable[[str], int]] = None,
+                 max_tokens: Optional[int] = None, near_duplicate_threshold: Optional[float] = None):
+        """
+        Initialize the ContextAssembler.
+
+        Args:
+            count_tokens (Optional[Callable[[str], int]]): Token counter. Defaults to a word-based estimate
+            max_tokens (Optional[int]): Context token budget. Defaults to config['retrieval']['context']['max_tokens']
+            near_duplicate_threshold (Optional[float]): Estimated Jaccard similarity above which a passage
+                counts as a duplicate. Defaults to config['retrieval']['context']['near_duplicate_threshold']
+        """
+        settings = config.get('retrieval', {}).get('context', {})
+        self.count_tokens = count_tokens or approximate_token_count
+        self.max_tokens = max_tokens or settings.get('max_tokens', 2000)
+        self.near_duplicate_threshold = near_duplicate_threshold or settings.get('near_duplicate_threshold', 0.8)
+        self.minhasher = MinHasher(num_perm=64)
+
+    def deduplicate(self, passages: List[Passage]) -> List[Passage]:
+        """
+        Drop exact and near-duplicate passages, keeping the highest-scoring copy.
+
+        Args:
+            passages (List[Passage]): Passages sorted by descending score
+
+        Returns:
+            List[Passage]: Passages without duplicates, in the same order
+        """
+        kept: List[Passage] = []
+        seen_hashes = set()
+        for passage in passages:
+            normalized = normalize_text(passage.text)
+            digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+            if digest in seen_hashes:
+                continue
+            passage.signature = self.minhasher.text_signature(normalized)
+            if any(estimate_jaccard(passage.signature, other.signature) >= self.near_duplicate_threshold
+                   for other in kept):
+                continue
+            seen_hashes.add(digest)
+            kept.append(passage)
+        return kept
+
+    def pack(self, passages: List[Passage]) -> List[Passage]:
+        """
+        Greedily select passages by score until the token budget is spent.
+
+        Args:
+            passages (List[Passage]): Passages sorted by descending score
+
+        Returns:
+            List[Passage]: Selected passages, in score order
+        """
+        selected = []
+        used = 0
+        for passage in passages:
+            passage.tokens = self.count_tokens(passage.text)
+            if used + passage.tokens > self.max_tokens:
+                # A smaller, lower-scoring passage may still fit
+                continue
+            selected.append(passage)
+            used += passage.tokens
+        return selected
+
+    def merge_adjacent(self, passages: List[Passage]) -> List[Passage]:
+        """
+        Merge passages that are consecutive chunks of the same section.
+
+        Args:
+            passages (List[Passage]): Selected passages
+
+        Returns:
+            List[Passage]: Merged blocks ordered by their best score
+        """
+        positioned = sorted(
+            (split_chunk_id(p.chunk_ids[0]) + (p,) for p in passages),
+            key=lambda item: (item[0], item[1] if item[1] is not None else -1),
+        )
+        blocks: List[Passage] = []
+        last_prefix, last_index = None, None
+        for prefix, index, passage in positioned:
+            if blocks and index is not None and prefix == last_prefix and last_index is not None \
+                    and index == last_index + 1:
+                block = blocks[-1]
+                block.chunk_ids += passage.chunk_ids
+                block.text = f"{block.text} {passage.text}"
+                block.score = max(block.score, passage.score)
+                block.tokens += passage.tokens
+            else:
+                blocks.append(Passage(list(passage.chunk_ids), passage.text, passage.score, passage.tokens))
+            last_prefix, last_index = prefix, index
+        return sorted(blocks, key=lambda block: block.score, reverse=True)
+
+    def assemble(self, texts: Sequence[str], chunk_ids: Sequence[str],
+                 scores: Sequence[float]) -> Tuple[List[str], str, List[str]]:
+        """
+        Assemble the context for a query.
+
+        Args:
+            texts (Sequence[str]): Cleaned passage texts
+            chunk_ids (Sequence[str]): Vector ID of each passage
+            scores (Sequence[float]): Reranker score of each passage
+
+        Returns:
+            Tuple[List[str], str, List[str]]: Tuple containing:
+                - List of context blocks, each ending with its sources
+                - Concatenated context
+                - Chunk IDs included in the context, best block first
+        """
+        passages = sorted(
+            (Passage([chunk_id], text, float(score)) for text, chunk_id, score in zip(texts, chunk_ids, scores)),
+            key=lambda passage: passage.score,
+            reverse=True,
+        )
+        blocks = self.merge_adjacent(self.pack(self.deduplicate(passages)))
+        documents = [f"{block.text}\n\n(Source: {', '.join(block.chunk_ids)})" for block in blocks]
+        used_chunk_ids = [chunk_id for block in blocks for chunk_id in block.chunk_ids]
+        return documents, "\n\n".join(documents), used_chunk_ids
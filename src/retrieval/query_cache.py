@@ -0,0 +1,152 @@
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import config
+from embeddings.backends import canonical_model_name, get_artifact_dir, get_inference_config
+from prompts.financial_questions import FINANCIAL_QUESTIONS
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query for cache lookups by trimming and collapsing whitespace.
+
+    Args:
+        query (str): Query text
+
+    Returns:
+        str: Normalized query text
+    """
+    return re.sub(r"\s+", " ", query).strip()
+
+
+class QueryEmbeddingCache:
+    """
+    Cache of query embeddings keyed by (model name, normalized query text).
+    Precomputed queries are persisted next to the model artifacts and never evicted;
+    ad-hoc queries are kept in an in-memory LRU.
+    """
+
+    def __init__(self, model_name: str, model, max_entries: int = 1024, path: Optional[Path] = None):
+        """
+        Initialize the QueryEmbeddingCache and load any persisted embeddings.
+
+        Args:
+            model_name (str): Name of the embedding model, part of every cache key
+            model: Loaded embedding model exposing encode()
+            max_entries (int, optional): Number of ad-hoc query embeddings kept. Defaults to 1024
+            path (Optional[Path]): Persisted cache file. Defaults to the model's artifact directory
+        """
+        self.model_name = canonical_model_name(model_name)
+        self.model = model
+        # Encodes a list of queries; the analysis service swaps in a micro-batched version
+        self.encode = model.encode
+        self.max_entries = max_entries
+        self.path = path or get_artifact_dir(model_name, get_inference_config()['backend']) / 'query_embeddings.npz'
+        self._lock = threading.Lock()
+        self._persistent: Dict[Tuple[str, str], List[float]] = {}
+        self._recent: OrderedDict = OrderedDict()
+        self._load()
+
+    def _key(self, query: str) -> Tuple[str, str]:
+        return self.model_name, normalize_query(query)
+
+    def _load(self) -> None:
+        """Load persisted query embeddings, ignoring a missing or unreadable file."""
+        if not self.path.exists():
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if str(data['model_name']) != self.model_name:
+                    return
+                for query, embedding in zip(data['queries'], data['embeddings']):
+                    self._persistent[(self.model_name, str(query))] = embedding.tolist()
+        except Exception as e:
+            print(f"Warning: Could not load query embeddings from {self.path}: {str(e)}")
+
+    def _save(self) -> None:
+        """Persist the precomputed query embeddings atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        queries = [query for _, query in self._persistent]
+        embeddings = np.asarray(list(self._persistent.values()), dtype=np.float32)
+        tmp_path = self.path.with_name(self.path.name + '.tmp.npz')
+        np.savez(tmp_path, model_name=self.model_name, queries=np.asarray(queries), embeddings=embeddings)
+        os.replace(tmp_path, self.path)
+
+    def precompute(self, queries: Iterable[str]) -> int:
+        """
+        Embed queries in one batch, keep them permanently and persist them.
+
+        Args:
+            queries (Iterable[str]): Queries to precompute
+
+        Returns:
+            int: Number of queries that had to be encoded
+        """
+        with self._lock:
+            missing = list(dict.fromkeys(
+                normalize_query(q) for q in queries if self._key(q) not in self._persistent
+            ))
+        if not missing:
+            return 0
+        embeddings = np.asarray(self.model.encode(missing))
+        with self._lock:
+            for query, embedding in zip(missing, embeddings):
+                self._persistent[self._key(query)] = embedding.tolist()
+            self._save()
+        return len(missing)
+
+    def get(self, query: str) -> List[float]:
+        """
+        Get the embedding of a query, encoding it on a cache miss.
+
+        Args:
+            query (str): Query text
+
+        Returns:
+            List[float]: Query embedding
+        """
+        key = self._key(query)
+        with self._lock:
+            if key in self._persistent:
+                return self._persistent[key]
+            if key in self._recent:
+                self._recent.move_to_end(key)
+                return self._recent[key]
+
+        embedding = np.asarray(self.encode([key[1]]))[0].tolist()
+        with self._lock:
+            self._recent[key] = embedding
+            while len(self._recent) > self.max_entries:
+                self._recent.popitem(last=False)
+        return embedding
+
+
+def precompute_standard_questions(cache: QueryEmbeddingCache) -> int:
+    """
+    Precompute the embeddings of the standard financial questions.
+
+    Args:
+        cache (QueryEmbeddingCache): Cache to fill
+
+    Returns:
+        int: Number of questions that had to be encoded
+    """
+    return cache.precompute(FINANCIAL_QUESTIONS.values())
+
+
+if __name__ == "__main__":
+    # Build step: persist the standard question embeddings for the configured model and backend
+    from embeddings.backends import load_sentence_transformer
+
+    model_name = config['embeddings']['sentence_transformer']['model']
+    query_cache = QueryEmbeddingCache(model_name, load_sentence_transformer(model_name))
+    encoded = precompute_standard_questions(query_cache)
+    print(f"Encoded {encoded} question(s), cache at {query_cache.path}")
@@ -1,19 +1,37 @@
-from sentence_transformers import SentenceTransformer
-from sentence_transformers import CrossEncoder
-from pinecone import Pinecone
+from embeddings.backends import canonical_model_name, load_sentence_transformer, load_cross_encoder
+from chunking.cache import chunking_key
+from indexing.chunk_store import ChunkStore
+from indexing.pinecone_client import get_pinecone_index
+from indexing.sharding import ShardRouter
+from retrieval.context import ContextAssembler
+from retrieval.query_cache import QueryEmbeddingCache, precompute_standard_questions
+import profiling
+from config import config
 from wasabi import msg
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
+import threading
 import re
 import os
 from typing import List, Dict, Tuple, Optional, Union
 
+Filing = Tuple[str, int, str]
+# Vectors of a filing whose chunk text must be in the chunk store for it to count as indexed
+INDEXED_CHECK_SAMPLE = 10
+
 class PineconeRetriever:
     """
     A class for retrieving and reranking documents from a Pinecone vector database.
     Implements semantic search with cross-encoder reranking.
     """
 
-    def __init__(self, index_name: str, k: int = 10, text_field: str = "text"):
+    # Number of cleaned chunk texts kept in memory
+    CLEANED_TEXT_CACHE_SIZE = 20000
+
+    def __init__(self, index_name: str, k: int = 10, text_field: str = "text",
+                 chunk_store: Optional[ChunkStore] = None, index=None,
+                 router: Optional[ShardRouter] = None):
         """
         Initialize the PineconeRetriever with specified parameters.
         
@@ -21,21 +39,36 @@ class PineconeRetriever:
             index_name (str): Name of the Pinecone index to use
             k (int, optional): Number of documents to retrieve. Defaults to 5
             text_field (str, optional): Field name containing the text. Defaults to "text"
+            chunk_store (Optional[ChunkStore]): Local store resolving chunk text. Defaults to a new ChunkStore
+            index (Optional[Index]): Connected index client. Defaults to one configured from the environment
+            router (Optional[ShardRouter]): Maps filings to namespaces. Defaults to the configured scheme
         """
         self.index_name = index_name
-        self.pinecone_api_key = 'pcsk_2LZnji_5FkeVeGnpuS6ENKR2SWXEKHzsThAMPfXPe1tANF63vnYyZRSQqm7m6aPUi62ovm'
-        self.pc = Pinecone(api_key=self.pinecone_api_key)
-        self.index = self.pc.Index(self.index_name)
+        self.index = index or get_pinecone_index(self.index_name)
+        self.router = router or ShardRouter()
         self.k = k
         self.text_field = text_field
-        self.embedding_model = SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
-        self.RERANKER = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-12-v2")
+        self.chunk_store = chunk_store or ChunkStore()
+        embedding_model_name = canonical_model_name(config['embeddings']['sentence_transformer']['model'])
+        self.embedding_model = load_sentence_transformer(embedding_model_name)
+        self.query_cache = QueryEmbeddingCache(embedding_model_name, self.embedding_model)
+        # Take the standard questions off the per-query path; a no-op once persisted
+        precompute_standard_questions(self.query_cache)
+        self.RERANKER = load_cross_encoder(config['retrieval']['reranker']['model'])
+        # Scores (query, passage) pairs; the analysis service swaps in a micro-batched version
+        self.score_pairs = self.RERANKER.predict
+        self.context_assembler = ContextAssembler(count_tokens=self.count_tokens)
+        self.max_concurrent_queries = config['retrieval'].get('max_concurrent_queries', 8)
+        self._cleaned_text = OrderedDict()
+        self._cleaned_text_lock = threading.Lock()
 
         msg.info(f"Initialized PineconeRetriever with index: {self.index_name}")
 
     def is_file_indexed_in_pinecone(self, cik: str, year: int, split: str) -> bool:
         """
-        Check if a file with given parameters exists in the Pinecone index.
+        Check if a file with given parameters exists in the Pinecone index, chunked with
+        the configured chunking variant. The file only counts as indexed when the chunk store also holds the text of its
+        vectors, so a filing whose vectors outlived a lost or reset store is indexed again.
         
         Args:
             cik (str): Company CIK number
@@ -49,12 +82,19 @@ class PineconeRetriever:
             st.info("Checking if file is indexed in Pinecone")
             query_response = self.index.query(
                 vector=[0] * 768,
-                filter={"cik": cik, "year": year, "split": split},
-                top_k=1,
-                include_metadata=True,
-                namespace='ns1'
+                filter={"cik": cik, "year": year, "split": split, "chunking": chunking_key()},
+                top_k=INDEXED_CHECK_SAMPLE,
+                namespace=self.router.namespace(cik, year, split)
             )
-            return len(query_response.matches) > 0
+            vector_ids = [match.id for match in query_response.matches]
+            if not vector_ids:
+                return False
+            stored = self.chunk_store.get_many(vector_ids)
+            if len(stored) < len(vector_ids):
+                msg.warn(f"Chunk store is missing {len(vector_ids) - len(stored)} of {len(vector_ids)} "
+                         f"sampled chunks of {cik} {year} {split}, indexing again")
+                return False
+            return True
         except Exception as e:
             print(f"Error checking Pinecone index: {str(e)}")
             return False
@@ -76,14 +116,14 @@ class PineconeRetriever:
                 - List of chunk IDs used
         """
         try:
-            retriever = PineconeRetriever(index_name=self.index_name, k=k)
-            reranked_documents, reranked_documents_text, chunk_ids = retriever.get_relevant_documents(query, cik, year, split)
+            reranked_documents, reranked_documents_text, chunk_ids = self.get_relevant_documents(query, cik, year, split, k=k)
             return reranked_documents_text, chunk_ids
         except Exception as e:
             return None, []
 
     def get_relevant_documents(self, query: str, cik: Optional[str] = None, 
-                             year: Optional[int] = None, split: Optional[str] = None) -> Tuple[List[str], str, List[str]]:
+                             year: Optional[int] = None, split: Optional[str] = None,
+                             k: Optional[int] = None) -> Tuple[List[str], str, List[str]]:
         """
         Get relevant documents for a query with optional metadata filters.
         
@@ -92,50 +132,88 @@ class PineconeRetriever:
             cik (Optional[str]): Company CIK number
             year (Optional[int]): Filing year
             split (Optional[str]): Dataset split
+            k (Optional[int]): Number of documents to retrieve. Defaults to self.k
             
         Returns:
             Tuple[List[str], str, List[str]]: Tuple containing:
-                - List of reranked documents
-                - Concatenated reranked documents
-                - List of chunk IDs
+                - List of reranked, deduplicated context blocks
+                - Concatenated context within the token budget
+                - List of chunk IDs used in the context
         """
         try:
-            msg.info(f"Retrieving top {self.k} documents for query: '{query}'")
-            result = self.query_index(query, cik, year, split)
+            k = k or self.k
+            msg.info(f"Retrieving top {k} documents for query: '{query}'")
+            result = self.query_index(query, cik, year, split, top_k=k)
             st.success("✅ Retrieving documents done")
-            formatted_documents, chunk_ids = self.format_docs(result['matches'])
-            reranked_documents, reranked_documents_text = self.get_reranked_contexts(query, formatted_documents, self.k)
-            return reranked_documents, reranked_documents_text, chunk_ids
+            passages, chunk_ids = self.get_passages(result['matches'])
+            scores = self.generate_cross_encoder_score(query, passages)
+            st.success("✅ Reranking documents done")
+            return self.context_assembler.assemble(passages, chunk_ids, scores)
         except Exception as e:
             msg.error(f"Error retrieving documents: {str(e)}")
             return [], "", []
 
-    def format_docs(self, documents: List[Dict]) -> Tuple[List[str], List[str]]:
+    def get_passages(self, documents: List[Dict]) -> Tuple[List[str], List[str]]:
         """
-        Format retrieved documents into a clean text format.
+        Resolve the cleaned text of retrieved documents.
+        Chunk text is resolved from the chunk store in one batched lookup; vectors indexed
+        before the chunk store existed still carry it in their 'content' metadata.
+        Cleaned text is cached per chunk ID.
         
         Args:
             documents (List[Dict]): List of document dictionaries from Pinecone
             
         Returns:
             Tuple[List[str], List[str]]: Tuple containing:
-                - List of formatted document strings
+                - List of cleaned passage texts
                 - List of chunk IDs
         """
-        docs = []
+        ids = [doc['id'] for doc in documents if 'metadata' in doc]
+        with self._cleaned_text_lock:
+            cached = {chunk_id: self._cleaned_text[chunk_id] for chunk_id in ids if chunk_id in self._cleaned_text}
+        missing = [chunk_id for chunk_id in ids if chunk_id not in cached]
+        stored = self.chunk_store.get_many(missing) if missing else {}
+
+        passages = []
         chunk_ids = []
         for doc in documents:
             if 'metadata' in doc:
-                content = doc['metadata'].get('content', "No content Available")
                 chunk_id = doc['id']
+                cleaned_content = cached.get(chunk_id)
+                if cleaned_content is None:
+                    content = stored.get(chunk_id) or doc['metadata'].get('content', "No content Available")
+                    cleaned_content = self.clean_text(content)
+                    cached[chunk_id] = cleaned_content
             else:
-                content = "No content Available"
+                cleaned_content = "No content Available"
                 chunk_id = "Untitled"
 
-            cleaned_content = self.clean_text(content)
-            docs.append(f"{cleaned_content}\n\n(Source: {chunk_id})")
+            passages.append(cleaned_content)
             chunk_ids.append(chunk_id)
 
+        with self._cleaned_text_lock:
+            for chunk_id, cleaned_content in cached.items():
+                self._cleaned_text[chunk_id] = cleaned_content
+                self._cleaned_text.move_to_end(chunk_id)
+            while len(self._cleaned_text) > self.CLEANED_TEXT_CACHE_SIZE:
+                self._cleaned_text.popitem(last=False)
+
+        return passages, chunk_ids
+
+    def format_docs(self, documents: List[Dict]) -> Tuple[List[str], List[str]]:
+        """
+        Format retrieved documents into a clean text format.
+        
+        Args:
+            documents (List[Dict]): List of document dictionaries from Pinecone
+            
+        Returns:
+            Tuple[List[str], List[str]]: Tuple containing:
+                - List of formatted document strings
+                - List of chunk IDs
+        """
+        passages, chunk_ids = self.get_passages(documents)
+        docs = [f"{passage}\n\n(Source: {chunk_id})" for passage, chunk_id in zip(passages, chunk_ids)]
         return docs, chunk_ids
 
     def clean_text(self, text: str) -> str:
@@ -153,9 +231,21 @@ class PineconeRetriever:
         cleaned_text = re.sub(r' {2,}', " ", cleaned_text)
         return cleaned_text
 
+    def count_tokens(self, text: str) -> int:
+        """
+        Count tokens with the reranker's tokenizer, used to budget the context.
+        
+        Args:
+            text (str): Text to measure
+            
+        Returns:
+            int: Number of tokens
+        """
+        return len(self.RERANKER.tokenizer.encode(text, add_special_tokens=False))
+
     def get_query_vector(self, query: str) -> List[float]:
         """
-        Generate embedding vector for a query.
+        Get the embedding vector for a query from the query embedding cache.
         
         Args:
             query (str): Query text
@@ -163,10 +253,11 @@ class PineconeRetriever:
         Returns:
             List[float]: Embedding vector
         """
-        return self.embedding_model.encode(query).tolist()
+        return self.query_cache.get(query)
 
     def query_index(self, query: str, cik: Optional[str] = None, 
-                   year: Optional[int] = None, split: Optional[str] = None) -> Dict:
+                   year: Optional[int] = None, split: Optional[str] = None,
+                   top_k: Optional[int] = None) -> Dict:
         """
         Query the Pinecone index with filters.
         
@@ -175,28 +266,106 @@ class PineconeRetriever:
             cik (Optional[str]): Company CIK number
             year (Optional[int]): Filing year
             split (Optional[str]): Dataset split
+            top_k (Optional[int]): Number of matches to return. Defaults to self.k
+            
+        Returns:
+            Dict: Pinecone query response
+        """
+        return self.query_index_by_vector(self.get_query_vector(query), cik, year, split, top_k=top_k)
+
+    def query_index_by_vector(self, vector: List[float], cik: Optional[str] = None,
+                              year: Optional[int] = None, split: Optional[str] = None,
+                              top_k: Optional[int] = None) -> Dict:
+        """
+        Query the Pinecone index with an already computed query vector and filters.
+        The query goes only to the namespaces holding the requested filings; when several
+        match it fans out over them and the best matches across namespaces are kept.
+        
+        Args:
+            vector (List[float]): Query embedding
+            cik (Optional[str]): Company CIK number
+            year (Optional[int]): Filing year
+            split (Optional[str]): Dataset split
+            top_k (Optional[int]): Number of matches to return. Defaults to self.k
             
         Returns:
             Dict: Pinecone query response
         """
-        vector = self.get_query_vector(query)
-        filter_dict = {}
-        if cik:
+        namespaces = self.router.route(self.index, cik, year, split)
+        # Only chunks of the configured chunking variant; fields encoded in the namespace name need no filter
+        filter_dict = {'chunking': chunking_key()}
+        if cik and 'cik' not in self.router.fields:
             filter_dict['cik'] = cik
-        if year:
+        if year and 'year' not in self.router.fields:
             filter_dict['year'] = year
-        if split:
+        if split and 'split' not in self.router.fields:
             filter_dict['split'] = split
+
+        def query_namespace(namespace):
+            return self.index.query(
+                namespace=namespace,
+                vector=vector,
+                top_k=top_k or self.k,
+                include_values=False,
+                include_metadata=True,
+                filter=filter_dict
+            )
+
+        if len(namespaces) == 1:
+            return query_namespace(namespaces[0])
+        workers = max(1, min(self.max_concurrent_queries, len(namespaces)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            responses = list(pool.map(profiling.in_run(query_namespace), namespaces))
+        matches = sorted((match for response in responses for match in response['matches']),
+                         key=lambda match: match['score'], reverse=True)
+        return {'matches': matches[:top_k or self.k]}
+
+    def retrieve_documents_many(self, queries: List[str], filings: List[Filing],
+                                k: Optional[int] = None) -> Dict[Tuple[str, Filing], Tuple[Optional[str], List[str]]]:
+        """
+        Retrieve and rerank documents for every combination of queries and filings.
+        Each query is embedded once, the per-filing vector queries run concurrently and
+        all (query, passage) pairs are reranked in shared cross-encoder batches.
+        
+        Args:
+            queries (List[str]): Search queries
+            filings (List[Filing]): (cik, year, split) of each filing to search
+            k (int, optional): Number of documents to retrieve per query and filing. Defaults to self.k
             
-        response = self.index.query(
-            namespace="ns1",
-            vector=vector,
-            top_k=self.k,
-            include_values=True,
-            include_metadata=True,
-            filter=filter_dict if filter_dict else None
-        )
-        return response
+        Returns:
+            Dict[Tuple[str, Filing], Tuple[Optional[str], List[str]]]: For each (query, filing), the
+                assembled context or None if nothing was retrieved, and the chunk IDs it uses
+        """
+        k = k or self.k
+        vectors = {query: self.get_query_vector(query) for query in queries}
+        jobs = [(query, filing) for query in queries for filing in filings]
+
+        def run_query(job):
+            query, (cik, year, split) = job
+            try:
+                return self.query_index_by_vector(vectors[query], cik, year, split, top_k=k)
+            except Exception as e:
+                msg.error(f"Error querying {cik}/{year}/{split}: {str(e)}")
+                return {'matches': []}
+
+        workers = max(1, min(self.max_concurrent_queries, len(jobs)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            responses = list(pool.map(profiling.in_run(run_query), jobs))
+        st.success("✅ Retrieving documents done")
+
+        passages = [self.get_passages(response['matches']) for response in responses]
+        pairs = [(query, text) for (query, _), (texts, _) in zip(jobs, passages) for text in texts]
+        scores = self.score_pairs(pairs) if pairs else []
+        st.success("✅ Reranking documents done")
+
+        results = {}
+        offset = 0
+        for job, (texts, chunk_ids) in zip(jobs, passages):
+            job_scores = scores[offset:offset + len(texts)]
+            offset += len(texts)
+            _, context, used_chunk_ids = self.context_assembler.assemble(texts, chunk_ids, job_scores)
+            results[job] = (context or None, used_chunk_ids)
+        return results
 
     def generate_cross_encoder_score(self, query: str, contexts: List[str]) -> List[float]:
         """
@@ -209,7 +378,7 @@ class PineconeRetriever:
         Returns:
             List[float]: List of relevance scores
         """
-        return self.RERANKER.predict([(query, text) for text in contexts])
+        return self.score_pairs([(query, text) for text in contexts])
 
     def get_reranked_contexts(self, query: str, contexts: List[str], num_docs: int) -> Tuple[List[str], str]:
         """
@@ -0,0 +1,248 @@
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from wasabi import msg
+
+from config import config, get_config_hash
+from main import EdgarAnalyzer, ANALYZER_RESOURCE, ANALYSIS_CACHE_RESOURCE, is_complete_analysis
+from resources import get_resource, warm_up, ResultCache, MicroBatcher
+
+SPLITS = ('train', 'test', 'validate')
+
+
+class LatencyStats:
+    """Latency percentiles and error counts per route over a sliding window of requests"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, route: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self._samples.setdefault(route, deque(maxlen=self.window)).append(seconds)
+            counts = self._counts.setdefault(route, {'requests': 0, 'errors': 0})
+            counts['requests'] += 1
+            counts['errors'] += 0 if ok else 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            snapshot = {}
+            for route, samples in self._samples.items():
+                ms = np.asarray(samples) * 1000
+                snapshot[route] = {
+                    **self._counts[route],
+                    'p50_ms': round(float(np.percentile(ms, 50)), 1),
+                    'p95_ms': round(float(np.percentile(ms, 95)), 1),
+                    'p99_ms': round(float(np.percentile(ms, 99)), 1),
+                    'mean_ms': round(float(ms.mean()), 1),
+                }
+            return snapshot
+
+
+class AnalysisService:
+    """
+    Analysis behind an HTTP API, with the analyzer and its models resident for the process.
+    Identical in-flight requests share one computation through the same ResultCache the
+    Streamlit app uses, and the question embeddings and cross-encoder pairs of concurrent
+    requests are merged into shared batches.
+    """
+
+    def __init__(self):
+        settings = config.get('service', {})
+        self.batch_max_items = settings.get('batch_max_items', 256)
+        self.batch_max_wait_ms = settings.get('batch_max_wait_ms', 5)
+        self.cache: ResultCache = get_resource(ANALYSIS_CACHE_RESOURCE, ResultCache)
+        self.latency = LatencyStats()
+        self.started = time.time()
+        self.computed = 0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self.embedding_batcher: Optional[MicroBatcher] = None
+        self.rerank_batcher: Optional[MicroBatcher] = None
+
+    def build_analyzer(self) -> EdgarAnalyzer:
+        """Build the analyzer with the retriever's model calls routed through micro-batchers."""
+        analyzer = EdgarAnalyzer()
+        retriever = analyzer.retriever
+        self.embedding_batcher = MicroBatcher(
+            retriever.query_cache.encode, self.batch_max_items, self.batch_max_wait_ms, name="embedding-batcher"
+        )
+        self.rerank_batcher = MicroBatcher(
+            retriever.score_pairs, self.batch_max_items, self.batch_max_wait_ms, name="rerank-batcher"
+        )
+        retriever.query_cache.encode = self.embedding_batcher
+        retriever.score_pairs = self.rerank_batcher
+        return analyzer
+
+    def warm_up(self) -> threading.Thread:
+        return warm_up(ANALYZER_RESOURCE, self.build_analyzer)
+
+    @property
+    def ready(self) -> bool:
+        return self.rerank_batcher is not None
+
+    def analyze(self, cik: str, year: int, split: str) -> Dict[str, Dict[str, str]]:
+        """
+        Analyze a filing, sharing the computation with identical concurrent requests.
+
+        Args:
+            cik (str): Company CIK number
+            year (int): Filing year
+            split (str): Dataset split
+
+        Returns:
+            Dict[str, Dict[str, str]]: Answer and chunk IDs per financial question
+        """
+        def compute():
+            with self._lock:
+                self.computed += 1
+            analyzer = get_resource(ANALYZER_RESOURCE, self.build_analyzer)
+            return analyzer.analyze_filing(cik, year, split)
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return self.cache.get_or_compute((cik, year, split, get_config_hash()), compute,
+                                            cacheable=is_complete_analysis)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def health(self) -> Dict:
+        return {'status': 'ok' if self.ready else 'warming', 'uptime_s': round(time.time() - self.started, 1)}
+
+    def metrics(self) -> Dict:
+        latency = self.latency.snapshot()
+        requests = latency.get('/analyze', {}).get('requests', 0)
+        with self._lock:
+            counters = {'in_flight': self.in_flight, 'computed': self.computed,
+                        'shared': max(requests - self.computed, 0)}
+        return {
+            'latency': latency,
+            'analysis': counters,
+            'batching': {
+                'embeddings': self.embedding_batcher.stats() if self.embedding_batcher else None,
+                'rerank': self.rerank_batcher.stats() if self.rerank_batcher else None,
+            },
+        }
+
+
+def parse_filing(params: Dict) -> Tuple[str, int, str]:
+    """
+    Validate the filing of an analysis request.
+
+    Args:
+        params (Dict): Request parameters with cik, year and split
+
+    Returns:
+        Tuple[str, int, str]: CIK, year and split
+
+    Raises:
+        ValueError: If a parameter is missing or invalid
+    """
+    cik, year, split = (str(params.get(name, '')).strip() for name in ('cik', 'year', 'split'))
+    if not cik.isdigit():
+        raise ValueError("cik must be a number")
+    if not year.isdigit():
+        raise ValueError("year must be a number")
+    if split not in SPLITS:
+        raise ValueError(f"split must be one of {', '.join(SPLITS)}")
+    return cik, int(year), split
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /analyze?cik=&year=&split= or POST /analyze with a JSON body: analysis results.
+    GET /healthz: 200 once the models are loaded, 503 while warming up.
+    GET /metrics: latency percentiles, shared computations and batch sizes.
+    """
+
+    service: AnalysisService = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Dict) -> None:
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self, params: Dict) -> None:
+        route = urlparse(self.path).path
+        started = time.perf_counter()
+        status = 200
+        try:
+            if route == '/analyze':
+                cik, year, split = parse_filing(params)
+                body = {'cik': cik, 'year': year, 'split': split,
+                        'results': self.service.analyze(cik, year, split)}
+            elif route == '/healthz':
+                body = self.service.health()
+                status = 200 if self.service.ready else 503
+            elif route == '/metrics':
+                body = self.service.metrics()
+            else:
+                status, body = 404, {'error': f"Unknown endpoint {route}"}
+        except ValueError as e:
+            status, body = 400, {'error': str(e)}
+        except Exception as e:
+            msg.fail(f"Error handling {route}: {str(e)}")
+            status, body = 500, {'error': str(e)}
+        self._send(status, body)
+        if route in ('/analyze', '/healthz', '/metrics'):
+            # A warming service answers /healthz with 503; that is not an error
+            self.service.latency.record(route, time.perf_counter() - started, status < 500 or route == '/healthz')
+
+    def do_GET(self):
+        self._handle({key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or b'{}') if length else {}
+        except json.JSONDecodeError:
+            return self._send(400, {'error': "Request body must be JSON"})
+        self._handle(params)
+
+
+def serve(host: Optional[str] = None, port: Optional[int] = None) -> None:
+    """
+    Run the analysis service until interrupted.
+
+    Args:
+        host (Optional[str]): Interface to bind. Defaults to config['service']['host']
+        port (Optional[int]): Port to listen on. Defaults to config['service']['port']
+    """
+    settings = config.get('service', {})
+    service = AnalysisService()
+    service.warm_up()
+    handler = type('BoundAnalysisRequestHandler', (AnalysisRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host or settings.get('host', '127.0.0.1'), port or settings.get('port', 8080)), handler)
+    server.daemon_threads = True
+    msg.info(f"Analysis service listening on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve filing analyses over HTTP")
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=None)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -0,0 +1,139 @@
+import os
+import re
+import sys
+import argparse
+import subprocess
+from typing import Dict, List, Optional
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Libraries that only specific code paths need; importing the app must not load them
+DEFERRED_MODULES = [
+    'torch',
+    'transformers',
+    'sentence_transformers',
+    'langchain',
+    'langchain_groq',
+    'langchain_text_splitters',
+    'nltk',
+    'pinecone',
+    'datasets',
+    'bs4',
+    'yaml',
+]
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_import(module: str) -> List[Dict]:
+    """
+    Import a module in a fresh interpreter with -X importtime and parse the timings.
+
+    Args:
+        module (str): Module to import, relative to src/ (e.g. 'main')
+
+    Returns:
+        List[Dict]: One entry per imported module with 'module', 'self_us',
+            'cumulative_us' and 'depth' (0 for imports made directly by the target)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            timings.append({
+                'module': match.group(4),
+                'self_us': int(match.group(1)),
+                'cumulative_us': int(match.group(2)),
+                'depth': (len(match.group(3)) - 1) // 2,
+            })
+    return timings
+
+
+def build_report(module: str, top: int = 15) -> Dict:
+    """
+    Build an import-time breakdown for a module.
+
+    Args:
+        module (str): Module to import, relative to src/
+        top (int, optional): Number of slowest top-level packages to list. Defaults to 15
+
+    Returns:
+        Dict: 'total_ms', the slowest 'packages' by cumulative time and the
+            'deferred_loaded' modules that should not have been imported
+    """
+    timings = measure_import(module)
+    target = [t for t in timings if t['module'] == module]
+    total_us = target[-1]['cumulative_us'] if target else sum(t['self_us'] for t in timings)
+
+    # Aggregate per top-level package, counting each package once at its outermost import
+    packages: Dict[str, int] = {}
+    for t in timings:
+        package = t['module'].split('.')[0]
+        if t['module'] == package or package not in packages:
+            packages[package] = max(packages.get(package, 0), t['cumulative_us'])
+
+    imported = {t['module'] for t in timings}
+    return {
+        'module': module,
+        'total_ms': total_us / 1000,
+        'packages': sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top],
+        'deferred_loaded': [m for m in DEFERRED_MODULES if m in imported],
+    }
+
+
+def print_report(report: Dict) -> None:
+    """
+    Print an import-time report.
+
+    Args:
+        report (Dict): Report produced by build_report
+    """
+    print(f"Import time for '{report['module']}': {report['total_ms']:.1f} ms")
+    print(f"{'package':<32}{'cumulative ms':>14}")
+    for package, cumulative_us in report['packages']:
+        print(f"{package:<32}{cumulative_us / 1000:>14.1f}")
+    if report['deferred_loaded']:
+        print(f"Deferred modules loaded at import: {', '.join(report['deferred_loaded'])}")
+
+
+def check_startup(module: str, max_ms: Optional[float] = None) -> List[str]:
+    """
+    Check that importing a module stays fast and does not load deferred libraries.
+
+    Args:
+        module (str): Module to import, relative to src/
+        max_ms (Optional[float]): Import time budget in milliseconds, or None for no budget
+
+    Returns:
+        List[str]: Problems found, empty when the check passes
+    """
+    report = build_report(module)
+    print_report(report)
+    problems = [f"{name} is imported eagerly" for name in report['deferred_loaded']]
+    if max_ms is not None and report['total_ms'] > max_ms:
+        problems.append(f"import took {report['total_ms']:.1f} ms, budget is {max_ms:.1f} ms")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report and check the import time of app modules")
+    parser.add_argument('modules', nargs='*', default=['main'], help="Modules to import, relative to src/")
+    parser.add_argument('--max-ms', type=float, default=None, help="Fail when an import exceeds this budget")
+    args = parser.parse_args()
+
+    failures = []
+    for name in args.modules:
+        failures += [f"{name}: {problem}" for problem in check_startup(name, args.max_ms)]
+        print()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
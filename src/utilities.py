@@ -1,7 +1,6 @@
 import os
 import json
 import streamlit as st
-from datasets import load_dataset
 
 def download_edgar_entry_for_cik(cik, years, splits):
     """
@@ -15,6 +14,8 @@ def download_edgar_entry_for_cik(cik, years, splits):
     Returns:
       dict: Dictionary containing the filings found for each year and split
     """
+    from datasets import load_dataset
+
     # Get the absolute path to the project root (one level up from src)
     project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     results = {}
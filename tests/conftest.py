@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules import each other relative to src/, as when the app is run from there
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from rag.answer import ANSWER_ERROR, QueryAnswerer, complete_answer
+from rag.fake_llm import RAMBLE, start_fake_llm, tokenize
+
+STOP = ["\n\nQuestion:"]
+
+
+def test_incomplete_answer_continues():
+    assert complete_answer("The company had 12,000", STOP) is None
+    assert complete_answer("Revenue was $190.8 million", STOP) is None
+
+
+def test_answer_ends_with_its_sentence():
+    text = "Revenue was $190.8 million. This figure is reported"
+    assert complete_answer(text, STOP) == "Revenue was $190.8 million."
+
+
+def test_decimal_point_does_not_end_answer():
+    assert complete_answer("12,000 employees, up 2.5", STOP) is None
+    text = "12,000 employees, up 2.5 percent. Headcount"
+    assert complete_answer(text, STOP) == "12,000 employees, up 2.5 percent."
+
+
+def test_abbreviations_do_not_end_answer():
+    text = "12,000 employees in the U.S. and 3,000 abroad. Management"
+    assert complete_answer("12,000 employees in the U.", STOP) is None
+    assert complete_answer("12,000 employees in the U.S.", STOP) is None
+    assert complete_answer(text, STOP) == "12,000 employees in the U.S. and 3,000 abroad."
+    assert complete_answer("21.5% per J. Smith, the CFO.", STOP) == "21.5% per J. Smith, the CFO."
+
+
+def test_stop_sequence_ends_answer():
+    text = "I cannot find this information.\n\nQuestion: What else"
+    assert complete_answer(text, STOP) == "I cannot find this information."
+
+
+def test_line_break_ends_answer():
+    assert complete_answer("Net income of $57.4 billion\nThe", STOP) == "Net income of $57.4 billion"
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    server = start_fake_llm(first_token_ms=0, token_ms=5, answers={'drove': 'Growth was driven by demand'})
+    monkeypatch.setenv('GROQ_API_BASE', server.url)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def wait_for_completions(server, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while server.completions < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_stream_stops_once_the_figure_is_complete(fake_llm):
+    partials = []
+    answer = QueryAnswerer().stream_answer("What were net sales?", "Net sales were $274.5 billion in 2020.",
+                                           on_token=partials.append, max_tokens=64)
+
+    assert answer == "$274.5 billion."
+    wait_for_completions(fake_llm, 1)
+    assert fake_llm.cancelled == 1
+    # The stream was closed before the rambling after the figure was sent
+    assert fake_llm.tokens_sent < len(tokenize(RAMBLE))
+    # Partial answers grow token by token up to the answer
+    assert len(partials) > 1 and partials[-1] == answer
+    assert all(later.startswith(earlier.strip()) for earlier, later in zip(partials, partials[1:]))
+
+
+def test_rambling_answer_is_cut_at_max_tokens(fake_llm):
+    answer = QueryAnswerer().stream_answer("What drove growth?", "No figures here.", max_tokens=8)
+
+    assert answer == "".join(tokenize("Growth was driven by demand" + RAMBLE)[:8]).strip()
+    wait_for_completions(fake_llm, 1)
+    assert fake_llm.tokens_sent <= 8
+
+
+def test_server_error_becomes_an_error_answer(fake_llm, monkeypatch):
+    monkeypatch.setenv('GROQ_API_BASE', f"{fake_llm.url}/missing")
+    answer, chunk_ids = QueryAnswerer().answer_query("What were net sales?", "Net sales were $274.5 billion.",
+                                                     ['320193_2020_item7_0'])
+
+    assert answer.startswith(ANSWER_ERROR)
+    assert chunk_ids == []
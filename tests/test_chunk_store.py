@@ -0,0 +1,14 @@
+from indexing.chunk_store import ChunkStore
+
+
+def test_ids_with_prefix_matches_only_the_prefix(tmp_path):
+    store = ChunkStore(path=str(tmp_path / 'chunks.sqlite3'))
+    ids = ['320193_2020_test_abc_item1_0', '320193_2020_test_abc_item1_1', '320193_2020_test_abd_item1_0',
+           '320193_2020_test_ab_item1_0', '320193_2021_test_abc_item1_0']
+    store.put_many((vector_id, 'text') for vector_id in ids)
+
+    assert sorted(store.ids_with_prefix('320193_2020_test_abc_')) == ids[:2]
+    assert sorted(store.ids_with_prefix('320193_2020_')) == sorted(ids[:4])
+    assert sorted(store.ids_with_prefix('')) == sorted(ids)
+
+    store.close()
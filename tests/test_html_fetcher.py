@@ -0,0 +1,121 @@
+import gzip
+import json
+import os
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from html_fetcher import EdgarHTMLFetcher, html_path
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+DOCUMENT = '/Archives/320193/000032019320000096/aapl-20200926.htm'
+SUBMISSIONS = {'filings': {'recent': {
+    'form': ['10-Q', '10-K'],
+    'filingDate': ['2021-01-29', '2020-10-30'],
+    'accessionNumber': ['0000320193-21-000010', '0000320193-20-000096'],
+    'primaryDocument': ['aapl-20201226.htm', 'aapl-20200926.htm'],
+}}}
+
+
+class EdgarStandIn(BaseHTTPRequestHandler):
+    """Submissions API and archives with ETags, answering 429 while throttled is above zero"""
+
+    body = b'<html><body>Annual report</body></html>'
+    etag = '"v1"'
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.headers.get('If-None-Match')))
+        if server.throttled:
+            server.throttled -= 1
+            self._send(429, b'', {'Retry-After': '0'})
+        elif self.path == '/submissions/CIK0000320193.json':
+            self._send(200, json.dumps(SUBMISSIONS).encode(), {'Content-Type': 'application/json'})
+        elif self.path == DOCUMENT and self.headers.get('If-None-Match') == self.etag:
+            self._send(304, b'', {'ETag': self.etag})
+        elif self.path == DOCUMENT:
+            self._send(200, self.body, {'ETag': self.etag, 'Content-Type': 'text/html'})
+        else:
+            self._send(404, b'', {})
+
+    def _send(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def edgar():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), EdgarStandIn)
+    server.requests, server.throttled = [], 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fetcher(edgar, tmp_path):
+    url = f'http://127.0.0.1:{edgar.server_address[1]}'
+    return EdgarHTMLFetcher(data_root=tmp_path, user_agent='Test test@example.com', requests_per_second=1000,
+                            max_retries=2, timeout=5, submissions_url=f'{url}/submissions',
+                            archives_url=f'{url}/Archives')
+
+
+def test_fetch_caches_and_revalidates_with_conditional_gets(fetcher, edgar):
+    result = fetcher.fetch('320193', 2020, 'test')
+    assert result.status == 'fetched'
+    with gzip.open(result.path, 'rb') as f:
+        assert f.read() == EdgarStandIn.body
+
+    assert fetcher.fetch('320193', 2020, 'test').status == 'skipped'
+    requests_before = len(edgar.requests)
+    assert fetcher.fetch('320193', 2020, 'test', revalidate=True).status == 'not_modified'
+    # The cached URL is reused, and the ETag sent back
+    assert edgar.requests[requests_before:] == [(DOCUMENT, EdgarStandIn.etag)]
+
+
+def test_fetch_retries_throttled_requests_and_backs_off(fetcher, edgar, monkeypatch):
+    backed_off = []
+    back_off = fetcher.limiter.back_off
+
+    def recording_back_off(url, seconds):
+        backed_off.append(url)
+        back_off(url, seconds)
+
+    monkeypatch.setattr(fetcher.limiter, 'back_off', recording_back_off)
+    edgar.throttled = 2
+
+    assert fetcher.fetch('320193', 2020, 'test').status == 'fetched'
+    assert len(backed_off) == 2
+    assert [path for path, _ in edgar.requests].count('/submissions/CIK0000320193.json') == 3
+
+
+def test_fetch_refetches_files_without_meta(fetcher, tmp_path):
+    # A run interrupted between writing the HTML and its .meta has not finished that filing
+    path = html_path('320193', 2020, 'test', tmp_path)
+    path.parent.mkdir(parents=True)
+    with gzip.open(path, 'wb') as f:
+        f.write(b'<html>trunc')
+
+    assert fetcher.fetch('320193', 2020, 'test').status == 'fetched'
+    with gzip.open(path, 'rb') as f:
+        assert f.read() == EdgarStandIn.body
+    assert path.with_name('320193.html.meta').exists()
+    assert fetcher.fetch('320193', 2020, 'test').status == 'skipped'
+
+
+def test_ciks_require_years_and_splits():
+    result = subprocess.run([sys.executable, 'html_fetcher.py', '--ciks', '320193', '--years', '2020'],
+                            cwd=SRC_DIR, capture_output=True, text=True)
+    assert result.returncode == 2
+    assert '--ciks requires --years and --splits' in result.stderr
@@ -0,0 +1,24 @@
+from html_renderer import split_filing
+
+BLOCKS = (
+    '<p>Table of contents</p>'
+    '<p>Item 1. Business</p>'
+    '<p>We make widgets.</p>'
+    '<hr style="page-break-after: always"/>'
+    '<p>Item 1A. Risk Factors</p>'
+    '<p>Widgets may break.</p>'
+)
+
+
+def test_split_filing_splits_top_level_blocks():
+    filing = split_filing(f'<html><body>{BLOCKS}</body></html>')
+    assert len(filing['pages']) == 2
+    assert [page for _, page in filing['sections']] == [0, 1]
+
+
+def test_split_filing_descends_through_wrappers():
+    for wrapped in (f'<div>{BLOCKS}</div>', f'<document><text>{BLOCKS}</text></document>',
+                    f'<div class="document">\n<div>\n{BLOCKS}</div>\n</div>'):
+        filing = split_filing(f'<html><body>{wrapped}</body></html>')
+        assert len(filing['pages']) == 2, wrapped
+        assert [title for title, _ in filing['sections']] == ['Item 1. Business', 'Item 1A. Risk Factors']
@@ -0,0 +1,34 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from pinecone import Pinecone
+
+from indexing.chunk_store import ChunkStore
+from indexing.fake_pinecone import start_fake_pinecone
+from indexing.pipeline import IngestPipeline
+from indexing.sharding import ShardRouter
+
+
+@pytest.fixture
+def index():
+    server = start_fake_pinecone()
+    yield Pinecone(api_key='local').Index(host=server.url)
+    server.shutdown()
+
+
+def test_pipeline_registers_the_namespaces_it_writes(tmp_path, index):
+    filing_dir = tmp_path / 'edgar_corpus_2020' / 'test'
+    filing_dir.mkdir(parents=True)
+    filing = filing_dir / '320193_2020.json'
+    filing.write_text(json.dumps({'section_1': 'abc'}))
+    router = ShardRouter(scheme='cik_year', prefix='')
+    assert router.known_namespaces(index) == []
+
+    chunker = SimpleNamespace(chunk_text=lambda text, **kwargs: list(text))
+    embedder = SimpleNamespace(vectorize=lambda texts: [[1.0] * 8 for _ in texts])
+    IngestPipeline(chunker, embedder, index, ChunkStore(path=str(tmp_path / 'chunks.sqlite3')),
+                   router=router).run([filing])
+
+    # Written namespaces are visible to fan-out queries without waiting for the list to expire
+    assert router.known_namespaces(index) == ['cik-320193-2020']
@@ -0,0 +1,49 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+from config import config
+
+
+def spin(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def run_work(n):
+    return sum(i * i for i in range(n))
+
+
+def test_profile_samples_only_the_run_threads(tmp_path, monkeypatch):
+    monkeypatch.setitem(config['profiling'], 'output_dir', str(tmp_path))
+    stop = threading.Event()
+    other = threading.Thread(target=spin, args=(stop,), name='other-run')
+    other.start()
+    idle_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='idle')
+    idle_pool.submit(run_work, 1).result()
+    try:
+        with profiling.profile_run('320193', 2020, 'test', requested=True) as session:
+            with profiling.stage('questions'), ThreadPoolExecutor(max_workers=2,
+                                                                  thread_name_prefix='question-stage') as pool:
+                list(pool.map(profiling.in_run(run_work), [300_000] * 4))
+    finally:
+        stop.set()
+        other.join()
+        idle_pool.shutdown()
+
+    roots = {line.split(';', 1)[0] for line in session.paths['collapsed'].read_text().splitlines()}
+    assert 'thread question-stage' in roots
+    assert not {'thread other-run', 'thread idle', 'thread sampling-profiler'} & roots
+    assert session.trace_memory
+
+
+def test_sampled_runs_do_not_trace_memory(tmp_path, monkeypatch):
+    monkeypatch.setitem(config['profiling'], 'output_dir', str(tmp_path))
+    monkeypatch.delenv(profiling.PROFILE_ENV, raising=False)
+    monkeypatch.setenv(profiling.PROFILE_EVERY_ENV, '1')
+    with profiling.profile_run('320193', 2020, 'test') as session:
+        with profiling.stage('questions'):
+            run_work(1000)
+
+    assert session is not None and not session.trace_memory
+    assert 'Allocations left by stage' not in session.paths['allocations'].read_text()
@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+
+import pytest
+from pinecone import Pinecone
+
+from chunking.cache import chunking_key
+from indexing.chunk_store import ChunkStore
+from indexing.fake_pinecone import start_fake_pinecone
+from indexing.sharding import ShardRouter, migrate
+from indexing.vector_ids import vector_id
+from retrieval.retriever import PineconeRetriever
+
+DIMENSION = 768
+
+
+@pytest.fixture
+def index():
+    server = start_fake_pinecone()
+    yield Pinecone(api_key='local').Index(host=server.url)
+    server.shutdown()
+
+
+def retriever(index, chunk_store, router):
+    """A retriever over the given index, without the embedding and reranking models it does not need here"""
+    instance = PineconeRetriever.__new__(PineconeRetriever)
+    instance.index, instance.chunk_store, instance.router = index, chunk_store, router
+    instance.k, instance.max_concurrent_queries = 5, 2
+    instance._cleaned_text, instance._cleaned_text_lock = OrderedDict(), threading.Lock()
+    return instance
+
+
+def test_migrated_legacy_vectors_can_be_retrieved(tmp_path, index):
+    values = [1.0] + [0.0] * (DIMENSION - 1)
+    index.upsert(vectors=[{
+        'id': '320193_2020_item7_0',
+        'values': values,
+        'metadata': {'cik': '320193', 'year': 2020, 'split': 'test', 'section': 'item7',
+                     'chunk_index': 0, 'content': 'Net sales were $274.5 billion.'},
+    }], namespace='ns1')
+    chunk_store = ChunkStore(path=str(tmp_path / 'chunks.sqlite3'))
+    router = ShardRouter(scheme='cik_year', prefix='')
+
+    moved = migrate(index, router, ['ns1'], delete_source=True, chunk_store=chunk_store)
+
+    assert moved == {'cik-320193-2020': 1}
+    assert index.describe_index_stats().namespaces['ns1']['vector_count'] == 0
+    migrated_id = vector_id('320193', 2020, 'test', 'item7', 0)
+    assert chunk_store.get(migrated_id) == 'Net sales were $274.5 billion.'
+
+    search = retriever(index, chunk_store, router)
+    assert search.is_file_indexed_in_pinecone('320193', 2020, 'test')
+    response = search.query_index_by_vector(values, cik='320193', year=2020, split='test')
+    assert [match['id'] for match in response['matches']] == [migrated_id]
+    assert response['matches'][0]['metadata']['chunking'] == chunking_key()
+    assert 'content' not in response['matches'][0]['metadata']
+    passages, chunk_ids = search.get_passages(response['matches'])
+    assert passages == ['Net sales were $274.5 billion.'] and chunk_ids == [migrated_id]
+
+
+def test_legacy_vectors_are_upgraded_in_place_for_the_single_scheme(tmp_path, index):
+    index.upsert(vectors=[{
+        'id': '320193_2020_item7_0',
+        'values': [1.0] * DIMENSION,
+        'metadata': {'cik': '320193', 'year': 2020, 'split': 'test', 'section': 'item7',
+                     'chunk_index': 0, 'content': 'Net sales were $274.5 billion.'},
+    }], namespace='ns1')
+    chunk_store = ChunkStore(path=str(tmp_path / 'chunks.sqlite3'))
+    router = ShardRouter(scheme='single', namespace='ns1')
+
+    assert migrate(index, router, ['ns1'], delete_source=True, chunk_store=chunk_store) == {'ns1': 1}
+    assert [listed for page in index.list(namespace='ns1') for listed in page] == [
+        vector_id('320193', 2020, 'test', 'item7', 0)
+    ]
+    # Upgraded vectors are left alone by a rerun
+    assert migrate(index, router, ['ns1'], delete_source=True, chunk_store=chunk_store) == {}
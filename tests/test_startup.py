@@ -0,0 +1,26 @@
+from startup_report import build_report
+
+
+def test_main_does_not_import_deferred_modules():
+    report = build_report('main')
+    assert report['deferred_loaded'] == []
+
+
+def test_query_prompt_examples_are_parsed_once(monkeypatch):
+    import yaml
+    from prompts import query_prompt
+
+    calls = []
+    safe_load = yaml.safe_load
+
+    def counting_safe_load(stream):
+        calls.append(stream)
+        return safe_load(stream)
+
+    monkeypatch.setattr(yaml, 'safe_load', counting_safe_load)
+    query_prompt.load_examples.cache_clear()
+    examples = query_prompt.EXAMPLES
+    assert query_prompt.EXAMPLES == examples
+    assert query_prompt.load_examples() == examples
+    assert query_prompt.FORMATTED_EXAMPLES
+    assert len(calls) == 1
@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pytest
+
+import clustering.streaming as streaming
+from clustering.streaming import StreamingClusterer, embed_chunk_files, iter_embedding_batches
+
+
+class CrashingEmbedder:
+    """Random embeddings, raising once the given number of sections was embedded"""
+
+    def __init__(self, crash_after=None):
+        self.crash_after = crash_after
+        self.calls = 0
+
+    def vectorize(self, texts):
+        if self.crash_after is not None and self.calls >= self.crash_after:
+            raise RuntimeError("crashed")
+        self.calls += 1
+        return np.random.rand(len(texts), 8)
+
+
+def chunk_files(tmp_path, count=4):
+    files = []
+    for i in range(count):
+        path = tmp_path / f"{i}_2020_chunks.json"
+        path.write_text(json.dumps({'cik': str(i), 'year': 2020, 'split': 'test',
+                                    'item1': {'chunks': ['a'] * 30}, 'item7': {'chunks': ['b'] * 20}}))
+        files.append(path)
+    return files
+
+
+def rows(shard_dir):
+    return [(meta['cik'], meta['chunk_id']) for _, metadata in iter_embedding_batches(shard_dir, 64)
+            for meta in metadata]
+
+
+def test_embedding_resumes_after_a_crash_without_duplicates(tmp_path):
+    files, shard_dir = chunk_files(tmp_path), tmp_path / 'embeddings'
+    with pytest.raises(RuntimeError):
+        embed_chunk_files(files, CrashingEmbedder(crash_after=5), shard_dir, shard_size=32)
+    assert rows(shard_dir)
+
+    embed_chunk_files(files, CrashingEmbedder(), shard_dir, shard_size=32)
+    written = rows(shard_dir)
+    assert len(written) == len(set(written)) == 4 * 50
+    assert embed_chunk_files(files, CrashingEmbedder(), shard_dir, shard_size=32) == 0
+
+
+def test_assignment_resumes_after_a_crash_without_duplicates(tmp_path, monkeypatch):
+    shard_dir, model_dir = tmp_path / 'embeddings', tmp_path / 'clustering'
+    embed_chunk_files(chunk_files(tmp_path), CrashingEmbedder(), shard_dir, shard_size=64)
+    clusterer = StreamingClusterer(model_dir, n_clusters=2, n_components=4, batch_size=64).fit(shard_dir)
+    clusterer.save()
+
+    write_state = streaming._write_state
+    calls = []
+
+    def crash_on_second_shard(path, state):
+        calls.append(path)
+        if len(calls) == 2:
+            raise RuntimeError("crashed")
+        write_state(path, state)
+
+    monkeypatch.setattr(streaming, '_write_state', crash_on_second_shard)
+    with pytest.raises(RuntimeError):
+        clusterer.assign_new(shard_dir)
+    monkeypatch.setattr(streaming, '_write_state', write_state)
+
+    resumed = StreamingClusterer.load(model_dir, batch_size=64)
+    resumed.assign_new(shard_dir)
+    with open(model_dir / 'assignments.jsonl', encoding='utf-8') as f:
+        assigned = [(row['cik'], row['chunk_id']) for row in map(json.loads, f)]
+    assert len(assigned) == len(set(assigned)) == 4 * 50
+    assert sum(cluster['size'] for cluster in resumed.cluster_composition().values()) == 4 * 50